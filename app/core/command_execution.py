@@ -15,13 +15,16 @@ Supported Command Categories:
     - Geospatial: GEOADD, GEOPOS, GEODIST, GEOSEARCH
 
 Architecture:
-    The module uses a centralized command execution approach where each command
-    is handled by dedicated logic within execute_single_command(). Commands are
-    parsed using RESP protocol and responses are formatted according to Redis specs.
+    The module uses a centralized command execution approach: execute_single_command()
+    looks each command up in the module-level COMMAND_HANDLERS table and calls its
+    handle_<command>() function. Commands are parsed using RESP protocol and
+    responses are formatted according to Redis specs.
 
 Thread Safety:
     All data operations use locks from the data_store module to ensure thread-safe
-    concurrent access. Blocking operations use condition variables for coordination.
+    concurrent access. Blocking operations (BLPOP, XREAD BLOCK) park on Futures that the
+    writing command completes. Client sockets are non-blocking: replies go through
+    send_to_connection(), which queues what the socket does not take right away.
 """
 
 import socket
@@ -30,14 +33,21 @@ import os
 import threading
 import time
 import math
-from app.parser import parsed_resp_array
+from collections import deque
+from itertools import islice
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from app.parser import CommandReader, parsed_resp_array
+from app.protocol.constants import EMPTY_ARRAY, NIL_ARRAY, NIL_BULK, OK, PONG, QUEUED, SUBSCRIBED_PONG, SYNTAX_ERROR
+from app.protocol.resp import encode_array, encode_bulk_array, encode_bulk_string, encode_integer, encode_into, \
+    encode_stream_entries, encode_value
 from app.core.datastore import BLOCKING_CLIENTS, BLOCKING_CLIENTS_LOCK, BLOCKING_STREAMS, BLOCKING_STREAMS_LOCK, \
     CHANNEL_SUBSCRIBERS, DATA_LOCK, DATA_STORE, SORTED_SETS, STREAMS, WAIT_CONDITION, WAIT_LOCK, \
-    _serialize_command_to_resp_array, add_to_sorted_set, cleanup_blocked_client, enqueue_client_command, \
-    get_client_queued_commands, get_sorted_set_range, get_sorted_set_rank, get_stream_max_id, get_zscore, \
-    increment_key_value, is_client_in_multi, is_client_subscribed, load_rdb_to_datastore, lrange_rtn, \
-    num_client_subscriptions, prepend_to_list, remove_elements_from_list, remove_from_sorted_set, set_client_in_multi, \
-    size_of_list, append_to_list, existing_list, get_data_entry, set_list, set_string, subscribe, unsubscribe, xadd, \
+    REPLICA_ACK_OFFSETS, add_to_sorted_set, cleanup_blocked_client, get_all_keys_reply, \
+    get_sorted_set_range, get_sorted_set_rank, get_stream_max_id, get_zscore, \
+    increment_key_value, is_client_subscribed, load_entries, load_rdb_to_datastore, lrange_rtn, \
+    num_client_subscriptions, push_to_list, remove_elements_from_list, remove_from_sorted_set, \
+    size_of_list, get_data_entry, get_string_reply, now_ns, set_string, subscribe, \
+    take_time_snapshot, unsubscribe, unsubscribe_all, xadd, \
     xrange, xread
 
 # ============================================================================
@@ -46,6 +56,40 @@ from app.core.datastore import BLOCKING_CLIENTS, BLOCKING_CLIENTS_LOCK, BLOCKING
 
 # Commands that modify data and should be propagated to replicas
 WRITE_COMMANDS = {"SET", "LPUSH", "RPUSH", "LPOP", "ZADD", "ZREM", "XADD", "INCR", "GEOADD"}
+# Commands that may wait for other clients before replying (buffered replies are flushed first)
+BLOCKING_COMMANDS = {"BLPOP", "XREAD", "WAIT"}
+
+# Commands that must be executed immediately, even inside MULTI
+TRANSACTION_CONTROL_COMMANDS = frozenset({"EXEC", "MULTI", "DISCARD"})
+
+# The only commands a client in subscribed mode may run
+ALLOWED_COMMANDS_WHEN_SUBSCRIBED = frozenset({"SUBSCRIBE", "UNSUBSCRIBE", "PING", "QUIT", "PSUBSCRIBE", "PUNSUBSCRIBE"})
+
+# Option keywords, as the (upper-case, lower-case) spellings clients send in practice.
+# Handlers test membership first and only upper() an argument written in mixed case.
+BLOCK_KEYWORD = (b"BLOCK", b"block")
+STREAMS_KEYWORD = (b"STREAMS", b"streams")
+GETACK_KEYWORD = (b"GETACK", b"getack")
+ACK_KEYWORD = (b"ACK", b"ack")
+GET_KEYWORD = (b"GET", b"get")
+FROMLONLAT_KEYWORD = (b"FROMLONLAT", b"fromlonlat")
+BYRADIUS_KEYWORD = (b"BYRADIUS", b"byradius")
+
+# SET expiry options -> milliseconds per unit
+SET_EXPIRY_OPTIONS = {b"EX": 1000, b"ex": 1000, b"PX": 1, b"px": 1}
+
+# Buffered replies totalling at least this many bytes are written with sendmsg() straight from
+# the individual reply buffers instead of being joined into one copy first.
+SCATTER_SEND_THRESHOLD = 64 * 1024
+# Upper bound on buffers per sendmsg() call (IOV_MAX is 1024 on Linux)
+SENDMSG_MAX_BUFFERS = 1024
+# While more reply bytes than this wait in a client's outbox, the selector loop stops reading
+# from it, so a client that pipelines without reading its replies cannot grow them unbounded.
+OUTBOX_PAUSE_READ_SIZE = 1024 * 1024
+
+# Set by the server's selector loop: called with a ClientConnection whose outbox a write left
+# non-empty, so the loop watches that socket for writability and sends the rest.
+WATCH_OUTBOX = None
 
 # Geospatial constants for coordinate validation and calculations
 MIN_LON = -180.0
@@ -214,7 +258,14 @@ MASTER_REPL_OFFSET = 0  # Starts at 0
 REPLICA_REPL_OFFSET = 0
 MASTER_SOCKET = None
 
-REPLICA_SOCKETS = []
+# ClientConnections of the replicas that completed PSYNC
+REPLICA_CONNECTIONS = []
+
+# Write commands encoded for the replicas but not sent yet (guarded by PROPAGATION_LOCK).
+# The commands from one batch are joined and sent to each replica once, when the batch
+# is flushed, instead of one sendall per command per replica.
+PROPAGATION_BUFFER = []
+PROPAGATION_LOCK = threading.Lock()
 
 # Define the 59-byte empty RDB file content (hexadecimal)
 # command_execution.py around line 40
@@ -229,6 +280,8 @@ empty_rdb_bytes = bytes.fromhex(EMPTY_RDB_HEX)
 RDB_FILE_SIZE = len(empty_rdb_bytes)
 RDB_HEADER = b"$" + str(RDB_FILE_SIZE).encode() + b"\r\n"  # Dynamically create the header bytes
 # Note: This is equivalent to b"$102\r\n" if the hex string is 102 bytes long.
+# The complete bulk payload sent after +FULLRESYNC, built once instead of on every PSYNC
+EMPTY_RDB_PAYLOAD = RDB_HEADER + empty_rdb_bytes
 
 # Parse args like --dir /path --dbfilename file.rdb
 args = sys.argv[1:]
@@ -242,1509 +295,1546 @@ RDB_PATH = os.path.join(DIR, DB_FILENAME)
 
 # Only load if file exists
 if os.path.exists(RDB_PATH):
-    DATA_STORE.update(load_rdb_to_datastore(RDB_PATH))
+    load_entries(load_rdb_to_datastore(RDB_PATH))
 else:
     print(f"RDB file not found at {RDB_PATH}, starting with empty DATA_STORE.")
 
 
-def _xread_serialize_response(stream_data: dict[str, list[dict]]) -> bytes:
+def _xread_serialize_response(stream_data: dict[bytes, list[dict]]) -> bytes:
     """Serializes the result of xread into a RESP array response."""
     if not stream_data:
-        return b"*-1\r\n"
+        return NIL_ARRAY
 
-        # Outer Array: Array of [key, [entry1, entry2, ...]]
+    # Outer Array: Array of [key, [entry1, entry2, ...]], built in one buffer
     # *N\r\n
-    outer_response_parts = []
+    out = bytearray(b"*%d\r\n" % len(stream_data))
 
     for key, entries in stream_data.items():
         # Array for [key, list of entries] -> *2\r\n
-        key_resp = b"$" + str(len(key.encode())).encode() + b"\r\n" + key.encode() + b"\r\n"
-
-        # Array for list of entries -> *M\r\n
-        entries_array_parts = []
-        for entry in entries:
-            entry_id = entry["id"]
-            fields = entry["fields"]
-
-            # Array for [id, [field1, value1, field2, value2, ...]] -> *2\r\n
-            id_resp = b"$" + str(len(entry_id.encode())).encode() + b"\r\n" + entry_id.encode() + b"\r\n"
-
-            # Array for field/value pairs -> *2K\r\n
-            fields_array_parts = []
-            for field, value in fields.items():
-                field_bytes = field.encode()
-                value_bytes = value.encode()
-                fields_array_parts.append(b"$" + str(len(field_bytes)).encode() + b"\r\n" + field_bytes + b"\r\n")
-                fields_array_parts.append(b"$" + str(len(value_bytes)).encode() + b"\r\n" + value_bytes + b"\r\n")
-
-            fields_array_resp = b"*" + str(len(fields) * 2).encode() + b"\r\n" + b"".join(fields_array_parts)
-
-            # Combine [id, fields_array]
-            entry_array_resp = b"*2\r\n" + id_resp + fields_array_resp
-            entries_array_parts.append(entry_array_resp)
-
-        # Combine all entries into the inner array
-        entries_resp = b"*" + str(len(entries_array_parts)).encode() + b"\r\n" + b"".join(entries_array_parts)
+        out += b"*2\r\n"
+        encode_into(out, key)
 
-        # Combine [key, entries_resp]
-        key_entries_resp = b"*2\r\n" + key_resp + entries_resp
-        outer_response_parts.append(key_entries_resp)
+        # Array for list of entries, encoded in one pass -> *M\r\n
+        out += encode_stream_entries(entries)
 
-    # Final response: Array of [key, entries] arrays
-    return b"*" + str(len(outer_response_parts)).encode() + b"\r\n" + b"".join(outer_response_parts)
+    return bytes(out)
 
 
 # ============================================================================
 # COMMAND EXECUTION
 # ============================================================================
 # This section contains the main command execution logic for all supported Redis commands.
-# Commands are organized by category for easier navigation and maintenance.
+# Each command has a handle_<command>(arguments, client) function that returns the RESP reply,
+# registered in COMMAND_HANDLERS below.
 
-def execute_single_command(command: str, arguments: list, client: socket.socket):
-    """
-    Executes a single Redis command and returns the appropriate response.
-    
-    This is the main command dispatcher that routes commands to their respective handlers.
-    Each command category (basic, lists, streams, etc.) has dedicated logic within this function.
-    
-    Args:
-        command: The Redis command to execute (e.g., 'SET', 'GET', 'LPUSH')
-        arguments: List of arguments for the command
-        client: The client socket connection (used for pub/sub and transactions)
-    
-    Returns:
-        bytes: RESP-formatted response to send back to the client
-        bool: True for special commands that don't return a response (like REPLCONF ACK)
-    
-    Command Categories:
-        - Basic: PING, ECHO, SET, GET, TYPE, CONFIG, KEYS
-        - Lists: LPUSH, RPUSH, LPOP, LRANGE, LLEN, BLPOP
-        - Streams: XADD, XRANGE, XREAD
-        - Sorted Sets: ZADD, ZRANK, ZRANGE, ZCARD, ZSCORE, ZREM
-        - Transactions: MULTI, EXEC, DISCARD, INCR
-        - Pub/Sub: SUBSCRIBE, UNSUBSCRIBE, PUBLISH
-        - Replication: REPLCONF, PSYNC, INFO, WAIT
-        - Geospatial: GEOADD, GEOPOS, GEODIST, GEOSEARCH
-    """
-    response = None
-    """
-    Returns True if the command was processed successfully, False otherwise (e.g., unknown command).
-    """
-    if is_client_subscribed(client):
-        ALLOWED_COMMANDS_WHEN_SUBSCRIBED = {"SUBSCRIBE", "UNSUBSCRIBE", "PING", "QUIT", "PSUBSCRIBE", "PUNSUBSCRIBE"}
-        if command not in ALLOWED_COMMANDS_WHEN_SUBSCRIBED:
-            response = b"-ERR Can't execute '" + command.encode() + b"' when client is subscribed\r\n"
-            return response
-
-    if command == "PING":
-        if is_client_subscribed(client):
-            response_parts = []
-            pong_bytes = "pong".encode()
-            response_parts.append(b"$" + str(len(pong_bytes)).encode() + b"\r\n" + pong_bytes + b"\r\n")
+def handle_ping(arguments: list, connection: "ClientConnection | None"):
+    if is_client_subscribed(connection):
+        response = SUBSCRIBED_PONG
+        # client.sendall(response
+        return response
+    else:
+        response = PONG
+        # client.sendall(response
+        return response
 
-            empty_bytes = "".encode()
-            response_parts.append(b"$" + str(len(empty_bytes)).encode() + b"\r\n" + empty_bytes + b"\r\n")
 
-            response = b"*" + str(len(response_parts)).encode() + b"\r\n" + b"".join(response_parts)
-            # client.sendall(response
-            return response
-        else:
-            response = b"+PONG\r\n"
-            # client.sendall(response
+def handle_replconf(arguments: list, client: socket.socket):
+    # Check for REPLCONF GETACK * (Replica logic)
+    if len(arguments) == 2 and is_keyword(arguments[0], GETACK_KEYWORD) and arguments[1] == b"*":
+        try:
+            # REPLCONF ACK <offset> - use the replica's current offset
+            global REPLICA_REPL_OFFSET  # Access the global offset
+            offset = REPLICA_REPL_OFFSET
+            offset_str = str(offset)
+
+            # Construct the RESP Array: *3\r\n$8\r\nREPLCONF\r\n$3\r\nACK\r\n$LEN\r\n<OFFSET>\r\n
+            response = (
+                    b"*3\r\n" +  # Array of 3 elements
+                    b"$8\r\nREPLCONF\r\n" +
+                    b"$3\r\nACK\r\n" +
+                    encode_bulk_string(offset_str)
+            )
             return response
+        except Exception as e:
+            print(f"Error building REPLCONF ACK response: {e}")
+            # Return an error message to prevent unexpected silent failure
+            return b"-ERR Internal error building ACK\r\n"
 
-    elif command == "REPLCONF":
-        # Check for REPLCONF GETACK * (Replica logic)
-        if len(arguments) == 2 and arguments[0].upper() == "GETACK" and arguments[1] == "*":
-            try:
-                # REPLCONF ACK <offset> - use the replica's current offset
-                global REPLICA_REPL_OFFSET  # Access the global offset
-                offset = REPLICA_REPL_OFFSET
-                offset_str = str(offset)
-
-                # Construct the RESP Array: *3\r\n$8\r\nREPLCONF\r\n$3\r\nACK\r\n$LEN\r\n<OFFSET>\r\n
-                response = (
-                        b"*3\r\n" +  # Array of 3 elements
-                        b"$8\r\nREPLCONF\r\n" +
-                        b"$3\r\nACK\r\n" +
-                        b"$" + str(len(offset_str)).encode() + b"\r\n" +
-                        offset_str.encode() + b"\r\n"
-                )
-                return response
-            except Exception as e:
-                print(f"Error building REPLCONF ACK response: {e}")
-                # Return an error message to prevent unexpected silent failure
-                return b"-ERR Internal error building ACK\r\n"
+    # ADDED: Check for REPLCONF ACK <offset> (Master receives from replica)
+    elif len(arguments) == 2 and is_keyword(arguments[0], ACK_KEYWORD):
+        global REPLICA_ACK_OFFSETS
 
-        # ADDED: Check for REPLCONF ACK <offset> (Master receives from replica)
-        elif len(arguments) == 2 and arguments[0].upper() == "ACK":
-            global REPLICA_ACK_OFFSETS
+        try:
+            replica_socket = client
+            ack_offset = int(arguments[1])
 
-            try:
-                replica_socket = client
-                ack_offset = int(arguments[1])
+            with WAIT_LOCK:  # Acquire lock to update shared state
+                REPLICA_ACK_OFFSETS[replica_socket] = ack_offset
+                # Wake up any waiting threads (the one executing WAIT)
+                WAIT_CONDITION.notify_all()
 
-                with WAIT_LOCK:  # Acquire lock to update shared state
-                    REPLICA_ACK_OFFSETS[replica_socket] = ack_offset
-                    # Wake up any waiting threads (the one executing WAIT)
-                    WAIT_CONDITION.notify_all()
+            return True
+        except ValueError:
+            return b"-ERR invalid offset value in ACK\r\n"
 
-                return True
-            except ValueError:
-                return b"-ERR invalid offset value in ACK\r\n"
+    # Handshake REPLCONF commands (listening-port <PORT> and capa psync2)
+    response = OK
+    return response
 
-        # Handshake REPLCONF commands (listening-port <PORT> and capa psync2)
-        response = b"+OK\r\n"
-        return response
 
-    elif command == "PSYNC":
+def handle_psync(arguments: list, connection: "ClientConnection | None"):
+    if connection is None:
+        return b"-ERR PSYNC is not supported on this connection\r\n"
+
+    # Queuing the reply and registering the replica under PROPAGATION_LOCK means no propagated
+    # batch can reach the replica ahead of the FULLRESYNC payload. Writes still waiting in
+    # PROPAGATION_BUFFER are sent to it afterwards, so the offset it starts from excludes them.
+    with PROPAGATION_LOCK:
+        offset = MASTER_REPL_OFFSET - sum(map(len, PROPAGATION_BUFFER))
 
         # 2. Construct the FULLRESYNC response string
-        fullresync_response_str = f"+FULLRESYNC {MASTER_REPLID} {MASTER_REPL_OFFSET}\r\n"
+        fullresync_response_str = f"+FULLRESYNC {MASTER_REPLID} {offset}\r\n"
         fullresync_response_bytes = fullresync_response_str.encode()
 
-        # 3. Use the new RDB hex content and convert to binary bytes
-        # This is the RDB HEX string provided in the sample answer
-        EMPTY_RDB_HEX = (
-            "524544495330303131fa0972656469732d76657205372e322e30fa0a72656469732d62697473c040fa056374696d65c26d08bc65fa08757365642d6d656dc2b0c41000fa08616f662d62617365c000fff06e3bfec0ff5aa2"
-        )
-        rdb_binary_contents = bytes.fromhex(EMPTY_RDB_HEX)
-        rdb_file_size = len(rdb_binary_contents)
+        # 3. The RDB bulk payload ($<length>\r\n<binary_contents>) is static and prebuilt at import
+        #    Replies buffered earlier in the batch go out ahead of it.
+        connection.pending.append(fullresync_response_bytes + EMPTY_RDB_PAYLOAD)
+        flush_responses(connection)
 
-        # 4. Construct the RDB file bulk response header and combine with contents
-        # The format is $<length>\r\n<binary_contents>
-        rdb_header = b"$" + str(rdb_file_size).encode() + b"\r\n"
-        rdb_response_bytes = rdb_header + rdb_binary_contents
+        REPLICA_CONNECTIONS.append(connection)
 
-        global REPLICA_SOCKETS  # <-- FIX 1: Use global to modify the variable
-        REPLICA_SOCKETS.append(client)
+    print(f"Replication: Sent FULLRESYNC + RDB file to replica {connection.address}.")
 
-        # 5. Return the two parts separately as a tuple
-        response = fullresync_response_bytes + rdb_response_bytes
-        return response
+    # 4. The reply is already on its way
+    return True
 
-    elif command == "ECHO":
-        if not arguments:
-            response = b"-ERR wrong number of arguments for 'echo' command\r\n"
-            # client.sendall(response
-            return response
 
-        # msg_str is like 'Hey' and we must convert back to RESP bulk string.
-        msg_str = arguments[0]
+def handle_echo(arguments: list, client: socket.socket):
+    if not arguments:
+        response = b"-ERR wrong number of arguments for 'echo' command\r\n"
+        # client.sendall(response
+        return response
+
+    # msg_str is like 'Hey' and we must convert back to RESP bulk string.
+    msg_str = arguments[0]
 
-        # encode back to bytes
-        msg_bytes = msg_str.encode()
+    # b"$3\r\nhey\r\n"
+    response = encode_bulk_string(msg_str)
 
-        # grab length of msg_bytes and construct RESP bulk string
-        length_bytes = str(len(msg_bytes)).encode()
+    # client.sendall(response
+    return response
 
-        # b"$3\r\nhey\r\n"
-        response = b"$" + length_bytes + b"\r\n" + msg_bytes + b"\r\n"
 
+def handle_set(arguments: list, client: socket.socket):
+    if len(arguments) < 2:
+        response = b"-ERR wrong number of arguments for 'set' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "SET":
-        if len(arguments) < 2:
-            response = b"-ERR wrong number of arguments for 'set' command\r\n"
+    key = arguments[0]
+    value = arguments[1]
+    duration_ms = None
+
+    # Option Parsing Loop
+    i = 2
+    while i < len(arguments):
+        unit_ms = SET_EXPIRY_OPTIONS.get(arguments[i])
+        if unit_ms is None:
+            unit_ms = SET_EXPIRY_OPTIONS.get(arguments[i].upper())
+
+        if unit_ms is not None:
+            # Check if the duration argument exists
+            if i + 1 >= len(arguments):
+                response = SYNTAX_ERROR
+                # client.sendall(response
+                return response
+
+            try:
+                # Convert the duration argument (string) to an integer first
+                duration = int(arguments[i + 1])
+
+                # EX is in seconds, PX in milliseconds
+                duration_ms = duration * unit_ms
+
+                i += 2  # Skip the option and its value
+                break  # Assuming only one EX/PX option
+
+            except ValueError:
+                # Catch case where duration is not an integer
+                response = b"-ERR value is not an integer or out of range\r\n"
+                # client.sendall(response
+                return response
+        else:
+            # Handle unrecognized option
+            response = SYNTAX_ERROR
             # client.sendall(response
             return response
 
-        key = arguments[0]
-        value = arguments[1]
-        duration_ms = None
+    # Calculate the monotonic expiration deadline (ns)
+    expiry_deadline = now_ns() + duration_ms * 1_000_000 if duration_ms is not None else 0
 
-        # Option Parsing Loop
-        i = 2
-        while i < len(arguments):
-            option = arguments[i].upper()
+    # Use the data store function to set the value safely
+    set_string(key, value, expiry_deadline)
 
-            if option in ("EX", "PX"):
-                # Check if the duration argument exists
-                if i + 1 >= len(arguments):
-                    response = f"-ERR syntax error\r\n".encode()
-                    # client.sendall(response
-                    return response
+    response = OK
+    # client.sendall(response
+    return response
 
-                try:
-                    # Convert the duration argument (string) to an integer first
-                    duration = int(arguments[i + 1])
 
-                    if option == "EX":
-                        duration_ms = duration * 1000  # Convert seconds to milliseconds
-                    elif option == "PX":
-                        duration_ms = duration
+def handle_get(arguments: list, client: socket.socket):
+    if not arguments:
+        response = b"-ERR wrong number of arguments for 'get' command\r\n"
+        # client.sendall(response
+        return response
 
-                    i += 2  # Skip the option and its value
-                    break  # Assuming only one EX/PX option
+    key = arguments[0]
 
-                except ValueError:
-                    # Catch case where duration is not an integer
-                    response = b"-ERR value is not an integer or out of range\r\n"
-                    # client.sendall(response
-                    return response
-            else:
-                # Handle unrecognized option
-                response = f"-ERR syntax error\r\n".encode()
-                # client.sendall(response
-                return response
+    # Use the data store function to get the reply with expiry and type checks. It reuses the
+    # Bulk String cached on the entry by a previous GET; writers replace the entry (SET) or drop
+    # the cache (INCR) under DATA_LOCK, and the cache is only filled under that lock too.
+    response = get_string_reply(key)
 
-        current_time = int(time.time() * 1000)
+    if response is None:
+        response = NIL_BULK  # RESP Null Bulk String
 
-        # Calculate the absolute expiration timestamp
-        expiry_timestamp = current_time + duration_ms if duration_ms is not None else None
+    # client.sendall(response
+    return response
 
-        # Use the data store function to set the value safely
-        set_string(key, value, expiry_timestamp)
 
-        response = b"+OK\r\n"
+def handle_lrange(arguments: list, client: socket.socket):
+    if not arguments or len(arguments) < 3:
+        response = b"-ERR wrong number of arguments for 'lrange' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "GET":
-        if not arguments:
-            response = b"-ERR wrong number of arguments for 'get' command\r\n"
-            # client.sendall(response
-            return response
+    list_key = arguments[0]
+    start = int(arguments[1])
+    end = int(arguments[2])
 
-        key = arguments[0]
+    list_elements = lrange_rtn(list_key, start, end)
 
-        # Use the data store function to get the value with expiry check
-        data_entry = get_data_entry(key)
+    response = encode_bulk_array(list_elements)
+    # client.sendall(response
+    return response
 
-        if data_entry is None:
-            response = b"$-1\r\n"  # RESP Null Bulk String
-        else:
-            # Check for correct type (important: we only support string GET for now)
-            if data_entry.get("type") != "string":
-                response = b"-WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
-            else:
-                # Construct the Bulk String response
-                value = data_entry["value"]
-                value_bytes = value.encode()
-                length_bytes = str(len(value_bytes)).encode()
-                response = b"$" + length_bytes + b"\r\n" + value_bytes + b"\r\n"
 
+def handle_lpush(arguments: list, client: socket.socket):
+    if not arguments:
+        response = b"-ERR wrong number of arguments for 'lpush' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "LRANGE":
-        if not arguments or len(arguments) < 3:
-            response = b"-ERR wrong number of arguments for 'lrange' command\r\n"
-            # client.sendall(response
-            return response
+    list_key = arguments[0]
+    elements = arguments[1:]
 
-        list_key = arguments[0]
-        start = int(arguments[1])
-        end = int(arguments[2])
-
-        list_elements = lrange_rtn(list_key, start, end)
+    # Each element is pushed onto the head in turn, so the last one ends up first
+    size = push_to_list(list_key, elements, left=True)
+    serve_blocked_list_clients(list_key)
+    response = encode_integer(size)
+    # client.sendall(response
+    return response
 
-        response_parts = []
-        for element in list_elements:
-            element_bytes = element.encode()
-            length_bytes = str(len(element_bytes)).encode()
-            response_parts.append(b"$" + length_bytes + b"\r\n" + element_bytes + b"\r\n")
 
-        response = b"*" + str(len(list_elements)).encode() + b"\r\n" + b"".join(response_parts)
+def handle_llen(arguments: list, client: socket.socket):
+    if not arguments:
+        response = b"-ERR wrong number of arguments for 'llen' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "LPUSH":
-        if not arguments:
-            response = b"-ERR wrong number of arguments for 'lpush' command\r\n"
-            # client.sendall(response
-            return response
+    list_key = arguments[0]
+    size = size_of_list(list_key)
+    response = encode_integer(size)
+    # client.sendall(response
+    return response
 
-        list_key = arguments[0]
-        elements = arguments[1:]
 
-        size = 0
+def handle_lpop(arguments: list, client: socket.socket):
+    if not arguments:
+        response = b"-ERR wrong number of arguments for 'lpop' command\r\n"
+        # client.sendall(response
+        return response
 
-        if existing_list(list_key):
-            for element in elements:
-                prepend_to_list(list_key, element)
-        else:
-            set_list(list_key, elements, None)
+    list_key = arguments[0]
+    arguments = arguments[1:]
 
-        size = size_of_list(list_key)
-        response = b":{size}\r\n".replace(b"{size}", str(size).encode())
+    if arguments == []:
+        list_elements = remove_elements_from_list(list_key, 1)
+    else:
+        list_elements = remove_elements_from_list(list_key, int(arguments[0]))
+    if list_elements is None:
+        response = NIL_BULK  # RESP Null Bulk String
         # client.sendall(response
         return response
 
-    elif command == "LLEN":
-        if not arguments:
-            response = b"-ERR wrong number of arguments for 'llen' command\r\n"
-            # client.sendall(response
-            return response
+    if len(list_elements) == 1:
+        response = encode_bulk_string(list_elements[0])
+    else:
+        response = encode_bulk_array(list_elements)
 
-        list_key = arguments[0]
-        size = size_of_list(list_key)
-        response = b":{size}\r\n".replace(b"{size}", str(size).encode())
+    # client.sendall(response
+    return response
+
+
+def is_keyword(argument: bytes, keyword: tuple) -> bool:
+    """Case-insensitive match of an argument against one of the *_KEYWORD constants."""
+    return argument in keyword or argument.upper() == keyword[0]
+
+
+def serve_blocked_list_clients(list_key: bytes):
+    """
+    Hands elements of list_key to the clients blocked on it in BLPOP, longest-waiting first.
+    All the waiters the list can satisfy are taken under one BLOCKING_CLIENTS_LOCK acquisition
+    and their elements popped in one call, so a multi-element push wakes them in a single batch.
+    """
+    # BLOCKING_CLIENTS = { list_key: deque([future1, future2, ...]), ... }, one Future per
+    # BLPOP thread waiting on the key.
+    with BLOCKING_CLIENTS_LOCK:
+        waiters = BLOCKING_CLIENTS.get(list_key)
+        if not waiters:
+            return
+        popped_elements = remove_elements_from_list(list_key, len(waiters))
+        if not popped_elements:
+            return
+        served = [waiters.popleft() for _ in popped_elements]
+        # Drop the key with its last waiter so idle lists leave nothing behind
+        if not waiters:
+            del BLOCKING_CLIENTS[list_key]
+
+    # Completing a waiter's Future wakes its thread, which replies on its own connection
+    for waiter, popped_element in zip(served, popped_elements):
+        waiter.set_result(popped_element)
+
+
+def handle_rpush(arguments: list, client: socket.socket):
+    # 1. Argument and Key setup
+    if not arguments:
+        # No arguments -> ignore / error (your code returns True and keeps listening)
+        return True
+
+    list_key = arguments[0]
+    elements = arguments[1:]
+
+    # 2. Add all elements to the tail of the list, creating it if needed (the helper takes DATA_LOCK).
+    #    IMPORTANT: the size is the one *after insertion*.
+    #    Redis's RPUSH returns the list length *after* the push operation,
+    #    even if the server immediately serves a blocked client afterwards.
+    size_to_report = push_to_list(list_key, elements)  # Size that must be returned to RPUSH caller
+
+    # 3. Serve clients blocked in BLPOP on this list (all that the new elements can satisfy)
+    serve_blocked_list_clients(list_key)
+
+    # 4. Final step: Send the RPUSH response (always the size immediately after insertion)
+    #    This is the value clients expect (e.g., ":1\r\n")
+    response = encode_integer(size_to_report)
+    # client.sendall(response
+    return response
+
+
+def handle_blpop(arguments: list, client: socket.socket, block: bool = True):
+    # 1. Argument and Key setup
+    if len(arguments) != 2:
+        # Wrong number of args
+        return True
+
+    list_key = arguments[0]
+    try:
+        # Redis accepts fractional seconds for the timeout (e.g., 0.4).
+        # threading.Condition.wait() accepts float seconds as well, so use float().
+        timeout = float(arguments[1])
+    except ValueError:
+        # If parsing fails, send an error to the client (avoid silent failure).
+        response = b"-ERR timeout is not a float\r\n"
         # client.sendall(response
         return response
 
-    elif command == "LPOP":
-        if not arguments:
-            response = b"-ERR wrong number of arguments for 'lpop' command\r\n"
-            # client.sendall(response
-            return response
+    # 2. Fast path: if the list already has elements, pop and return immediately.
+    #    This mirrors Redis: BLPOP behaves like LPOP when the list is non-empty.
+    #    remove_elements_from_list returns None for an empty or missing list, so no separate size check is needed.
+    list_elements = remove_elements_from_list(list_key, 1)
+    if list_elements:
+        popped_element = list_elements[0]
 
-        list_key = arguments[0]
-        arguments = arguments[1:]
+        # Construct the RESP array [key, popped_element] and send it.
+        response = encode_value((list_key, popped_element))
 
-        if not existing_list(list_key):
-            response = b"$-1\r\n"  # RESP Null Bulk String
-            # client.sendall(response
-            return response
+        # client.sendall(response
+        return response
 
-        if arguments == []:
-            list_elements = remove_elements_from_list(list_key, 1)
-        else:
-            list_elements = remove_elements_from_list(list_key, int(arguments[0]))
-        if list_elements is None:
-            response = b"$-1\r\n"  # RESP Null Bulk String
+    # Inside MULTI/EXEC an empty list answers like a timeout instead of blocking
+    if not block:
+        return NIL_ARRAY
+
+    # 3. Blocking logic (list empty / non-existent)
+    #    The waiting thread parks on a Future that RPUSH/LPUSH complete with the popped element.
+    #    The client socket is kept on it so a disconnecting client's waiters can be found.
+    waiter = Future()
+    waiter.client_socket = client
+
+    # Register the Future in BLOCKING_CLIENTS under the list_key.
+    # Use BLOCKING_CLIENTS_LOCK to guard concurrent access to the shared dict.
+    # The deque is only allocated for the first waiter on a key.
+    with BLOCKING_CLIENTS_LOCK:
+        waiters = BLOCKING_CLIENTS.get(list_key)
+        if waiters is None:
+            waiters = BLOCKING_CLIENTS[list_key] = deque()
+        waiters.append(waiter)
+
+    # Wait for an element or the timeout (timeout == 0 blocks indefinitely).
+    try:
+        popped_element = waiter.result(None if timeout == 0 else timeout)
+    except FutureTimeoutError:
+        # 4. Timeout: remove this client from the BLOCKING_CLIENTS registry
+        with BLOCKING_CLIENTS_LOCK:
+            waiters = BLOCKING_CLIENTS.get(list_key)
+            served = not (waiters and waiter in waiters)
+            if not served:
+                waiters.remove(waiter)
+                # If no more waiters, delete the empty queue to keep the dict tidy
+                if not waiters:
+                    del BLOCKING_CLIENTS[list_key]
+
+        if not served:
+            # Send Null Array response on timeout: Redis returns "*-1\r\n" for BLPOP timeout.
+            response = NIL_ARRAY
             # client.sendall(response
             return response
 
-        response_parts = []
-        for element in list_elements:
-            element_bytes = element.encode()
-            length_bytes = str(len(element_bytes)).encode()
-            response_parts.append(b"$" + length_bytes + b"\r\n" + element_bytes + b"\r\n")
-
-        if len(response_parts) == 1:
-            response = b"$" + str(len(list_elements[0].encode())).encode() + b"\r\n" + list_elements[
-                0].encode() + b"\r\n"
-        else:
-            response = b"*" + str(len(list_elements)).encode() + b"\r\n" + b"".join(response_parts)
+        # A push claimed this waiter just as the timeout fired; its element is on the way
+        popped_element = waiter.result()
 
+    # 5. Reply [key, popped_element] like the fast path
+    response = encode_value((list_key, popped_element))
+    # client.sendall(response
+    return response
+
+
+def handle_config(arguments: list, client: socket.socket):
+    if len(arguments) != 2 or not is_keyword(arguments[0], GET_KEYWORD):
+        # Handle wrong arguments or non-GET subcommands
+        response = b"-ERR wrong number of arguments for 'CONFIG GET' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "RPUSH":
-        # 1. Argument and Key setup
-        if not arguments:
-            # No arguments -> ignore / error (your code returns True and keeps listening)
-            return True
+    # 1. Extract the parameter name requested by the client
+    param_name = arguments[1].lower()
+    value = None
 
-        list_key = arguments[0]
-        elements = arguments[1:]
+    if param_name == b"dir":
+        value = DIR
+    elif param_name == b"dbfilename":
+        value = DB_FILENAME
 
-        # 2. Add all elements to the list (the helper functions handle DATA_LOCK internally)
-        #    - If the key already holds a list, append each pushed element.
-        #    - Otherwise create a new list key with the elements.
-        #    This models Redis: RPUSH adds elements to the tail.
-        if existing_list(list_key):
-            for element in elements:
-                append_to_list(list_key, element)
-        else:
-            set_list(list_key, elements, None)
+    # 2. Handle unknown parameters
+    if value is None:
+        # Per Redis spec, CONFIG GET for an unknown param returns nil array or empty array.
+        # A simple response of the parameter name and empty string is often used in clones.
+        value = ""
+        # We should still use the param_name for the first element
 
-        # IMPORTANT: compute the size *after insertion* and store it.
-        # Redis's RPUSH returns the list length *after* the push operation,
-        # even if the server immediately serves a blocked client afterwards.
-        size_to_report = size_of_list(list_key)  # Size that must be returned to RPUSH caller
+    # --- Correct RESP Serialization ---
 
-        # 3. Check if there are blocked clients waiting on this list
-        #    We will wake up the longest-waiting client (FIFO). The structure is:
-        #      BLOCKING_CLIENTS = { 'list_key': [cond1, cond2, ...], ... }
-        #    Each entry is a threading.Condition used to notify the blocked thread.
-        blocked_client_condition = None
+    # 3. Construct the RESP Array: *2 [param_name] [value]
+    response = encode_value((param_name, value))
 
-        # Acquire the BLOCKING_CLIENTS_LOCK while we inspect / modify the shared dict.
-        # This prevents races where multiple RPUSH/BLPOP threads change the waiters concurrently.
-        with BLOCKING_CLIENTS_LOCK:
-            # If there are waiters, pop the first one (FIFO: the longest-waiting client).
-            if list_key in BLOCKING_CLIENTS and BLOCKING_CLIENTS[list_key]:
-                blocked_client_condition = BLOCKING_CLIENTS[list_key].pop(0)
-                # Note: we intentionally *don't* delete the list_key here even if empty;
-                # your code deletes the dict key later when cleaning up waiters on timeout.
-                # The critical property is FIFO ordering via pop(0).
-
-        if blocked_client_condition:
-            # 3a. When serving a blocked client, we must remove an element from the list.
-            #     remove_elements_from_list pops from the head (LPOP semantics).
-            #     This returns the element that will be sent to the blocked client.
-            popped_elements = remove_elements_from_list(list_key, 1)
-
-            # (You already computed size_to_report before popping; do NOT recalc it here,
-            #  since Redis returns the size *after insertion*, not after serving waiters.)
-
-            if popped_elements:
-                popped_element = popped_elements[0]
-
-                # 3b. Build the RESP array that BLPOP expects:
-                #     *2\r\n
-                #     $<len(key)>\r\n<key>\r\n
-                #     $<len(element)>\r\n<element>\r\n
-                key_resp = b"$" + str(len(list_key.encode())).encode() + b"\r\n" + list_key.encode() + b"\r\n"
-                element_resp = b"$" + str(
-                    len(popped_element.encode())).encode() + b"\r\n" + popped_element.encode() + b"\r\n"
-                blpop_response = b"*2\r\n" + key_resp + element_resp
-
-                blocked_client_socket = blocked_client_condition.client_socket
-
-                # Send the BLPOP response directly to the blocked client's socket.
-                # We do this *before* notify() so that when the blocked thread wakes it
-                # can safely assume the response has already been sent (avoids a race).
-                try:
-                    blocked_client_socket.sendall(blpop_response)
-                except Exception:
-                    # If the blocked client disconnected between RPUSH discovering it and us sending,
-                    # sendall will fail; we catch and ignore because we still need to notify the thread
-                    # (or let its wait time out and the cleanup code remove it).
-                    pass
+    # client.sendall(response
+    return response
 
-                # 3c. Wake up the blocked thread by notifying its Condition.
-                #      According to Condition semantics, notify() should be called while
-                #      holding the Condition's own lock, so we enter the Condition context.
-                #      The blocked thread is waiting on the same Condition and will be awakened.
-                with blocked_client_condition:
-                    blocked_client_condition.notify()
 
-                    # 4. Final step: Send the RPUSH response (always the size immediately after insertion)
-        #    This is the value clients expect (e.g., ":1\r\n")
-        response = b":{size}\r\n".replace(b"{size}", str(size_to_report).encode())
+def handle_keys(arguments: list, client: socket.socket):
+    if len(arguments) != 1:
+        response = b"-ERR wrong number of arguments for 'KEYS' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "BLPOP":
-        # 1. Argument and Key setup
-        if len(arguments) != 2:
-            # Wrong number of args
-            return True
-
-        list_key = arguments[0]
-        try:
-            # Redis accepts fractional seconds for the timeout (e.g., 0.4).
-            # threading.Condition.wait() accepts float seconds as well, so use float().
-            timeout = float(arguments[1])
-        except ValueError:
-            # If parsing fails, send an error to the client (avoid silent failure).
-            response = b"-ERR timeout is not a float\r\n"
-            # client.sendall(response
-            return response
+    pattern = arguments[0]
 
-        # 2. Fast path: if the list already has elements, pop and return immediately.
-        #    This mirrors Redis: BLPOP behaves like LPOP when the list is non-empty.
-        if size_of_list(list_key) > 0:
-            list_elements = remove_elements_from_list(list_key, 1)
+    # The full keyspace listing is cached in the datastore until a key is added or removed
+    if pattern == b"*":
+        return get_all_keys_reply()
 
-            if list_elements:
-                popped_element = list_elements[0]
+    # Simple pattern matching: only supports '*' wildcard, so any other pattern
+    # matches at most the one key spelled exactly like it
+    with DATA_LOCK:
+        matching_keys = [pattern] if pattern in DATA_STORE else []
 
-                # Construct the RESP array [key, popped_element] and send it.
-                key_resp = b"$" + str(len(list_key.encode())).encode() + b"\r\n" + list_key.encode() + b"\r\n"
-                element_resp = b"$" + str(
-                    len(popped_element.encode())).encode() + b"\r\n" + popped_element.encode() + b"\r\n"
-                response = b"*2\r\n" + key_resp + element_resp
+    # Construct RESP Array response
+    response = encode_bulk_array(matching_keys)
+    # client.sendall(response
+    return response
 
-                # client.sendall(response
-                return response
-            # If remove_elements_from_list returns None unexpectedly, fall through to blocking.
-            # (This is unlikely if size_of_list returned > 0, but handling it avoids crashes.)
-
-        # 3. Blocking logic (list empty / non-existent)
-        #    We create a Condition object that the current thread will wait on.
-        client_condition = threading.Condition()
-        # Store the client socket on the Condition so RPUSH can send the response
-        # directly to the waiting client's socket when an element arrives.
-        client_condition.client_socket = client
-
-        # Register this Condition in BLOCKING_CLIENTS under the list_key.
-        # Use BLOCKING_CLIENTS_LOCK to guard concurrent access to the shared dict.
-        with BLOCKING_CLIENTS_LOCK:
-            BLOCKING_CLIENTS.setdefault(list_key, []).append(client_condition)
-
-        # Wait for notification or timeout.
-        # Note: timeout==0 handled as "block indefinitely" (wait() without timeout).
-        with client_condition:
-            if timeout == 0:
-                # Block forever until notify()
-                notified = client_condition.wait()
-            else:
-                # Block up to `timeout` seconds; wait() returns True if notified, False if timed out
-                notified = client_condition.wait(timeout)
-
-        # 4. Post-block handling
-        if notified:
-            # If True, RPUSH already sent the BLPOP response to the socket, so there's
-            # nothing more to do here. Just return True and continue listening for commands.
-            return True
-        else:
-            # Timeout occurred. We must remove this client from the BLOCKING_CLIENTS registry
-            # because RPUSH may never visit it (or might have visited it but failed to notify).
-            with BLOCKING_CLIENTS_LOCK:
-                # Defensive: only remove if it's still present (RPUSH could have popped it)
-                if client_condition in BLOCKING_CLIENTS.get(list_key, []):
-                    BLOCKING_CLIENTS[list_key].remove(client_condition)
-                    # If no more waiters, delete empty list to keep the dict tidy
-                    if not BLOCKING_CLIENTS[list_key]:
-                        del BLOCKING_CLIENTS[list_key]
 
-            # Send Null Array response on timeout: Redis returns "*-1\r\n" for BLPOP timeout.
-            response = b"*-1\r\n"
-            # client.sendall(response
-            return response
+def handle_subscribe(arguments: list, connection: "ClientConnection | None"):
+    # Construct RESP Array response
+    channel = arguments[0] if arguments else b""
+    subscribe(connection, channel)
+    num_subscriptions = num_client_subscriptions(connection)
 
-    elif command == "CONFIG":
-        if len(arguments) != 2 or arguments[0].upper() != "GET":
-            # Handle wrong arguments or non-GET subcommands
-            response = b"-ERR wrong number of arguments for 'CONFIG GET' command\r\n"
-            # client.sendall(response
-            return response
+    # [b"subscribe", channel, number of subscriptions]
+    response = encode_value((b"subscribe", channel, num_subscriptions))
+    # client.sendall(response
+    return response
 
-        # 1. Extract the parameter name requested by the client
-        param_name = arguments[1].lower()
-        value = None
-
-        if param_name == "dir":
-            value = DIR
-        elif param_name == "dbfilename":
-            value = DB_FILENAME
-
-        # 2. Handle unknown parameters
-        if value is None:
-            # Per Redis spec, CONFIG GET for an unknown param returns nil array or empty array.
-            # A simple response of the parameter name and empty string is often used in clones.
-            value = ""
-            # We should still use the param_name for the first element
-
-        # --- Correct RESP Serialization ---
-
-        # 3. Encode strings
-        param_bytes = param_name.encode('utf-8')
-        value_bytes = value.encode('utf-8')
-
-        # 4. Construct the RESP Array: *2 [param_name] [value]
-        response = (
-            # *2 (Array of 2 elements)
-                b"*2\r\n" +
-                # $len(param_name)
-                b"$" + str(len(param_bytes)).encode('utf-8') + b"\r\n" +
-                # param_name
-                param_bytes + b"\r\n" +
-                # $len(value)
-                b"$" + str(len(value_bytes)).encode('utf-8') + b"\r\n" +
-                # value
-                value_bytes + b"\r\n"
-        )
 
+def handle_publish(arguments: list, client: socket.socket):
+    if len(arguments) != 2:
+        response = b"-ERR wrong number of arguments for 'PUBLISH' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "KEYS":
-        if len(arguments) != 1:
-            response = b"-ERR wrong number of arguments for 'KEYS' command\r\n"
-            # client.sendall(response
-            return response
+    channel = arguments[0]
+    message = arguments[1]
+    recipients = 0
 
-        pattern = arguments[0]
+    with BLOCKING_CLIENTS_LOCK:
+        subscribers = list(CHANNEL_SUBSCRIBERS.get(channel, ()))
 
-        # Simple pattern matching: only supports '*' wildcard
-        with DATA_LOCK:
-            matching_keys = []
-            for key in DATA_STORE.keys():
-                if pattern == "*" or pattern == key:
-                    matching_keys.append(key)
+    if subscribers:
+        # Construct the message RESP Array once; every subscriber gets the same bytes.
+        # It is queued on each subscriber's outbox, so a subscriber that is not reading
+        # never blocks the publisher.
+        response = encode_value((b"message", channel, message))
+        for subscriber in subscribers:
+            try:
+                send_to_connection(subscriber, [response])
+                recipients += 1
+            except OSError:
+                pass  # Ignore send errors for subscribers
 
-        # Construct RESP Array response
-        response_parts = []
-        for key in matching_keys:
-            key_bytes = key.encode()
-            length_bytes = str(len(key_bytes)).encode()
-            response_parts.append(b"$" + length_bytes + b"\r\n" + key_bytes + b"\r\n")
+    # Send number of recipients to publisher
+    response = encode_integer(recipients)
+    # client.sendall(response
+    return response
 
-        response = b"*" + str(len(matching_keys)).encode() + b"\r\n" + b"".join(response_parts)
-        # client.sendall(response
-        return response
 
-    elif command == "SUBSCRIBE":
-        # Construct RESP Array response
-        channel = arguments[0] if arguments else ""
-        subscribe(client, channel)
-        num_subscriptions = num_client_subscriptions(client)
+def handle_unsubscribe(arguments: list, connection: "ClientConnection | None"):
+    channel = arguments[0] if arguments else b""
 
-        response_parts = []
-        response_parts.append(b"$" + str(len("subscribe".encode())).encode() + b"\r\n" + b"subscribe" + b"\r\n")
-        response_parts.append(b"$" + str(len(channel.encode())).encode() + b"\r\n" + channel.encode() + b"\r\n")
-        response_parts.append(b":" + str(num_subscriptions).encode() + b"\r\n")  # Number of subscriptions
+    unsubscribe(connection, channel)
+    num_subscriptions = num_client_subscriptions(connection)
 
-        response = b"*" + str(len(response_parts)).encode() + b"\r\n" + b"".join(response_parts)
+    # [b"unsubscribe", channel, number of subscriptions]
+    response = encode_value((b"unsubscribe", channel, num_subscriptions))
+    # client.sendall(response
+    return response
+
+
+def handle_zadd(arguments: list, client: socket.socket):
+    if len(arguments) < 3:
+        response = b"-ERR wrong number of arguments for 'zadd' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "PUBLISH":
-        if len(arguments) != 2:
-            response = b"-ERR wrong number of arguments for 'PUBLISH' command\r\n"
-            # client.sendall(response
-            return response
+    set_key = arguments[0]
 
-        channel = arguments[0]
-        message = arguments[1]
-        recipients = 0
-
-        with BLOCKING_CLIENTS_LOCK:
-            if channel in CHANNEL_SUBSCRIBERS:
-                subscribers = CHANNEL_SUBSCRIBERS[channel]
-                for subscriber in subscribers:
-                    # Construct the message RESP Array
-                    response_parts = []
-                    response_parts.append(b"$" + str(len("message".encode())).encode() + b"\r\n" + b"message" + b"\r\n")
-                    response_parts.append(
-                        b"$" + str(len(channel.encode())).encode() + b"\r\n" + channel.encode() + b"\r\n")
-                    response_parts.append(
-                        b"$" + str(len(message.encode())).encode() + b"\r\n" + message.encode() + b"\r\n")
-
-                    response = b"*" + str(len(response_parts)).encode() + b"\r\n" + b"".join(response_parts)
-                    try:
-                        subscriber.sendall(response)
-                        recipients += 1
-                    except Exception:
-                        pass  # Ignore send errors for subscribers
-
-        # Send number of recipients to publisher
-        response = b":" + str(recipients).encode() + b"\r\n"
+    if len(arguments) > 3:
+        response = b"-ERR only single score/member pair supported in this stage\r\n"
         # client.sendall(response
         return response
 
-    elif command == "UNSUBSCRIBE":
-        channel = arguments[0] if arguments else ""
-
-        unsubscribe(client, channel)
-        num_subscriptions = num_client_subscriptions(client)
+    # Extract the single score and member pair
+    score_str = arguments[1]
+    member = arguments[2]
 
-        response_parts = []
-        response_parts.append(b"$" + str(len("unsubscribe".encode())).encode() + b"\r\n" + b"unsubscribe" + b"\r\n")
-        response_parts.append(b"$" + str(len(channel.encode())).encode() + b"\r\n" + channel.encode() + b"\r\n")
-        response_parts.append(b":" + str(num_subscriptions).encode() + b"\r\n")  # Number of subscriptions
-        response = b"*" + str(len(response_parts)).encode() + b"\r\n" + b"".join(response_parts)
+    try:
+        # The helper handles the addition/update and returns the count of new members (1 or 0).
+        num_new_elements = add_to_sorted_set(set_key, member, score_str)
+    except Exception:
+        # Catch exceptions from the helper (e.g., if score_str is not a number)
+        response = b"-ERR value is not a valid float\r\n"
         # client.sendall(response
         return response
 
-    elif command == "ZADD":
-        if len(arguments) < 3:
-            response = b"-ERR wrong number of arguments for 'zadd' command\r\n"
-            # client.sendall(response
-            return response
+    # ZADD returns the number of *newly added* elements.
+    # Encode as a RESP Integer (e.g., :1\r\n)
+    response = encode_integer(num_new_elements)
+    # client.sendall(response
+    return response
 
-        set_key = arguments[0]
 
-        if len(arguments) > 3:
-            response = b"-ERR only single score/member pair supported in this stage\r\n"
-            # client.sendall(response
-            return response
+def handle_zrank(arguments: list, client: socket.socket):
+    set_key = arguments[0] if len(arguments) > 0 else b""
+    member = arguments[1] if len(arguments) > 1 else b""
+
+    rank = get_sorted_set_rank(set_key, member)
+    if rank is None:
+        response = NIL_BULK  # RESP Null Bulk String
+    else:
+        response = encode_integer(rank)
 
-        # Extract the single score and member pair
-        score_str = arguments[1]
-        member = arguments[2]
+    # client.sendall(response
+    return response
 
-        try:
-            # The helper handles the addition/update and returns the count of new members (1 or 0).
-            num_new_elements = add_to_sorted_set(set_key, member, score_str)
-        except Exception:
-            # Catch exceptions from the helper (e.g., if score_str is not a number)
-            response = b"-ERR value is not a valid float\r\n"
-            # client.sendall(response
-            return response
 
-        # ZADD returns the number of *newly added* elements.
-        # Encode as a RESP Integer (e.g., :1\r\n)
-        response = b":" + str(num_new_elements).encode() + b"\r\n"
+def handle_zrange(arguments: list, client: socket.socket):
+    if len(arguments) < 3:
+        response = b"-ERR wrong number of arguments for 'ZRANGE' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "ZRANK":
-        set_key = arguments[0] if len(arguments) > 0 else ""
-        member = arguments[1] if len(arguments) > 1 else ""
+    set_key = arguments[0]
+    try:
+        start = int(arguments[1])
+        end = int(arguments[2])
+    except ValueError:
+        response = b"-ERR start or end is not an integer\r\n"
+        # client.sendall(response
+        return response
 
-        rank = get_sorted_set_rank(set_key, member)
-        if rank is None:
-            response = b"$-1\r\n"  # RESP Null Bulk String
-        else:
-            response = b":" + str(rank).encode() + b"\r\n"
+    list_of_members = get_sorted_set_range(set_key, start, end)
 
+    response = encode_bulk_array(list_of_members)
+    # client.sendall(response
+    return response
+
+
+def handle_zcard(arguments: list, client: socket.socket):
+    if len(arguments) < 1:
+        response = b"-ERR wrong number of arguments for 'ZCARD' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "ZRANGE":
-        if len(arguments) < 3:
-            response = b"-ERR wrong number of arguments for 'ZRANGE' command\r\n"
-            # client.sendall(response
-            return response
+    set_key = arguments[0]
 
-        set_key = arguments[0]
-        try:
-            start = int(arguments[1])
-            end = int(arguments[2])
-        except ValueError:
-            response = b"-ERR start or end is not an integer\r\n"
-            # client.sendall(response
-            return response
+    with DATA_LOCK:
+        if set_key in SORTED_SETS:
+            cardinality = len(SORTED_SETS[set_key])
+        else:
+            cardinality = 0
 
-        list_of_members = get_sorted_set_range(set_key, start, end)
+    response = encode_integer(cardinality)
+    # client.sendall(response
+    return response
 
-        response_parts = []
-        for member in list_of_members:
-            member_bytes = member.encode() if isinstance(member, str) else bytes(member)
-            response_parts.append(b"$" + str(len(member_bytes)).encode() + b"\r\n" + member_bytes + b"\r\n")
-        response = b"*" + str(len(list_of_members)).encode() + b"\r\n" + b"".join(response_parts)
+
+def handle_zscore(arguments: list, client: socket.socket):
+    if len(arguments) < 2:
+        response = b"-ERR wrong number of arguments for 'ZSCORE' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "ZCARD":
-        if len(arguments) < 1:
-            response = b"-ERR wrong number of arguments for 'ZCARD' command\r\n"
-            # client.sendall(response
-            return response
+    set_key = arguments[0]
+    member = arguments[1]
 
-        set_key = arguments[0]
+    score = get_zscore(set_key, member)
 
-        with DATA_LOCK:
-            if set_key in SORTED_SETS:
-                cardinality = len(SORTED_SETS[set_key])
-            else:
-                cardinality = 0
+    if score is None:
+        response = NIL_BULK  # RESP Null Bulk String
+    else:
+        score_str = str(score)
+        response = encode_bulk_string(score_str)
 
-        response = b":" + str(cardinality).encode() + b"\r\n"
+    # client.sendall(response
+    return response
+
+
+def handle_zrem(arguments: list, client: socket.socket):
+    if len(arguments) < 2:
+        response = b"-ERR wrong number of arguments for 'ZREM' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "ZSCORE":
-        if len(arguments) < 2:
-            response = b"-ERR wrong number of arguments for 'ZSCORE' command\r\n"
-            # client.sendall(response
-            return response
+    set_key = arguments[0]
+    members = arguments[1]
 
-        set_key = arguments[0]
-        member = arguments[1]
+    removed_count = remove_from_sorted_set(set_key, members)
 
-        score = get_zscore(set_key, member)
+    response = encode_integer(removed_count)
+    # client.sendall(response
+    return response
 
-        if score is None:
-            response = b"$-1\r\n"  # RESP Null Bulk String
-        else:
-            score_str = str(score)
-            score_bytes = score_str.encode()
-            length_bytes = str(len(score_bytes)).encode()
-            response = b"$" + length_bytes + b"\r\n" + score_bytes + b"\r\n"
 
+def handle_type(arguments: list, client: socket.socket):
+    if len(arguments) < 1:
+        response = b"-ERR wrong number of arguments for 'TYPE' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "ZREM":
-        if len(arguments) < 2:
-            response = b"-ERR wrong number of arguments for 'ZREM' command\r\n"
-            # client.sendall(response
-            return response
+    key = arguments[0]
 
-        set_key = arguments[0]
-        members = arguments[1]
+    data_entry = get_data_entry(key)
 
-        removed_count = remove_from_sorted_set(set_key, members)
+    if data_entry is None:
+        type_str = "none"
+    else:
+        type_str = data_entry.type
+
+    response = encode_bulk_string(type_str)
+
+    # client.sendall(response
+    return response
 
-        response = b":" + str(removed_count).encode() + b"\r\n"
+
+def handle_xadd(arguments: list, client: socket.socket):
+    # XADD requires at least: key, id, field, value (4 arguments), and even number of field/value pairs
+
+    if len(arguments) < 4 or (len(arguments) - 2) % 2 != 0:
+        response = b"-ERR wrong number of arguments for 'XADD' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "TYPE":
-        if len(arguments) < 1:
-            response = b"-ERR wrong number of arguments for 'TYPE' command\r\n"
-            # client.sendall(response
-            return response
-
-        key = arguments[0]
+    key = arguments[0]
+    # Stream IDs are kept as text ("ms-seq"); keys, fields and values stay as bytes
+    entry_id = arguments[1].decode()
+    fields = {}
+    for i in range(2, len(arguments) - 1, 2):
+        fields[arguments[i]] = arguments[i + 1]
 
-        data_entry = get_data_entry(key)
+    new_entry_id_or_error = xadd(key, entry_id, fields)
 
-        if data_entry is None:
-            type_str = "none"
-        else:
-            type_str = data_entry.get("type", "none")
+    i  # Check if xadd returned an error (RESP errors start with '-')
+    if new_entry_id_or_error.startswith(b'-'):
+        response = new_entry_id_or_error
+        # client.sendall(response
+        return response
+    else:
+        # Success: new_entry_id_or_error is the raw ID bytes (e.g. b"1-0").
+        # Format as a RESP Bulk String. Fixed the incorrect .encode() call on a bytes object.
+        raw_id_bytes = new_entry_id_or_error
+        waiter = None
+
+        with BLOCKING_STREAMS_LOCK:
+            waiters = BLOCKING_STREAMS.get(key)
+            if waiters:
+                waiter = waiters.popleft()
+                if not waiters:
+                    del BLOCKING_STREAMS[key]
+
+        if waiter is not None:
+            # Get the single new entry that was just added (it's the last one)
+            with DATA_LOCK:  # Acquire lock to safely access STREAMS
+                new_entry = STREAMS[key][-1]
+
+            # Completing the waiter's Future wakes its XREAD, which replies on its own connection
+            waiter.set_result(new_entry)
+
+        response = encode_bulk_string(raw_id_bytes)
+        # client.sendall(response
+        return response
 
-        type_bytes = type_str.encode()
-        length_bytes = str(len(type_bytes)).encode()
-        response = b"$" + length_bytes + b"\r\n" + type_bytes + b"\r\n"
 
+def handle_xrange(arguments: list, client: socket.socket):
+    if len(arguments) < 3:
+        response = b"-ERR wrong number of arguments for 'XRANGE' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "XADD":
-        # XADD requires at least: key, id, field, value (4 arguments), and even number of field/value pairs
+    key = arguments[0]
+    start_id = arguments[1].decode()
+    end_id = arguments[2].decode()
 
-        if len(arguments) < 4 or (len(arguments) - 2) % 2 != 0:
-            response = b"-ERR wrong number of arguments for 'XADD' command\r\n"
-            # client.sendall(response
-            return response
+    entries = xrange(key, start_id, end_id)
 
-        key = arguments[0]
-        entry_id = arguments[1]
-        fields = {}
-        for i in range(2, len(arguments) - 1, 2):
-            fields[arguments[i]] = arguments[i + 1]
+    # Construct RESP Array for each entry: [entry_id, [field1, value1, field2, value2, ...]]
+    response = encode_stream_entries(entries)
+    # client.sendall(response
+    return response
 
-        new_entry_id_or_error = xadd(key, entry_id, fields)
 
-        i  # Check if xadd returned an error (RESP errors start with '-')
-        if new_entry_id_or_error.startswith(b'-'):
-            response = new_entry_id_or_error
-            # client.sendall(response
-            return response
-        else:
-            # Success: new_entry_id_or_error is the raw ID bytes (e.g. b"1-0").
-            # Format as a RESP Bulk String. Fixed the incorrect .encode() call on a bytes object.
-            raw_id_bytes = new_entry_id_or_error
-            blocked_client_condition = None
-            new_entry = None
+def handle_xread(arguments: list, client: socket.socket, block: bool = True):
+    # Format: XREAD [BLOCK <ms>] STREAMS key1 key2 ... id1 id2 ...
 
-            with BLOCKING_STREAMS_LOCK:
-                if key in BLOCKING_STREAMS and BLOCKING_STREAMS[key]:
-                    blocked_client_condition = BLOCKING_STREAMS[key].pop(0)
-
-            if blocked_client_condition:
-                # Get the single new entry that was just added (it's the last one)
-                with DATA_LOCK:  # Acquire lock to safely access STREAMS
-                    if key in STREAMS and STREAMS[key]:
-                        new_entry = STREAMS[key][-1]
-
-                if new_entry:
-                    # Prepare the data structure for serialization (single entry for a single stream)
-                    stream_data_to_send = {key: [new_entry]}
-                    xread_block_response = _xread_serialize_response(stream_data_to_send)
-
-                    blocked_client_socket = blocked_client_condition.client_socket
-
-                    # Send the XREAD BLOCK response directly to the blocked client's socket.
-                    try:
-                        blocked_client_socket.sendall(xread_block_response)
-                    except Exception:
-                        pass  # Ignore send errors
-
-                    # Wake up the blocked thread by notifying its Condition.
-                    with blocked_client_condition:
-                        blocked_client_condition.notify()
-
-            length_bytes = str(len(raw_id_bytes)).encode()
-            response = b"$" + length_bytes + b"\r\n" + raw_id_bytes + b"\r\n"
-            # client.sendall(response
-            return response
+    # 1. Parse optional BLOCK argument
+    arguments_start_index = 0
+    timeout_ms = None
 
-    elif command == "XRANGE":
-        if len(arguments) < 3:
-            response = b"-ERR wrong number of arguments for 'XRANGE' command\r\n"
+    if len(arguments) >= 3 and is_keyword(arguments[0], BLOCK_KEYWORD):
+        try:
+            # Timeout is in milliseconds, convert to seconds for threading.wait
+            timeout_ms = int(arguments[1])
+            arguments_start_index = 2
+        except ValueError:
+            response = b"-ERR timeout is not an integer\r\n"
             # client.sendall(response
             return response
 
-        key = arguments[0]
-        start_id = arguments[1]
-        end_id = arguments[2]
+    # 2. Check for STREAMS keyword and argument count
+    if len(arguments) < arguments_start_index + 3 or not is_keyword(arguments[arguments_start_index], STREAMS_KEYWORD):
+        response = b"-ERR wrong number of arguments or missing STREAMS keyword for 'XREAD' command\r\n"
+        # client.sendall(response
+        return response
 
-        entries = xrange(key, start_id, end_id)
+    # 3. Find the split point between keys and IDs
+    streams_keyword_index = arguments_start_index
+    args_after_streams = arguments[streams_keyword_index + 1:]
+    num_args_after_streams = len(args_after_streams)
 
-        response_parts = []
-        for entry in entries:
-            entry_id = entry["id"]
-            fields = entry["fields"]
-
-            # Construct RESP Array for each entry: [entry_id, [field1, value1, field2, value2, ...]]
-            entry_parts = []
-            entry_id_bytes = entry_id.encode()
-            entry_parts.append(b"$" + str(len(entry_id_bytes)).encode() + b"\r\n" + entry_id_bytes + b"\r\n")
-
-            # Now construct the inner array of fields and values
-            field_value_parts = []
-            for field, value in fields.items():
-                field_bytes = field.encode()
-                value_bytes = value.encode()
-                field_value_parts.append(b"$" + str(len(field_bytes)).encode() + b"\r\n" + field_bytes + b"\r\n")
-                field_value_parts.append(b"$" + str(len(value_bytes)).encode() + b"\r\n" + value_bytes + b"\r\n")
-
-            # Combine field/value parts into an array
-            field_value_array = b"*" + str(len(field_value_parts)).encode() + b"\r\n" + b"".join(field_value_parts)
-            entry_parts.append(field_value_array)
-
-            # Combine entry parts into an array
-            entry_array = b"*" + str(len(entry_parts)).encode() + b"\r\n" + b"".join(entry_parts)
-            response_parts.append(entry_array)
-        response = b"*" + str(len(response_parts)).encode() + b"\r\n" + b"".join(response_parts)
+    if num_args_after_streams % 2 != 0:
+        response = b"-ERR unaligned key/id pairs for 'XREAD' command\r\n"
         # client.sendall(response
         return response
 
-    elif command == "XREAD":
-        # Format: XREAD [BLOCK <ms>] STREAMS key1 key2 ... id1 id2 ...
-
-        # 1. Parse optional BLOCK argument
-        arguments_start_index = 0
-        timeout_ms = None
+    num_keys = num_args_after_streams // 2
 
-        if len(arguments) >= 3 and arguments[0].upper() == "BLOCK":
-            try:
-                # Timeout is in milliseconds, convert to seconds for threading.wait
-                timeout_ms = int(arguments[1])
-                arguments_start_index = 2
-            except ValueError:
-                response = b"-ERR timeout is not an integer\r\n"
-                # client.sendall(response
-                return response
+    keys_start_index = 0
+    keys = args_after_streams[keys_start_index: keys_start_index + num_keys]
+    ids_start_index = keys_start_index + num_keys
+    ids = [stream_id.decode() for stream_id in args_after_streams[ids_start_index:]]
 
-        # 2. Check for STREAMS keyword and argument count
-        if len(arguments) < arguments_start_index + 3 or arguments[arguments_start_index].upper() != "STREAMS":
-            response = b"-ERR wrong number of arguments or missing STREAMS keyword for 'XREAD' command\r\n"
-            # client.sendall(response
-            return response
+    resolved_ids = []
+    for key, last_id in zip(keys, ids):
+        if last_id == "$":
+            resolved_ids.append(get_stream_max_id(key))
+        else:
+            resolved_ids.append(last_id)
 
-        # 3. Find the split point between keys and IDs
-        streams_keyword_index = arguments_start_index
-        args_after_streams = arguments[streams_keyword_index + 1:]
-        num_args_after_streams = len(args_after_streams)
+    # 4. Main XREAD logic loop (synchronous part - fast path)
+    stream_data = xread(keys, resolved_ids)
 
-        if num_args_after_streams % 2 != 0:
-            response = b"-ERR unaligned key/id pairs for 'XREAD' command\r\n"
-            # client.sendall(response
-            return response
-
-        num_keys = num_args_after_streams // 2
+    if stream_data:
+        # Non-blocking path: Data is available. Serialize and send immediately.
+        response = _xread_serialize_response(stream_data)
+        # client.sendall(response
+        return response
 
-        keys_start_index = 0
-        keys = args_after_streams[keys_start_index: keys_start_index + num_keys]
-        ids_start_index = keys_start_index + num_keys
-        ids = args_after_streams[ids_start_index:]
+    # 5. Blocking path
+    if timeout_ms is not None:
+        # We are blocking: list of entries is empty.
 
-        resolved_ids = []
-        for key, last_id in zip(keys, ids):
-            if last_id == "$":
-                resolved_ids.append(get_stream_max_id(key))
-            else:
-                resolved_ids.append(last_id)
+        if not block:
+            # Inside MULTI/EXEC XREAD BLOCK answers like a timeout instead of blocking
+            return NIL_ARRAY
 
-        # 4. Main XREAD logic loop (synchronous part - fast path)
-        stream_data = xread(keys, resolved_ids)
+        if timeout_ms == 0:
+            # BLOCK 0 means block indefinitely.
+            timeout = None
+        else:
+            # Convert ms to seconds.
+            timeout = timeout_ms / 1000.0
 
-        if stream_data:
-            # Non-blocking path: Data is available. Serialize and send immediately.
-            response = _xread_serialize_response(stream_data)
+        # Since only one key/id pair is supported in this stage, enforce it for blocking
+        if len(keys) != 1:
+            response = b"-ERR only single key blocking supported in this stage\r\n"
             # client.sendall(response
             return response
 
-        # 5. Blocking path
-        if timeout_ms is not None:
-            # We are blocking: list of entries is empty.
-
-            if timeout_ms == 0:
-                # BLOCK 0 means block indefinitely.
-                timeout = None
-            else:
-                # Convert ms to seconds.
-                timeout = timeout_ms / 1000.0
-
-            # Since only one key/id pair is supported in this stage, enforce it for blocking
-            if len(keys) != 1:
-                response = b"-ERR only single key blocking supported in this stage\r\n"
-                # client.sendall(response
-                return response
+        key_to_block = keys[0]
 
-            key_to_block = keys[0]
+        # Register a Future that XADD completes with the new entry
+        waiter = Future()
+        waiter.client_socket = client
 
-            # Create and register the condition
-            client_condition = threading.Condition()
-            client_condition.client_socket = client
-            client_condition.key = key_to_block
+        with BLOCKING_STREAMS_LOCK:
+            waiters = BLOCKING_STREAMS.get(key_to_block)
+            if waiters is None:
+                waiters = BLOCKING_STREAMS[key_to_block] = deque()
+            waiters.append(waiter)
 
+        # Wait for an entry or the timeout
+        try:
+            new_entry = waiter.result(timeout)
+        except FutureTimeoutError:
+            # 6. Timeout occurred. Clean up the blocking registration.
             with BLOCKING_STREAMS_LOCK:
-                BLOCKING_STREAMS.setdefault(key_to_block, []).append(client_condition)
-
-            # Wait for notification or timeout
-            notified = False
-            with client_condition:
-                if timeout is None:
-                    notified = client_condition.wait()
-                else:
-                    notified = client_condition.wait(timeout)
-
-            # 6. Post-block handling
-            if notified:
-                # If True, XADD already sent the response.
-                return None
-            else:
-                # Timeout occurred. Clean up the blocking registration.
-                with BLOCKING_STREAMS_LOCK:
-                    if client_condition in BLOCKING_STREAMS.get(key_to_block, []):
-                        BLOCKING_STREAMS[key_to_block].remove(client_condition)
-                        if not BLOCKING_STREAMS[key_to_block]:
-                            del BLOCKING_STREAMS[key_to_block]
-
+                waiters = BLOCKING_STREAMS.get(key_to_block)
+                served = not (waiters and waiter in waiters)
+                if not served:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del BLOCKING_STREAMS[key_to_block]
+
+            if not served:
                 # Send Null Array response on timeout: Redis returns "*-1\r\n"
-                response = b"*-1\r\n"
+                response = NIL_ARRAY
                 # client.sendall(response
                 return response
 
-        # 7. Non-blocking path (no data, no BLOCK keyword) - returns Null Array
-        response = b"*0\r\n"
+            # An XADD claimed this waiter just as the timeout fired; its entry is on the way
+            new_entry = waiter.result()
+
+        response = _xread_serialize_response({key_to_block: [new_entry]})
         # client.sendall(response
         return response
 
-    elif command == "INCR":
-        if len(arguments) != 1:
-            response = b"-ERR wrong number of arguments for 'incr' command\r\n"
-            # client.sendall(response
-            return response
-
-        key = arguments[0]
+    # 7. Non-blocking path (no data, no BLOCK keyword) - returns Null Array
+    response = EMPTY_ARRAY
+    # client.sendall(response
+    return response
 
-        # Call the atomic helper function
-        new_value, error_message = increment_key_value(key)
 
-        if error_message:
-            # Handle error from the helper (WRONGTYPE or not an integer/overflow)
-            # client.sendall(error_message.encode())
-            return error_message.encode()
-        else:
-            # Success: new_value is an integer. Return RESP Integer.
-            response = b":" + str(new_value).encode() + b"\r\n"
-            # client.sendall(response
-            return response
-
-    elif command == "MULTI":
+def handle_incr(arguments: list, client: socket.socket):
+    if len(arguments) != 1:
+        response = b"-ERR wrong number of arguments for 'incr' command\r\n"
+        # client.sendall(response
+        return response
 
-        if is_client_in_multi(client):
-            response = b"-ERR MULTI calls can not be nested\r\n"
-            # client.sendall(response
-            return response
+    key = arguments[0]
 
-        # Set the client's state to "in transaction"
-        set_client_in_multi(client, True)
+    # Call the atomic helper function
+    new_value, error_message = increment_key_value(key)
 
-        response = b"+OK\r\n"
+    if error_message:
+        # Handle error from the helper (WRONGTYPE or not an integer/overflow)
+        # client.sendall(error_message)
+        return error_message
+    else:
+        # Success: new_value is an integer. Return RESP Integer.
+        response = encode_integer(new_value)
         # client.sendall(response
         return response
 
-    elif command == "EXEC":
-        if is_client_in_multi(client):
-
-            queued_commands = get_client_queued_commands(client)
-            set_client_in_multi(client, False)
 
-            if not queued_commands:
-                # The required response for an empty transaction is an empty RESP Array.
-                response = b"*0\r\n"
-                # client.sendall(response
-                return response
+def handle_multi(arguments: list, connection: "ClientConnection | None"):
+    if connection is None:
+        # e.g. the replication link from the master, which never opens transactions
+        return b"-ERR MULTI is not supported on this connection\r\n"
 
-            # 4. Execute all queued commands and collect responses
-            response_parts = []
-            for cmd, args in queued_commands:
-                # Recursively call execute_single_command for each queued command
-                # The execution should not cause nested queuing, as the multi flag is now False
-                # and the recursive call won't re-trigger the main handle_command's checks.
-                try:
-                    # We pass the client socket for execution (e.g., SET/INCR needs it)
-                    cmd_response = execute_single_command(cmd, args, client)
+    if connection.in_multi:
+        response = b"-ERR MULTI calls can not be nested\r\n"
+        # client.sendall(response
+        return response
 
-                    # EXEC only returns the actual response, never a connection close signal
-                    if cmd == "QUIT":
-                        cmd_response = b"+OK\r\n"  # We don't actually close the connection yet
+    # Set the client's state to "in transaction" with an empty command queue
+    connection.in_multi = True
+    connection.queued_commands = []
 
-                    # Check for blocking/transaction control commands that might return False/True signals
-                    if isinstance(cmd_response, bool):
-                        # This should not happen if the refactoring is correct, but defensively use a generic error
-                        cmd_response = b"-ERR Internal execution error\r\n"
+    response = OK
+    # client.sendall(response
+    return response
 
-                except Exception:
-                    # This catches errors during the execution of a queued command (e.g., wrong type)
-                    cmd_response = b"-ERR EXEC-failed during command execution\r\n"
 
-                response_parts.append(cmd_response)
+def handle_exec(arguments: list, connection: "ClientConnection | None"):
+    if connection is not None and connection.in_multi:
 
-            # 5. Assemble the final RESP Array
-            final_response = b"*" + str(len(response_parts)).encode() + b"\r\n" + b"".join(response_parts)
+        queued_commands = connection.queued_commands
+        connection.in_multi = False
+        connection.queued_commands = []
 
-            return final_response
-        else:
-            response = b"-ERR EXEC without MULTI\r\n"
+        if not queued_commands:
+            # The required response for an empty transaction is an empty RESP Array.
+            response = EMPTY_ARRAY
             # client.sendall(response
             return response
 
-    elif command == "DISCARD":
-        if is_client_in_multi(client):
-            response = b"+OK\r\n"
-            set_client_in_multi(client, False)
-            # client.sendall(response
-            return response
-        else:
-            response = b"-ERR DISCARD without MULTI\r\n"
-            # client.sendall(response
-            return response
+        # 4. Execute all queued commands and collect responses
+        response_parts = []
+        for cmd, args in queued_commands:
+            # Recursively call execute_single_command for each queued command
+            # The execution should not cause nested queuing, as the multi flag is now False
+            # and the recursive call won't re-trigger the main handle_command's checks.
+            try:
+                if cmd in BLOCKING_COMMANDS:
+                    # As in Redis, nothing blocks inside a transaction: BLPOP and XREAD BLOCK
+                    # answer nil right away and WAIT reports the replicas already caught up
+                    cmd_response = COMMAND_HANDLERS[cmd](args, connection.sock, block=False)
+                else:
+                    # We pass the client socket for execution (e.g., SET/INCR needs it)
+                    cmd_response = execute_single_command(cmd, args, connection.sock, connection)
 
-    elif command == "INFO":  # <--- ADDED INFO COMMAND
-        if len(arguments) == 0:
-            # INFO without arguments should return all sections,
-            # but for this stage, we'll only respond with the replication section if no argument is provided.
-            section = "replication"
-        elif len(arguments) == 1:
-            section = arguments[0].lower()
-        else:
-            response = b"-ERR wrong number of arguments for 'INFO' command\r\n"
-            return response
+                # EXEC only returns the actual response, never a connection close signal
+                if cmd == "QUIT":
+                    cmd_response = OK  # We don't actually close the connection yet
 
-        # Only support 'replication' section for this stage
-        if section == "replication":
-            # Use the global SERVER_ROLE
-            info_content = f"role:{SERVER_ROLE}\r\n"
+                # Check for blocking/transaction control commands that might return False/True signals
+                if isinstance(cmd_response, bool):
+                    # This should not happen if the refactoring is correct, but defensively use a generic error
+                    cmd_response = b"-ERR Internal execution error\r\n"
 
-            # Add master_replid and master_repl_offset only if we are the master
-            if SERVER_ROLE == "master":
-                # Use the global hardcoded values
-                info_content += f"master_replid:{MASTER_REPLID}\r\n"
-                info_content += f"master_repl_offset:{MASTER_REPL_OFFSET}\r\n"
+            except Exception:
+                # This catches errors during the execution of a queued command (e.g., wrong type)
+                cmd_response = b"-ERR EXEC-failed during command execution\r\n"
 
-            # Encode the string as a RESP Bulk String
-            info_bytes = info_content.encode()
-            length_bytes = str(len(info_bytes)).encode()
+            response_parts.append(cmd_response)
 
-            # Format: $length\r\ncontent\r\n
-            response = b"$" + length_bytes + b"\r\n" + info_bytes + b"\r\n"
+        # 5. Assemble the final RESP Array
+        final_response = encode_array(response_parts)
 
-            return response
+        return final_response
+    else:
+        response = b"-ERR EXEC without MULTI\r\n"
+        # client.sendall(response
+        return response
 
-        else:
-            # For unsupported sections, return an empty bulk string (or whatever
-            # the specific server behavior is, but an empty one is often safe for unimplemented)
-            # A simpler approach is to return a bulk string containing only the section header.
-            info_content = f"#{section.capitalize()}\r\n"
-            info_bytes = info_content.encode()
-            length_bytes = str(len(info_bytes)).encode()
-            response = b"$" + length_bytes + b"\r\n" + info_bytes + b"\r\n"
-            return response
 
-    elif command == "WAIT":
-        if len(arguments) != 2:
-            response = b"-ERR wrong number of arguments for 'WAIT' command\r\n"
-            return response
+def handle_discard(arguments: list, connection: "ClientConnection | None"):
+    if connection is not None and connection.in_multi:
+        response = OK
+        connection.in_multi = False
+        connection.queued_commands = []
+        # client.sendall(response
+        return response
+    else:
+        response = b"-ERR DISCARD without MULTI\r\n"
+        # client.sendall(response
+        return response
 
-        try:
-            num_replicas_required = int(arguments[0])
-            timeout_ms = int(arguments[1])
-        except ValueError:
-            response = b"-ERR numreplicas or timeout is not an integer\r\n"
-            return response
 
-        target_offset = MASTER_REPL_OFFSET
-        timeout_s = timeout_ms / 1000.0
-        start_time = time.time()
+def handle_info(arguments: list, client: socket.socket):
+    if len(arguments) == 0:
+        # INFO without arguments should return all sections,
+        # but for this stage, we'll only respond with the replication section if no argument is provided.
+        section = "replication"
+    elif len(arguments) == 1:
+        section = arguments[0].decode().lower()
+    else:
+        response = b"-ERR wrong number of arguments for 'INFO' command\r\n"
+        return response
 
-        # Optimization: If target is 0, required replicas is 0, or no replicas are connected, return immediately.
-        if target_offset == 0 or num_replicas_required == 0 or not REPLICA_SOCKETS:
-            num_connected = len(REPLICA_SOCKETS)
-            return b":" + str(num_connected).encode() + b"\r\n"
+    # Only support 'replication' section for this stage
+    if section == "replication":
+        # Use the global SERVER_ROLE
+        info_content = f"role:{SERVER_ROLE}\r\n"
 
-        # The master must send GETACK to all replicas to get their current offset
-        getack_command = b"*3\r\n$8\r\nREPLCONF\r\n$6\r\nGETACK\r\n$1\r\n*\r\n"
+        # Add master_replid and master_repl_offset only if we are the master
+        if SERVER_ROLE == "master":
+            # Use the global hardcoded values
+            info_content += f"master_replid:{MASTER_REPLID}\r\n"
+            info_content += f"master_repl_offset:{MASTER_REPL_OFFSET}\r\n"
 
-        # 1. Initial send of GETACK to ALL replicas (Poll phase)
-        replicas_to_remove = []
-        for replica_socket in list(REPLICA_SOCKETS):
-            try:
-                replica_socket.sendall(getack_command)
-            except Exception:
-                # Mark failed sockets for removal
-                replicas_to_remove.append(replica_socket)
+        # Encode the string as a RESP Bulk String
+        # Format: $length\r\ncontent\r\n
+        response = encode_bulk_string(info_content)
 
-        # Clean up dead replicas
-        for dead_socket in replicas_to_remove:
-            if dead_socket in REPLICA_SOCKETS:
-                REPLICA_SOCKETS.remove(dead_socket)
-                REPLICA_ACK_OFFSETS.pop(dead_socket, None)  # Also remove from ACK tracking
+        return response
 
-        final_acknowledged_count = 0
+    else:
+        # For unsupported sections, return an empty bulk string (or whatever
+        # the specific server behavior is, but an empty one is often safe for unimplemented)
+        # A simpler approach is to return a bulk string containing only the section header.
+        info_content = f"#{section.capitalize()}\r\n"
+        response = encode_bulk_string(info_content)
+        return response
 
-        with WAIT_LOCK:
 
-            # 2. Polling and waiting loop
-            while True:
-
-                # Check for timeout first
-                timeout_remaining = timeout_s - (time.time() - start_time)
-                if timeout_remaining <= 0:
-                    # Timeout expired
-                    break
-
-                # Check current acknowledged count
-                acknowledged_count = 0
-                for replica_socket in REPLICA_SOCKETS:
-                    # Use a default of 0 if replica hasn't ACKed yet
-                    ack_offset = REPLICA_ACK_OFFSETS.get(replica_socket, 0)
-                    if ack_offset >= target_offset:
-                        acknowledged_count += 1
-
-                # Check completion condition
-                if acknowledged_count >= num_replicas_required:
-                    final_acknowledged_count = acknowledged_count
-                    break
-
-                # Wait for notification or remaining timeout
-                WAIT_CONDITION.wait(timeout_remaining)
-
-            # If the loop finished due to timeout or early completion, calculate the final count
-            # Use the already calculated final_acknowledged_count if it met the requirement.
-            # If it broke due to timeout, we must check the last known counts.
-            if final_acknowledged_count == 0:
-                for replica_socket in REPLICA_SOCKETS:
-                    ack_offset = REPLICA_ACK_OFFSETS.get(replica_socket, 0)
-                    if ack_offset >= target_offset:
-                        final_acknowledged_count += 1
-
-        # Return the final count as a RESP Integer
-        response = b":" + str(final_acknowledged_count).encode() + b"\r\n"
+def handle_wait(arguments: list, client: socket.socket, block: bool = True):
+    if len(arguments) != 2:
+        response = b"-ERR wrong number of arguments for 'WAIT' command\r\n"
         return response
 
-    elif command == "GEOADD":
-        # GEOADD <key> <longitude> <latitude> <member>
-        if len(arguments) < 4:
-            response = b"-ERR wrong number of arguments for 'GEOADD' command\r\n"
-            return response
+    try:
+        num_replicas_required = int(arguments[0])
+        timeout_ms = int(arguments[1])
+    except ValueError:
+        response = b"-ERR numreplicas or timeout is not an integer\r\n"
+        return response
 
-        key = arguments[0]
-        longitude_str = arguments[1]
-        latitude_str = arguments[2]
-        member = arguments[3]
+    target_offset = MASTER_REPL_OFFSET
+    timeout_s = timeout_ms / 1000.0
+    start_time = time.monotonic()
 
-        # 1. Validate coordinates
-        try:
-            longitude = float(longitude_str)
-            latitude = float(latitude_str)
-        except ValueError:
-            error_msg = b"-ERR value is not a valid float\r\n"
-            return error_msg
+    # Optimization: If target is 0, required replicas is 0, or no replicas are connected, return immediately.
+    if target_offset == 0 or num_replicas_required == 0 or not REPLICA_CONNECTIONS:
+        num_connected = len(REPLICA_CONNECTIONS)
+        return encode_integer(num_connected)
 
-        # 2. Check Longitude range [-180, 180]
-        if not (MIN_LON <= longitude <= MAX_LON):
-            error_msg = f"-ERR invalid longitude,latitude pair {longitude:.6f},{latitude:.6f}\r\n".encode()
-            return error_msg
-
-        # 3. Check Latitude range [-85.05112878, 85.05112878]
-        if not (MIN_LAT <= latitude <= MAX_LAT):
-            error_msg = f"-ERR invalid longitude,latitude pair {longitude:.6f},{latitude:.6f}\r\n".encode()
-            return error_msg
+    if not block:
+        # Inside MULTI/EXEC WAIT does not poll the replicas: report the ones already caught up
+        with WAIT_LOCK:
+            acknowledged_count = sum(1 for replica in REPLICA_CONNECTIONS
+                                     if REPLICA_ACK_OFFSETS.get(replica.sock, 0) >= target_offset)
+        return encode_integer(acknowledged_count)
 
-        # 4. Persistence: Calculate geohash score and add to sorted set
-        score = encode_geohash(latitude, longitude)
-        score_str = str(score)
+    # The master must send GETACK to all replicas to get their current offset
+    getack_command = b"*3\r\n$8\r\nREPLCONF\r\n$6\r\nGETACK\r\n$1\r\n*\r\n"
 
-        # add_to_sorted_set returns 1 if a new element was added, or 0 if an existing member was updated.
-        num_new_elements = add_to_sorted_set(key, member, score_str)
+    # 1. Initial send of GETACK to ALL replicas (Poll phase)
+    replicas_to_remove = []
+    for replica in list(REPLICA_CONNECTIONS):
+        try:
+            send_to_connection(replica, [getack_command])
+        except OSError:
+            # Mark failed replicas for removal
+            replicas_to_remove.append(replica)
 
-        # 5. Return the count as a RESP Integer
-        response = b":" + str(num_new_elements).encode() + b"\r\n"
-        return response
+    # Clean up dead replicas
+    for dead_replica in replicas_to_remove:
+        if dead_replica in REPLICA_CONNECTIONS:
+            REPLICA_CONNECTIONS.remove(dead_replica)
+            REPLICA_ACK_OFFSETS.pop(dead_replica.sock, None)  # Also remove from ACK tracking
 
-    elif command == "GEOPOS":
-        if len(arguments) < 2:
-            return b"-ERR wrong number of arguments for 'GEOPOS' command\r\n"
+    final_acknowledged_count = 0
 
-        key = arguments[0]
-        members = arguments[1:]
+    with WAIT_LOCK:
 
-        final_response_parts = []
+        # 2. Polling and waiting loop
+        while True:
 
-        for member in members:
-            score_float = get_zscore(key, member)
+            # Check for timeout first
+            timeout_remaining = timeout_s - (time.monotonic() - start_time)
+            if timeout_remaining <= 0:
+                # Timeout expired
+                break
 
-            if score_float is None:
-                # Member or key does not exist: Null Array (*-1\r\n)
-                final_response_parts.append(b"*-1\r\n")
-                continue
+            # Check current acknowledged count
+            acknowledged_count = 0
+            for replica in REPLICA_CONNECTIONS:
+                # Use a default of 0 if replica hasn't ACKed yet
+                ack_offset = REPLICA_ACK_OFFSETS.get(replica.sock, 0)
+                if ack_offset >= target_offset:
+                    acknowledged_count += 1
+
+            # Check completion condition
+            if acknowledged_count >= num_replicas_required:
+                final_acknowledged_count = acknowledged_count
+                break
 
-            # Logic for FOUND member
-            score_int = int(score_float)
+            # Wait for notification or remaining timeout
+            WAIT_CONDITION.wait(timeout_remaining)
 
-            # Returns (longitude, latitude)
-            try:
-                longitude, latitude = decode_geohash_to_coords(score_int)
-            except Exception:
-                # Internal error during decoding
-                final_response_parts.append(b"*-1\r\n")
-                continue
+        # If the loop finished due to timeout or early completion, calculate the final count
+        # Use the already calculated final_acknowledged_count if it met the requirement.
+        # If it broke due to timeout, we must check the last known counts.
+        if final_acknowledged_count == 0:
+            for replica in REPLICA_CONNECTIONS:
+                ack_offset = REPLICA_ACK_OFFSETS.get(replica.sock, 0)
+                if ack_offset >= target_offset:
+                    final_acknowledged_count += 1
 
-            # 4. Format coordinates as RESP Bulk Strings (Reverted to robust float string conversion)
+    # Return the final count as a RESP Integer
+    response = encode_integer(final_acknowledged_count)
+    return response
 
-            # Use Python's default high-precision float string representation (str()),
-            # which is the most reliable way to maintain precision and avoid fragility.
-            lon_str = str(longitude)
-            lat_str = str(latitude)
 
-            # Format as Bulk Strings
-            lon_bytes = lon_str.encode()
-            lat_bytes = lat_str.encode()
-            lon_resp = b"$" + str(len(lon_bytes)).encode() + b"\r\n" + lon_bytes + b"\r\n"
-            lat_resp = b"$" + str(len(lat_bytes)).encode() + b"\r\n" + lat_bytes + b"\r\n"
+def handle_geoadd(arguments: list, client: socket.socket):
+    # GEOADD <key> <longitude> <latitude> <member>
+    if len(arguments) < 4:
+        response = b"-ERR wrong number of arguments for 'GEOADD' command\r\n"
+        return response
 
-            # Final response for an existing member: *2\r\n<lon_resp><lat_resp>
-            member_resp = b"*2\r\n" + lon_resp + lat_resp
-            final_response_parts.append(member_resp)
+    key = arguments[0]
+    longitude_str = arguments[1]
+    latitude_str = arguments[2]
+    member = arguments[3]
 
-        # 5. Wrap all individual responses in the final RESP array
-        response = b"*" + str(len(final_response_parts)).encode() + b"\r\n" + b"".join(final_response_parts)
-        return response
+    # 1. Validate coordinates
+    try:
+        longitude = float(longitude_str)
+        latitude = float(latitude_str)
+    except ValueError:
+        error_msg = b"-ERR value is not a valid float\r\n"
+        return error_msg
 
-    elif command == "GEODIST":
-        if len(arguments) != 3:
-            return b"-ERR wrong number of arguments for 'GEODIST' command\r\n"
+    # 2. Check Longitude range [-180, 180]
+    if not (MIN_LON <= longitude <= MAX_LON):
+        error_msg = f"-ERR invalid longitude,latitude pair {longitude:.6f},{latitude:.6f}\r\n".encode()
+        return error_msg
 
-        key = arguments[0]
-        member1 = arguments[1]
-        member2 = arguments[2]
+    # 3. Check Latitude range [-85.05112878, 85.05112878]
+    if not (MIN_LAT <= latitude <= MAX_LAT):
+        error_msg = f"-ERR invalid longitude,latitude pair {longitude:.6f},{latitude:.6f}\r\n".encode()
+        return error_msg
 
-        # 1. Retrieve scores
-        score1_float = get_zscore(key, member1)
-        score2_float = get_zscore(key, member2)
+    # 4. Persistence: Calculate geohash score and add to sorted set
+    score = encode_geohash(latitude, longitude)
+    score_str = str(score)
 
-        if score1_float is None or score2_float is None:
-            # If key/member not found, return Null Bulk String
-            return b"$-1\r\n"
+    # add_to_sorted_set returns 1 if a new element was added, or 0 if an existing member was updated.
+    num_new_elements = add_to_sorted_set(key, member, score_str)
 
-        # 2. Decode scores to coordinates
-        try:
-            # decode_geohash_to_coords returns (longitude, latitude)
-            lon1, lat1 = decode_geohash_to_coords(int(score1_float))
-            lon2, lat2 = decode_geohash_to_coords(int(score2_float))
-        except Exception:
-            # Internal decoding error
-            return b"$-1\r\n"
+    # 5. Return the count as a RESP Integer
+    response = encode_integer(num_new_elements)
+    return response
 
-        # 3. Calculate distance
-        distance = haversine_distance(lon1, lat1, lon2, lat2)
 
-        # 4. Format and return as RESP Bulk String (meters)
-        # Use a string format for high precision (up to 4 decimal places required)
-        distance_str = f"{distance:.4f}".rstrip('0').rstrip('.')
-        if distance_str == "": distance_str = "0"
+def handle_geopos(arguments: list, client: socket.socket):
+    if len(arguments) < 2:
+        return b"-ERR wrong number of arguments for 'GEOPOS' command\r\n"
 
-        distance_bytes = distance_str.encode()
+    key = arguments[0]
+    members = arguments[1:]
 
-        response = b"$" + str(len(distance_bytes)).encode() + b"\r\n" + distance_bytes + b"\r\n"
-        return response
+    final_response_parts = []
 
-    elif command == "GEOSEARCH":
-        # GEOSEARCH <key> FROMLONLAT <lon> <lat> BYRADIUS <radius> <unit>
-        if len(arguments) != 7:
-            return b"-ERR wrong number of arguments for 'GEOSEARCH' command\r\n"
+    for member in members:
+        score_float = get_zscore(key, member)
 
-        key = arguments[0]
-        from_keyword = arguments[1].upper()
-        by_keyword = arguments[4].upper()
+        if score_float is None:
+            # Member or key does not exist: Null Array (*-1\r\n)
+            final_response_parts.append(NIL_ARRAY)
+            continue
 
-        if from_keyword != "FROMLONLAT" or by_keyword != "BYRADIUS":
-            return b"-ERR syntax error\r\n"
+        # Logic for FOUND member
+        score_int = int(score_float)
 
+        # Returns (longitude, latitude)
         try:
-            center_lon = float(arguments[2])
-            center_lat = float(arguments[3])
-            radius = float(arguments[5])
-            unit = arguments[6]
-        except ValueError:
-            return b"-ERR invalid coordinates or radius\r\n"
-
-        # 1. Convert radius to meters
+            longitude, latitude = decode_geohash_to_coords(score_int)
+        except Exception:
+            # Internal error during decoding
+            final_response_parts.append(NIL_ARRAY)
+            continue
+
+        # 4. Format coordinates as RESP Bulk Strings (Reverted to robust float string conversion)
+
+        # Use Python's default high-precision float string representation (str()),
+        # which is the most reliable way to maintain precision and avoid fragility.
+        lon_str = str(longitude)
+        lat_str = str(latitude)
+
+        # Format as Bulk Strings
+        lon_resp = encode_bulk_string(lon_str)
+        lat_resp = encode_bulk_string(lat_str)
+
+        # Final response for an existing member: *2\r\n<lon_resp><lat_resp>
+        member_resp = encode_array((lon_resp, lat_resp))
+        final_response_parts.append(member_resp)
+
+    # 5. Wrap all individual responses in the final RESP array
+    response = encode_array(final_response_parts)
+    return response
+
+
+def handle_geodist(arguments: list, client: socket.socket):
+    if len(arguments) != 3:
+        return b"-ERR wrong number of arguments for 'GEODIST' command\r\n"
+
+    key = arguments[0]
+    member1 = arguments[1]
+    member2 = arguments[2]
+
+    # 1. Retrieve scores
+    score1_float = get_zscore(key, member1)
+    score2_float = get_zscore(key, member2)
+
+    if score1_float is None or score2_float is None:
+        # If key/member not found, return Null Bulk String
+        return NIL_BULK
+
+    # 2. Decode scores to coordinates
+    try:
+        # decode_geohash_to_coords returns (longitude, latitude)
+        lon1, lat1 = decode_geohash_to_coords(int(score1_float))
+        lon2, lat2 = decode_geohash_to_coords(int(score2_float))
+    except Exception:
+        # Internal decoding error
+        return NIL_BULK
+
+    # 3. Calculate distance
+    distance = haversine_distance(lon1, lat1, lon2, lat2)
+
+    # 4. Format and return as RESP Bulk String (meters)
+    # Use a string format for high precision (up to 4 decimal places required)
+    distance_str = f"{distance:.4f}".rstrip('0').rstrip('.')
+    if distance_str == "": distance_str = "0"
+
+    response = encode_bulk_string(distance_str)
+    return response
+
+
+def handle_geosearch(arguments: list, client: socket.socket):
+    # GEOSEARCH <key> FROMLONLAT <lon> <lat> BYRADIUS <radius> <unit>
+    if len(arguments) != 7:
+        return b"-ERR wrong number of arguments for 'GEOSEARCH' command\r\n"
+
+    key = arguments[0]
+    if not is_keyword(arguments[1], FROMLONLAT_KEYWORD) or not is_keyword(arguments[4], BYRADIUS_KEYWORD):
+        return b"-ERR syntax error\r\n"
+
+    try:
+        center_lon = float(arguments[2])
+        center_lat = float(arguments[3])
+        radius = float(arguments[5])
+        unit = arguments[6].decode()
+    except ValueError:
+        return b"-ERR invalid coordinates or radius\r\n"
+
+    # 1. Convert radius to meters
+    try:
+        search_radius_m = convert_to_meters(radius, unit)
+    except ValueError:
+        return b"-ERR invalid unit specified\r\n"
+
+    # 2. Get all members in the GeoKey (Sorted Set)
+    with DATA_LOCK:
+        if key not in SORTED_SETS:
+            return EMPTY_ARRAY
+        members_scores = SORTED_SETS.get(key, {}).items()
+
+    matching_members = []
+
+    # 3. Iterate, decode coordinates, and check distance
+    for member_name, score_float in members_scores:
         try:
-            search_radius_m = convert_to_meters(radius, unit)
-        except ValueError:
-            return b"-ERR invalid unit specified\r\n"
+            # Decode score to get location coordinates: returns (longitude, latitude)
+            member_lon, member_lat = decode_geohash_to_coords(int(score_float))
+        except Exception:
+            # Skip member if decoding fails
+            continue
+
+        # Calculate distance between search center and member
+        distance = haversine_distance(center_lon, center_lat, member_lon, member_lat)
+
+        # Check if the member is within the search radius (distance <= radius in meters)
+        if distance <= search_radius_m:
+            matching_members.append(member_name)
+
+    # 4. Return matching members as a RESP Array (order does not matter), encoded in one pass
+    response = encode_bulk_array(matching_members)
+    return response
+
+
+def handle_quit(arguments: list, client: socket.socket):
+    response = OK
+    # client.sendall(response
+    return response
+
+
+# Maps each upper-cased command name to its handler; built once at import instead of
+# walking an if/elif chain on every command.
+COMMAND_HANDLERS = {
+    "REPLCONF": handle_replconf,
+    "ECHO": handle_echo,
+    "SET": handle_set,
+    "GET": handle_get,
+    "LRANGE": handle_lrange,
+    "LPUSH": handle_lpush,
+    "LLEN": handle_llen,
+    "LPOP": handle_lpop,
+    "RPUSH": handle_rpush,
+    "BLPOP": handle_blpop,
+    "CONFIG": handle_config,
+    "KEYS": handle_keys,
+    "PUBLISH": handle_publish,
+    "ZADD": handle_zadd,
+    "ZRANK": handle_zrank,
+    "ZRANGE": handle_zrange,
+    "ZCARD": handle_zcard,
+    "ZSCORE": handle_zscore,
+    "ZREM": handle_zrem,
+    "TYPE": handle_type,
+    "XADD": handle_xadd,
+    "XRANGE": handle_xrange,
+    "XREAD": handle_xread,
+    "INCR": handle_incr,
+    "INFO": handle_info,
+    "WAIT": handle_wait,
+    "GEOADD": handle_geoadd,
+    "GEOPOS": handle_geopos,
+    "GEODIST": handle_geodist,
+    "GEOSEARCH": handle_geosearch,
+    "QUIT": handle_quit,
+}
+
+# Commands that act on the client's connection state (transactions, subscriptions, replica
+# registration) rather than the keyspace. Their handlers take the ClientConnection (None on the
+# replication link from the master) instead of the socket.
+CONNECTION_COMMAND_HANDLERS = {
+    "PING": handle_ping,
+    "PSYNC": handle_psync,
+    "SUBSCRIBE": handle_subscribe,
+    "UNSUBSCRIBE": handle_unsubscribe,
+    "MULTI": handle_multi,
+    "EXEC": handle_exec,
+    "DISCARD": handle_discard,
+}
+
+# Raw command name bytes -> canonical command name, for the upper, lower and capitalized
+# spellings clients send in practice, so the common case skips decoding and upper-casing the name.
+COMMAND_NAMES = {}
+for _name in (*COMMAND_HANDLERS, *CONNECTION_COMMAND_HANDLERS):
+    COMMAND_NAMES[_name.encode()] = _name
+    COMMAND_NAMES[_name.lower().encode()] = _name
+    COMMAND_NAMES[_name.capitalize().encode()] = _name
+
+
+def command_name(raw_command: bytes) -> str:
+    """Returns the canonical (upper-case) name for a command name as received."""
+    name = COMMAND_NAMES.get(raw_command)
+    if name is None:
+        # Mixed-case or unknown command
+        name = raw_command.decode().upper()
+    return name
+
+
+def execute_single_command(command: str, arguments: list, client: socket.socket,
+                           connection: "ClientConnection | None" = None):
+    """
+    Executes a single Redis command and returns the appropriate response.
+    
+    This is the main command dispatcher: it looks the command up in COMMAND_HANDLERS (or
+    CONNECTION_COMMAND_HANDLERS), tables built once at import, and calls the matching
+    handle_<command> function.
+    
+    Args:
+        command: The Redis command to execute (e.g., 'SET', 'GET', 'LPUSH')
+        arguments: List of arguments for the command
+        client: The client socket connection (used for blocking waiters and replica ACKs)
+        connection: The client's ClientConnection, for transaction, pub/sub and PSYNC
+                    commands (None on the replication link)
+    
+    Returns:
+        bytes: RESP-formatted response to send back to the client
+        bool: True for special commands that don't return a response (like REPLCONF ACK)
+    
+    Command Categories:
+        - Basic: PING, ECHO, SET, GET, TYPE, CONFIG, KEYS
+        - Lists: LPUSH, RPUSH, LPOP, LRANGE, LLEN, BLPOP
+        - Streams: XADD, XRANGE, XREAD
+        - Sorted Sets: ZADD, ZRANK, ZRANGE, ZCARD, ZSCORE, ZREM
+        - Transactions: MULTI, EXEC, DISCARD, INCR
+        - Pub/Sub: SUBSCRIBE, UNSUBSCRIBE, PUBLISH
+        - Replication: REPLCONF, PSYNC, INFO, WAIT
+        - Geospatial: GEOADD, GEOPOS, GEODIST, GEOSEARCH
+    """
+    if is_client_subscribed(connection):
+        if command not in ALLOWED_COMMANDS_WHEN_SUBSCRIBED:
+            response = b"-ERR Can't execute '" + command.encode() + b"' when client is subscribed\r\n"
+            return response
 
-        # 2. Get all members in the GeoKey (Sorted Set)
-        with DATA_LOCK:
-            if key not in SORTED_SETS:
-                return b"*0\r\n"
-            members_scores = SORTED_SETS.get(key, {}).items()
+    handler = COMMAND_HANDLERS.get(command)
+    if handler is not None:
+        return handler(arguments, client)
 
-        matching_members = []
+    handler = CONNECTION_COMMAND_HANDLERS.get(command)
+    if handler is not None:
+        return handler(arguments, connection)
 
-        # 3. Iterate, decode coordinates, and check distance
-        for member_name, score_float in members_scores:
-            try:
-                # Decode score to get location coordinates: returns (longitude, latitude)
-                member_lon, member_lat = decode_geohash_to_coords(int(score_float))
-            except Exception:
-                # Skip member if decoding fails
-                continue
+    return b"-ERR unknown command '" + command.encode() + b"'\r\n"
 
-            # Calculate distance between search center and member
-            distance = haversine_distance(center_lon, center_lat, member_lon, member_lat)
 
-            # Check if the member is within the search radius (distance <= radius in meters)
-            if distance <= search_radius_m:
-                matching_members.append(member_name)
+def flush_responses(connection: "ClientConnection"):
+    """
+    Writes every buffered response for a client and empties the buffer.
+    """
+    pending = connection.pending
+    if not pending:
+        return
+    send_to_connection(connection, pending)
+    pending.clear()
 
-        # 4. Return matching members as a RESP Array (order does not matter)
-        response_parts = []
-        for member in matching_members:
-            member_bytes = member.encode()
-            response_parts.append(b"$" + str(len(member_bytes)).encode() + b"\r\n" + member_bytes + b"\r\n")
 
-        response = b"*" + str(len(matching_members)).encode() + b"\r\n" + b"".join(response_parts)
-        return response
+def send_to_connection(connection: "ClientConnection", buffers: list):
+    """
+    Writes buffers to a client without blocking. Whatever the socket does not take right away
+    stays queued, in order, in connection.outbox and is sent by the selector loop once the
+    socket is writable, so a client that stops reading never stalls the thread writing to it.
 
-    elif command == "QUIT":
-        response = b"+OK\r\n"
-        # client.sendall(response
-        return response
+    Small batches are joined into one buffer; batches of at least SCATTER_SEND_THRESHOLD bytes
+    are queued as they are and written with scatter I/O. Raises OSError if the connection is closed.
+    """
+    size = sum(map(len, buffers))
+    if len(buffers) > 1 and size < SCATTER_SEND_THRESHOLD:
+        buffers = [b"".join(buffers)]
+
+    with connection.write_lock:
+        if connection.closed:
+            raise OSError(f"connection to {connection.address} is closed")
+        outbox = connection.outbox
+        was_empty = not outbox
+        outbox.extend(buffers)
+        connection.outbox_size += size
+        # A non-empty outbox is already being drained by the loop; anything new goes behind it
+        if was_empty:
+            write_outbox(connection)
+        left_queued = was_empty and bool(outbox)
+
+    if left_queued and WATCH_OUTBOX is not None:
+        WATCH_OUTBOX(connection)
+
+
+def write_outbox(connection: "ClientConnection"):
+    """
+    Sends queued buffers until the outbox is empty or the socket would block, resuming after
+    partial writes without copying. The caller holds connection.write_lock.
+    """
+    outbox = connection.outbox
+    sock = connection.sock
+    while outbox:
+        try:
+            if len(outbox) > 1 and hasattr(sock, "sendmsg"):
+                sent = sock.sendmsg(list(islice(outbox, SENDMSG_MAX_BUFFERS)))
+            else:
+                sent = sock.send(outbox[0])
+        except BlockingIOError:
+            return
+        connection.outbox_size -= sent
+        # Drop the buffers that went out completely and trim the one cut short
+        while outbox and sent >= len(outbox[0]):
+            sent -= len(outbox[0])
+            outbox.popleft()
+        if sent:
+            outbox[0] = memoryview(outbox[0])[sent:]
+
+
+def queue_propagation(command: str, arguments: list):
+    """
+    Encodes a write command once and queues it for every replica; flush_propagation() sends it.
+    """
+    global MASTER_REPL_OFFSET
+    payload = encode_bulk_array([command.encode(), *arguments])
+    with PROPAGATION_LOCK:
+        PROPAGATION_BUFFER.append(payload)
+        MASTER_REPL_OFFSET += len(payload)
 
-    return b"-ERR unknown command '" + command.encode() + b"'\r\n"
 
+def flush_propagation():
+    """
+    Sends every queued write command to each replica, dropping replicas whose connection fails.
+    A small batch is joined once and that one buffer goes to every replica; a batch of at
+    least SCATTER_SEND_THRESHOLD bytes is sent straight from the encoded commands with
+    scatter I/O, so the payload is never copied into a joined buffer at all. The batch is
+    queued on each replica's outbox, so a slow replica never blocks the sender.
+    """
+    global PROPAGATION_BUFFER
+    if not PROPAGATION_BUFFER:
+        return
 
-def handle_command(command: str, arguments: list, client: socket.socket) -> bool:
-    client_address = client.getpeername()
+    # Sending under the lock keeps batches from different threads in offset order
+    with PROPAGATION_LOCK:
+        batch = PROPAGATION_BUFFER
+        PROPAGATION_BUFFER = []
 
-    # 1. TRANSACTION QUEUEING CHECK
-    if is_client_in_multi(client):
-        # Commands that must be executed immediately, even inside MULTI: MULTI, EXEC, DISCARD
-        TRANSACTION_CONTROL_COMMANDS = {"EXEC", "MULTI", "DISCARD"}
+        size = sum(map(len, batch))
+        if len(batch) == 1 or size < SCATTER_SEND_THRESHOLD:
+            batch = [b"".join(batch)]
+
+        for replica in list(REPLICA_CONNECTIONS):
+            try:
+                send_to_connection(replica, batch)
+            except OSError as e:
+                print(f"Propagation Error: Could not send to replica: {e}. Removing dead replica.")
+                try:
+                    REPLICA_CONNECTIONS.remove(replica)
+                except ValueError:
+                    pass
+                REPLICA_ACK_OFFSETS.pop(replica.sock, None)
+
+
+def handle_command(command: str, arguments: list, client: socket.socket, pending: list | None = None,
+                   connection: "ClientConnection | None" = None) -> bool:
+    """
+    Routes a single command: MULTI queueing, execution, propagation and the reply.
 
+    When a `pending` list is given, replies are appended to it instead of being written
+    immediately, so the caller can send all replies for one read with one syscall.
+    `connection` carries the client's transaction state; the replication link has none.
+    """
+    # 1. TRANSACTION QUEUEING CHECK
+    if connection is not None and connection.in_multi:
         if command not in TRANSACTION_CONTROL_COMMANDS:
             # Queue the command and respond with +QUEUED\r\n
-            enqueue_client_command(client, command, arguments)
-            response = b"+QUEUED\r\n"
-            client.sendall(response)
-            print(f"Sent: QUEUED response for command '{command}' to {client_address}.")
+            connection.queued_commands.append((command, arguments))
+            response = QUEUED
+            if pending is not None:
+                pending.append(response)
+            else:
+                client.sendall(response)
             return True  # Signal that the command was handled (queued)
 
     # 2. COMMAND EXECUTION
-    response_or_signal = execute_single_command(command, arguments, client)
+    # Commands that can block (or whose reply may be written by another thread) must not
+    # overtake replies still sitting in the buffer, so flush those first. WAIT also needs
+    # every queued write to have reached the replicas before it asks for their offsets.
+    if command in BLOCKING_COMMANDS:
+        if pending:
+            flush_responses(connection)
+        flush_propagation()
 
-    # 3. PROPAGATION LOGIC (MASTER ROLE)
-    is_write_command = command in WRITE_COMMANDS
-    global REPLICA_SOCKETS
-    is_master_with_replicas = SERVER_ROLE == "master" and REPLICA_SOCKETS
+    response_or_signal = execute_single_command(command, arguments, client, connection)
 
-    if is_master_with_replicas and is_write_command:
+    # The batch's clock snapshot is stale after a command that may have waited
+    if command in BLOCKING_COMMANDS:
+        take_time_snapshot()
+
+    # 3. PROPAGATION LOGIC (MASTER ROLE)
+    if SERVER_ROLE == "master" and REPLICA_CONNECTIONS and command in WRITE_COMMANDS:
         # Propagate only if the command executed successfully (returned bytes, not an error)
         if isinstance(response_or_signal, bytes) and not response_or_signal.startswith(b'-'):
-
-            # Reconstruct the raw RESP array
-            resp_array_to_send = _serialize_command_to_resp_array(command, arguments)
-            command_byte_size = len(resp_array_to_send)
-
-            # Iterate and send to ALL replicas
-            for replica_socket in list(REPLICA_SOCKETS):
-                try:
-                    replica_socket.sendall(resp_array_to_send)
-                    print(f"Propagation: Sent command '{command}' to replica {replica_socket.getpeername()}.")
-                except Exception as e:
-                    print(
-                        f"Propagation Error: Could not send command to replica {replica_socket.getpeername()}: {e}. Removing dead replica.")
-                    try:
-                        REPLICA_SOCKETS.remove(replica_socket)
-                    except ValueError:
-                        pass
-            global MASTER_REPL_OFFSET
-            MASTER_REPL_OFFSET += command_byte_size
+            queue_propagation(command, arguments)
 
     # 4. SEND THE RESPONSE (CONSOLIDATED LOGIC)
 
-    # 4a. Check for internal signals (None means response was sent by another thread, e.g., XREAD BLOCK)
+    # 4a. Check for internal signals (None means there is no response to send)
     if response_or_signal is None:
-        print(
-            f"Execution signal: Command '{command}' successfully processed (response sent by another thread or not required).")
         return True
 
     # 4b. Handle response only if it's a bytes object (a valid RESP response)
@@ -1758,27 +1848,20 @@ def handle_command(command: str, arguments: list, client: socket.socket) -> bool
             is_replconf_getack = (
                     command == "REPLCONF" and
                     len(arguments) >= 2 and
-                    arguments[0].upper() == "GETACK"
+                    is_keyword(arguments[0], GETACK_KEYWORD)
             )
 
-            if is_replconf_getack:
-                print(f"Replica: Executing REPLCONF GETACK and sending ACK back to master.")
-                # Fall through to the response sending logic below
-            else:
-                print(f"Replica: Executed propagated command '{command}' silently.")
+            if not is_replconf_getack:
                 return True  # Suppressed successfully, DO NOT send response.
+            # Fall through to the response sending logic below
 
         # --- REGULAR CLIENT RESPONSE ---
-        client_address = client.getpeername()
-        client.sendall(response_or_signal)
-
-        # Special case handling for PSYNC response (Master role)
-        if command == "PSYNC":
-            print(f"Sent: FULLRESYNC + RDB file for command '{command}' to {client_address}. Waiting 10ms...")
-            time.sleep(0.05)
+        if pending is None:
+            # The replication link from the master is a plain blocking socket
+            client.sendall(response_or_signal)
+            return True
 
-        # Log success and return True
-        print(f"Sent: Response for command '{command}' to {client_address}.")
+        pending.append(response_or_signal)
         return True
 
     # 4c. Final return for commands that succeeded but didn't produce a bytes response
@@ -1788,35 +1871,98 @@ def handle_command(command: str, arguments: list, client: socket.socket) -> bool
     return True
 
 
-def handle_connection(client: socket.socket, client_address):
+class ClientConnection:
     """
-    This function is called for each new client connection.
-    It manages the connection lifecycle and command loop.
+    Per-connection state: the socket, its incremental command reader, the replies
+    buffered while one read is being handled, the bytes not yet accepted by the socket,
+    and its MULTI transaction.
+
+    The server's selector loop owns a connection while it is idle. A connection about to run a
+    blocking command is handed to a thread of its own (see run_client_commands) and returned
+    to the loop once its buffered commands are done. Any thread may write to the connection
+    through send_to_connection(); the loop sends whatever is left in the outbox.
     """
-    print(f"Connection: New connection from {client_address}")
-
-    with client:
-        while True:
-            # The thread waits for the client to send a command. When you run {redis-cli ECHO hey}, the server receives the raw RESP bytes: data = b'*2\r\n$4\r\nECHO\r\n$3\r\nhey\r\n'
-            data = client.recv(4096)
-            if not data:
-                print(f"Connection: Client {client_address} closed connection.")
-                cleanup_blocked_client(client)
-                break
-
-            print(f"Received: Raw bytes from {client_address}: {data!r}")
-
-            # The raw bytes are immediately sent to the parser to be translated into a usable Python list.
-            parsed_command, _ = parsed_resp_array(data)
-
-            if not parsed_command:
-                print(f"Received: Could not parse command from {client_address}. Closing connection.")
-                break
+    __slots__ = ("sock", "address", "reader", "pending", "blocked_command", "in_multi", "queued_commands",
+                 "outbox", "outbox_size", "write_lock", "closed", "busy", "events")
+
+    def __init__(self, sock: socket.socket, address):
+        self.sock = sock
+        self.address = address
+        # Buffers bytes received but not yet parsed; a command split across reads stays there until complete
+        self.reader = CommandReader()
+        # Replies produced while handling one read are buffered here and written together
+        self.pending = []
+        # A blocking command parsed on the selector thread, left for the connection's own thread
+        self.blocked_command = None
+        # MULTI state: commands are queued as (COMMAND, [arg1, arg2, ...]) until EXEC/DISCARD
+        self.in_multi = False
+        self.queued_commands = []
+        # Bytes the non-blocking socket has not taken yet (guarded by write_lock)
+        self.outbox = deque()
+        self.outbox_size = 0
+        self.write_lock = threading.Lock()
+        self.closed = False
+        # True while a worker thread runs the connection's blocking command
+        self.busy = False
+        # Selector events the loop currently watches for (only touched by the loop thread)
+        self.events = 0
+
+
+def close_client_connection(connection: ClientConnection):
+    """
+    Writes what the socket takes of any replies still buffered, releases the connection's
+    blocked waiters and subscriptions, and closes the socket.
+    """
+    try:
+        flush_responses(connection)
+    except OSError:
+        pass
+    with connection.write_lock:
+        connection.closed = True
+        connection.outbox.clear()
+        connection.outbox_size = 0
+    cleanup_blocked_client(connection.sock)
+    unsubscribe_all(connection)
+    connection.sock.close()
+
+
+def run_client_commands(connection: ClientConnection, blocking_allowed: bool = True) -> bool:
+    """
+    Runs every complete command buffered on a connection, then flushes their replies.
 
-            command = parsed_command[0].upper()
+    A client may pipeline several commands in one write, so all of them are run before the
+    caller reads again. With blocking_allowed=False (the selector thread), the first command that
+    may block (BLPOP, XREAD, WAIT) is kept in connection.blocked_command and False is returned,
+    so the caller can finish the batch on another thread. Raises ValueError on a protocol error.
+    """
+    client = connection.sock
+    reader = connection.reader
+    pending = connection.pending
+
+    parsed_command = connection.blocked_command
+    connection.blocked_command = None
+    if parsed_command is None:
+        parsed_command = reader.gets()
+
+    # The raw bytes are translated by the reader into usable Python lists.
+    while parsed_command is not False:
+        if parsed_command:
+            # Only the command name is mapped to str; arguments stay as bytes end to end
+            command = command_name(parsed_command[0])
             arguments = parsed_command[1:]
 
-            print(f"Command: Parsed command: {command}, Arguments: {arguments}")
+            # A blocking command sent under MULTI is only queued, and EXEC runs it without blocking
+            if not blocking_allowed and command in BLOCKING_COMMANDS and not connection.in_multi:
+                connection.blocked_command = parsed_command
+                flush_responses(connection)
+                flush_propagation()
+                return False
 
             # Delegate command execution to the router
-            handle_command(command, arguments, client)
\ No newline at end of file
+            handle_command(command, arguments, client, pending, connection)
+
+        parsed_command = reader.gets()
+
+    flush_responses(connection)
+    flush_propagation()
+    return True
@@ -10,10 +10,10 @@ Data Structures:
     - SORTED_SETS: Sorted set data structure with score-based ordering
     - CHANNEL_SUBSCRIBERS: Pub/Sub channel subscription mapping
     - CLIENT_SUBSCRIPTIONS: Track client subscriptions
-    - CLIENT_STATE: Transaction state per client
     - BLOCKING_CLIENTS: Clients waiting on blocking operations
     - BLOCKING_STREAMS: Clients waiting on stream blocking reads
     - REPLICA_ACK_OFFSETS: Replication offset tracking for replicas
+    - EXPIRY_HEAP: Min-heap of (expiry, key) pairs for active expiration
 
 Thread Safety:
     All data structures are protected by appropriate locks:
@@ -30,12 +30,23 @@ Features:
     - Transactions with MULTI/EXEC/DISCARD
     - Pub/Sub messaging between clients
     - RDB file loading for persistence
-    - Lazy deletion of expired keys
+    - Lazy deletion of expired keys, plus an active sweeper for keys nobody reads
 """
 
+import bisect
+import heapq
+import math
+import mmap
+from collections import deque
+from itertools import islice
+import os
+import re
+import sys
 import time
 import threading
 
+from app.protocol.resp import encode_bulk_array, encode_bulk_string
+
 # ============================================================================
 # THREAD SAFETY - LOCKS
 # ============================================================================
@@ -52,22 +63,32 @@ BLOCKING_STREAMS_LOCK = threading.Lock()
 # DATA STRUCTURES
 # ============================================================================
 
-# Blocking operations - clients waiting for list/stream data
+# Blocking operations - clients waiting for list/stream data.
+# Each key maps to a FIFO deque of waiters (a Future per BLPOP or XREAD BLOCK);
+# a key is only present while it has waiters.
 BLOCKING_CLIENTS = {}
 BLOCKING_STREAMS = {}
 
 # Pub/Sub data structures
-CHANNEL_SUBSCRIBERS = {}  # Maps channel name to set of subscriber sockets
-CLIENT_SUBSCRIPTIONS = {}  # Maps client socket to set of subscribed channels
-CLIENT_STATE = {}  # Tracks transaction state per client
+CHANNEL_SUBSCRIBERS = {}  # Maps channel name to set of subscriber connections
+CLIENT_SUBSCRIPTIONS = {}  # Maps client connection to set of subscribed channels
 
 # Sorted sets storage
 SORTED_SETS = {}
+# (score, member) pairs of each sorted set kept in rank order, parallel to SORTED_SETS[key]
+# (guarded by DATA_LOCK), so rank and range lookups bisect/slice instead of sorting every call
+SORTED_SET_INDEX = {}
 
 # Streams storage
 STREAMS = {}
-
-# Transaction flag (deprecated - use CLIENT_STATE instead)
+# ID of the newest entry in each stream (guarded by DATA_LOCK), kept by xadd so the
+# last-ID lookups behind XADD validation and XREAD `$` never touch the entry list
+STREAM_LAST_IDS = {}
+# Parsed (ms, seq) IDs of each stream's entries, parallel to STREAMS[key] (guarded by DATA_LOCK).
+# XADD only ever appends increasing IDs, so the list stays sorted and ranges can be bisected.
+STREAM_ID_INDEX = {}
+
+# Transaction flag (deprecated - transaction state lives on each ClientConnection)
 multi_flag = False
 
 # ============================================================================
@@ -84,143 +105,309 @@ REPLICA_ACK_OFFSETS = {}
 # MAIN DATA STORE
 # ============================================================================
 
-# The central storage. Keys map to a dictionary containing value, type, and expiry metadata.
-# Example: {'mykey': {'type': 'string', 'value': 'myvalue', 'expiry': 1731671220000}}
+# The central storage. Keys map to a DataEntry record holding type, value, and expiry metadata.
+# Keys and string values are bytes, exactly as received from clients.
+# Example: {b'mykey': DataEntry('string', b'myvalue', 86400000000000)}
+# Expiry is an int time.monotonic_ns() deadline, with 0 meaning the key never expires.
+# Deadlines are monotonic so a wall-clock jump cannot expire or revive keys.
+# List values are collections.deque instances.
+# A string written by INCR holds the counter as an int until the next SET, so repeated INCRs
+# skip the bytes -> int -> bytes round-trip; GET encodes it when it builds its reply.
+# String entries may also carry `encoded`: the RESP reply cached by GET.
 DATA_STORE = {}
 
+# The only string values INCR treats as integers: an optional minus sign and ASCII digits
+INTEGER_VALUE = re.compile(rb"-?[0-9]+")
+
+
+class DataEntry:
+    """
+    One DATA_STORE value. Uses __slots__ so each key costs a small fixed record
+    instead of a per-key dict.
+    """
+    __slots__ = ("type", "value", "expiry", "encoded")
+
+    def __init__(self, type: str, value, expiry: int = 0):
+        self.type = type
+        self.value = value
+        self.expiry = expiry
+        self.encoded = None
+
+
+# Min-heap of (expiry_deadline_ns, key) for every key written with a TTL (guarded by DATA_LOCK).
+# Entries are never updated in place: an overwritten key simply leaves a stale pair behind,
+# which the sweeper recognises because the stored expiry no longer matches.
+EXPIRY_HEAP = []
+
+# Encoded reply for `KEYS *` (guarded by DATA_LOCK). Built on first use and reset to None
+# whenever a key is added to or removed from DATA_STORE, so repeated calls reuse the same bytes.
+KEYS_REPLY_CACHE = None
+
+# Wakes the background sweeper when a key gets a deadline earlier than any it was waiting
+# for. Between writes it sleeps until the earliest deadline, or indefinitely with no TTLs.
+EXPIRY_WAKEUP = threading.Event()
+
+# Most keys the sweeper deletes per DATA_LOCK hold; it yields between batches so a burst
+# of expirations cannot stall the connection loop behind one long critical section.
+EXPIRY_SWEEP_BATCH = 256
+
+
+# Per-thread clock snapshot: a connection thread takes one timestamp per batch of commands
+# read from its socket instead of reading the clocks in every command.
+# now_ms is wall-clock time (stream IDs); now_ns is monotonic time (key expiry).
+CLOCK = threading.local()
+
+
+# ============================================================================
+# CLOCK
+# ============================================================================
+
+def take_time_snapshot():
+    """
+    Records the current time as the clock for every command this thread runs until the next snapshot.
+    """
+    CLOCK.now_ms = time.time_ns() // 1_000_000
+    CLOCK.now_ns = time.monotonic_ns()
+
+
+def now_ms() -> int:
+    """
+    Returns this thread's clock snapshot in milliseconds, or the current time if none was taken.
+    """
+    snapshot = getattr(CLOCK, "now_ms", None)
+    if snapshot is None:
+        return time.time_ns() // 1_000_000
+    return snapshot
+
+
+def now_ns() -> int:
+    """
+    Returns this thread's monotonic clock snapshot in nanoseconds, or the current monotonic time if none was taken.
+    """
+    snapshot = getattr(CLOCK, "now_ns", None)
+    if snapshot is None:
+        return time.monotonic_ns()
+    return snapshot
+
 
 # ============================================================================
 # BASIC KEY-VALUE OPERATIONS
 # ============================================================================
 
-def get_data_entry(key: str) -> dict | None:
+def _invalidate_keys_reply():
+    """Drops the cached `KEYS *` reply. Callers must hold DATA_LOCK."""
+    global KEYS_REPLY_CACHE
+    KEYS_REPLY_CACHE = None
+
+
+def get_all_keys_reply() -> bytes:
+    """
+    Returns the RESP array of every key in the store, reusing the cached reply
+    while the keyspace is unchanged.
+    """
+    global KEYS_REPLY_CACHE
+    with DATA_LOCK:
+        if KEYS_REPLY_CACHE is None:
+            KEYS_REPLY_CACHE = encode_bulk_array(list(DATA_STORE))
+        return KEYS_REPLY_CACHE
+
+
+def get_data_entry(key: bytes) -> DataEntry | None:
     """
     Retrieves a key, checks for expiration, and performs lazy deletion if expired.
-    Returns the valid data entry dictionary or None if the key is missing/expired.
+    Returns the valid DataEntry or None if the key is missing/expired.
     """
     with DATA_LOCK:
-        data_entry = DATA_STORE.get(key)
+        return _get_live_entry(key)
 
+
+def get_string_reply(key: bytes) -> bytes | None:
+    """
+    Returns GET's reply for a key, or None if the key is missing/expired.
+    The Bulk String is cached on the entry and built under the same DATA_LOCK hold as INCR's
+    in-place update, so a reply for an old counter value can never be left in the cache.
+    """
+    with DATA_LOCK:
+        data_entry = _get_live_entry(key)
         if data_entry is None:
-            # Key does not exist
             return None
+        if data_entry.type != "string":
+            return b"-WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
 
-        expiry = data_entry.get("expiry")
-        current_time_ms = int(time.time() * 1000)
+        response = data_entry.encoded
+        if response is None:
+            response = data_entry.encoded = encode_bulk_string(data_entry.value)
+        return response
 
-        # Check for expiration
-        if expiry is not None and current_time_ms >= expiry:
-            # Key has expired; delete it
-            del DATA_STORE[key]
-            return None
 
-        return data_entry
+def _get_live_entry(key: bytes) -> DataEntry | None:
+    """Body of get_data_entry for callers that already hold DATA_LOCK."""
+    data_entry = DATA_STORE.get(key)
+
+    if data_entry is None:
+        # Key does not exist
+        return None
+
+    expiry = data_entry.expiry
+
+    # Check for expiration (0 means the key never expires)
+    if expiry and now_ns() >= expiry:
+        # Key has expired; delete it
+        del DATA_STORE[key]
+        _invalidate_keys_reply()
+        return None
+
+    return data_entry
+
 
+def _schedule_expiry(expiry_deadline: int, key: bytes):
+    """Adds a key's deadline to EXPIRY_HEAP, waking the sweeper if it is now the earliest. Callers must hold DATA_LOCK."""
+    if not EXPIRY_HEAP or expiry_deadline < EXPIRY_HEAP[0][0]:
+        EXPIRY_WAKEUP.set()
+    heapq.heappush(EXPIRY_HEAP, (expiry_deadline, key))
 
-def set_string(key: str, value: str, expiry_timestamp: int | None):
+
+def set_string(key: bytes, value: bytes, expiry_deadline: int = 0):
     """
-    Sets a key to a string value with optional expiration.
+    Sets a key to a string value with an optional monotonic expiry deadline (ns).
     """
     with DATA_LOCK:
-        DATA_STORE[key] = {
-            "type": "string",
-            "value": value,
-            "expiry": expiry_timestamp
-        }
+        if key not in DATA_STORE:
+            _invalidate_keys_reply()
+        DATA_STORE[key] = DataEntry("string", value, expiry_deadline)
+        if expiry_deadline:
+            _schedule_expiry(expiry_deadline, key)
 
 
-def set_list(key: str, elements: list[str], expiry_timestamp: int | None):
+def load_entries(entries: dict):
     """
-    Sets a key to a list of strings with optional expiration.
+    Bulk-loads entries (e.g. from an RDB file) into the store and schedules their expirations.
     """
     with DATA_LOCK:
-        DATA_STORE[key] = {
-            "type": "list",
-            "value": elements,
-            "expiry": expiry_timestamp
-        }
+        DATA_STORE.update(entries)
+        _invalidate_keys_reply()
+        for key, data_entry in entries.items():
+            expiry = data_entry.expiry
+            if expiry:
+                _schedule_expiry(expiry, key)
 
 
-def existing_list(key: str) -> bool:
+def delete_expired_keys() -> int:
     """
-    Checks if a list exists by key, without retrieving it.
+    Pops every due (expiry, key) pair off EXPIRY_HEAP and deletes the keys that are still
+    holding that expiry, EXPIRY_SWEEP_BATCH pairs per lock hold. Returns the number of keys deleted.
     """
-    with DATA_LOCK:
-        data_entry = DATA_STORE.get(key)
-        if data_entry is None:
-            return False
-        return data_entry.get("type") == "list"
+    deleted = 0
+    current_time_ns = time.monotonic_ns()
+
+    while True:
+        with DATA_LOCK:
+            for _ in range(EXPIRY_SWEEP_BATCH):
+                if not EXPIRY_HEAP or EXPIRY_HEAP[0][0] > current_time_ns:
+                    return deleted
+
+                expiry, key = heapq.heappop(EXPIRY_HEAP)
+                data_entry = DATA_STORE.get(key)
 
+                # Skip stale pairs: the key was deleted, overwritten, or given a new TTL since
+                if data_entry is not None and data_entry.expiry == expiry:
+                    del DATA_STORE[key]
+                    _invalidate_keys_reply()
+                    deleted += 1
 
-def append_to_list(key: str, element: str):
+        # Give the threads queued on DATA_LOCK a chance to run before the next batch
+        time.sleep(0)
+
+
+def _expiry_sweeper():
+    while True:
+        # Cleared before the sweep, so a deadline scheduled from here on makes the wait return at once
+        EXPIRY_WAKEUP.clear()
+        delete_expired_keys()
+
+        with DATA_LOCK:
+            next_deadline = EXPIRY_HEAP[0][0] if EXPIRY_HEAP else None
+
+        timeout = None if next_deadline is None else max(0, next_deadline - time.monotonic_ns()) / 1e9
+        EXPIRY_WAKEUP.wait(timeout)
+
+
+def start_expiry_sweeper():
+    """
+    Starts the daemon thread that actively evicts expired keys, so keys with a TTL that are
+    never read again do not stay in memory. The thread sleeps until the earliest deadline
+    instead of polling; reads keep their lazy check for a key read just as it expires.
+    """
+    threading.Thread(target=_expiry_sweeper, daemon=True).start()
+
+
+def push_to_list(key: bytes, elements: list[bytes], left: bool = False) -> int:
     """
-    Appends an element to an existing list at the given key.
-    Assumes the list already exists.
+    Pushes elements onto the tail (or, with left=True, the head) of the list at key, creating
+    the list when the key holds none, and returns its new length.
+    The whole push is one lookup under one DATA_LOCK acquisition.
     """
     with DATA_LOCK:
         data_entry = DATA_STORE.get(key)
-        if data_entry and data_entry.get("type") == "list":
-            data_entry["value"].append(element)
+        if data_entry is None or data_entry.type != "list":
+            if data_entry is None:
+                _invalidate_keys_reply()
+            data_entry = DATA_STORE[key] = DataEntry("list", deque())
+
+        if left:
+            data_entry.value.extendleft(elements)
+        else:
+            data_entry.value.extend(elements)
+        return len(data_entry.value)
 
 
-def size_of_list(key: str) -> int:
+def size_of_list(key: bytes) -> int:
     """
     Returns the size of the list stored at key, or 0 if the key does not exist or is not a list.
     """
     with DATA_LOCK:
         data_entry = DATA_STORE.get(key)
-        if data_entry and data_entry.get("type") == "list":
-            return len(data_entry["value"])
+        if data_entry and data_entry.type == "list":
+            return len(data_entry.value)
         return 0
 
 
-def lrange_rtn(key: str, start: int, end: int) -> list[str]:
+def lrange_rtn(key: bytes, start: int, end: int) -> list[bytes]:
     """
     Returns a sublist from the list stored at key, from start to end indices (inclusive).
     If the key does not exist or is not a list, returns an empty list.
     """
     with DATA_LOCK:
         data_entry = DATA_STORE.get(key)
-        if data_entry and data_entry.get("type") == "list":
-            list = data_entry["value"]
+        if data_entry and data_entry.type == "list":
+            list = data_entry.value
             if start < 0:
                 start = start + len(list)
             if end < 0:
                 end = end + len(list)
             if start > end or start >= len(list):
                 return []
-            if end >= len(list):
-                return list[start:]
 
             start = max(0, start)
-            return list[start:end + 1]
+            return [*islice(list, start, end + 1)]
         return []
 
 
-def prepend_to_list(key: str, element: str):
-    """
-    Prepends an element to an existing list at the given key.
-    Assumes the list already exists.
-    """
-    with DATA_LOCK:
-        data_entry = DATA_STORE.get(key)
-        if data_entry and data_entry.get("type") == "list":
-            data_entry["value"].insert(0, element)
-
-
-def remove_elements_from_list(key: str, count: int) -> list[str] | None:
+def remove_elements_from_list(key: bytes, count: int) -> list[bytes] | None:
     """
     Removes and returns the first elements from the list at the given key.
     Returns None if the list is empty or the key does not exist/is not a list.
     """
     with DATA_LOCK:
         data_entry = DATA_STORE.get(key)
-        if data_entry and data_entry.get("type") == "list":
-            if data_entry["value"]:
-                return [data_entry["value"].pop(0) for _ in range(count)]
+        if data_entry and data_entry.type == "list":
+            values = data_entry.value
+            if values:
+                return [values.popleft() for _ in range(min(count, len(values)))]
 
-            if not data_entry["value"]:
+            if not data_entry.value:
                 del DATA_STORE[key]
+                _invalidate_keys_reply()
                 return None
 
     return None
@@ -229,74 +416,79 @@ def remove_elements_from_list(key: str, count: int) -> list[str] | None:
 def cleanup_blocked_client(client):
     with BLOCKING_CLIENTS_LOCK:
         for key, waiters in list(BLOCKING_CLIENTS.items()):
-            BLOCKING_CLIENTS[key] = [
-                cond for cond in waiters if getattr(cond, "client_socket", None) != client
-            ]
-            if not BLOCKING_CLIENTS[key]:
-                del BLOCKING_CLIENTS[key]
+            # Only rebuild the queues this client is actually waiting in
+            if any(getattr(waiter, "client_socket", None) == client for waiter in waiters):
+                waiters = deque(waiter for waiter in waiters if getattr(waiter, "client_socket", None) != client)
+                if waiters:
+                    BLOCKING_CLIENTS[key] = waiters
+                else:
+                    del BLOCKING_CLIENTS[key]
 
 
-def read_string(f):
-    length_or_encoding_byte = read_length(f)
+# ============================================================================
+# RDB FILE LOADING
+# ============================================================================
+# The RDB file is memory-mapped and decoded by indexing into it directly. Every reader
+# takes the buffer and a position and returns (value, new_position), so decoding never
+# issues a read() call per byte or allocates a one-byte bytes object per field.
+
+def read_string(buf, pos: int):
+    length_or_encoding_byte, pos = read_length(buf, pos)
 
     # Check if the length is actually an encoding byte (prefix 0b11)
     if (length_or_encoding_byte >> 6) == 0b11:
         # It's an encoded string (C0-C3), delegate to read_encoded_string
-        return read_encoded_string(f, length_or_encoding_byte)  # <<< Pass the encoding byte
+        return read_encoded_string(buf, pos, length_or_encoding_byte)
 
     # Regular string: the result is the length
     length = length_or_encoding_byte
-    data = f.read(length)
-    try:
-        return data.decode("utf-8")
-    except UnicodeDecodeError:
-        return data  # Return raw bytes if not valid UTF-8
+    # Keys and values are stored as bytes, exactly as clients send them
+    return bytes(buf[pos:pos + length]), pos + length
 
 
-def read_length(f):
-    first_byte = f.read(1)[0]
+def read_length(buf, pos: int):
+    first_byte = buf[pos]
+    pos += 1
     prefix = first_byte >> 6  # first 2 bits
 
     if prefix == 0b00:
         # small length
-        return first_byte & 0x3F
+        return first_byte & 0x3F, pos
     elif prefix == 0b01:
         # 14-bit length
-        second_byte = f.read(1)[0]
-        return ((first_byte & 0x3F) << 8) | second_byte
+        second_byte = buf[pos]
+        return ((first_byte & 0x3F) << 8) | second_byte, pos + 1
     elif prefix == 0b10:
         # 32-bit length
-        return int.from_bytes(f.read(4), "big")
+        return int.from_bytes(buf[pos:pos + 4], "big"), pos + 4
     else:
         # special string encoding (C0–C3)
-        return first_byte
+        return first_byte, pos
 
 
-def read_value(f, value_type):
-    if value_type == b'\x00':  # string
-        return read_string(f)
+def read_value(buf, pos: int, value_type: int):
+    if value_type == 0x00:  # string
+        return read_string(buf, pos)
     # other types like lists/hashes could be added later
-    return None
+    return None, pos
 
 
-def read_expiry(f, type_byte):
-    if type_byte == b'\xFC':  # ms
-        return int.from_bytes(f.read(8), "little")
-    elif type_byte == b'\xFD':  # sec
-        return int.from_bytes(f.read(4), "little")
+def read_expiry(buf, pos: int, type_byte: int):
+    """Reads an expiry timestamp and returns it in Unix milliseconds."""
+    if type_byte == 0xFC:  # ms
+        return int.from_bytes(buf[pos:pos + 8], "little"), pos + 8
+    else:  # 0xFD: sec
+        return int.from_bytes(buf[pos:pos + 4], "little") * 1000, pos + 4
 
 
-def read_encoded_string(f, first_byte):
+def read_encoded_string(buf, pos: int, first_byte: int):
     encoding_type = first_byte & 0x3F  # last 6 bits
     if encoding_type == 0x00:  # C0 = 8-bit int
-        val = int.from_bytes(f.read(1), "big")
-        return str(val)
+        return b"%d" % buf[pos], pos + 1
     elif encoding_type == 0x01:  # C1 = 16-bit int
-        val = int.from_bytes(f.read(2), "little")
-        return str(val)
+        return b"%d" % int.from_bytes(buf[pos:pos + 2], "little"), pos + 2
     elif encoding_type == 0x02:  # C2 = 32-bit int
-        val = int.from_bytes(f.read(4), "little")
-        return str(val)
+        return b"%d" % int.from_bytes(buf[pos:pos + 4], "little"), pos + 4
     elif encoding_type == 0x03:  # C3 = LZF compressed
         raise Exception("C3 LZF compression not supported in this stage")
     else:
@@ -304,81 +496,75 @@ def read_encoded_string(f, first_byte):
 
 
 def load_rdb_to_datastore(rdb_path):
-    datastore = {}
-
     with open(rdb_path, "rb") as f:
-        # 1. Read header (magic + 4-byte version). Do not consume the rest of the file.
-        magic = f.read(5)
-        if magic != b"REDIS":
+        if os.fstat(f.fileno()).st_size == 0:
             raise Exception("Unsupported RDB file: missing 'REDIS' magic")
-        version = f.read(4)
-        if not version or len(version) < 4:
-            raise Exception("Unsupported RDB version")
-        # optionally consume a single newline after the version
-        maybe_nl = f.read(1)
-        if maybe_nl not in (b"\n", b"\r", b""):
-            f.seek(-1, 1)
-
-        # 2. Skip metadata sections (0xFA ...)
-        while True:
-            byte = f.read(1)
-            if not byte:
-                break
-            if byte == b'\xFA':
-                # read metadata key and value (string encoded)
-                _ = read_string(f)
-                _ = read_string(f)
-                continue
-            # not a metadata marker, rewind one byte and continue to DB parsing
-            f.seek(-1, 1)
-            break
 
-        # 3. Read database sections
-        while True:
-            byte = f.read(1)
-            if not byte:
-                break  # End of file
-            if byte == b'\xFE':  # Database section
-                db_index = read_length(f)
-
-                # Hash table size info (optional)
-                hash_size_marker = f.read(1)
-                if hash_size_marker == b'\xFB':
-                    read_length(f)  # key-value hash table size
-                    read_length(f)  # expiry hash table size
-                else:
-                    f.seek(-1, 1)
-
-                # Key-value pairs
-                while True:
-                    expiry = None
-                    type_byte = f.read(1)
-                    if not type_byte or type_byte == b'\xFF':
-                        break
-                    if type_byte in (b'\xFC', b'\xFD'):
-                        expiry = read_expiry(f, type_byte)
-                        type_byte = f.read(1)
-                    value_type = type_byte
-                    key = read_string(f)
-                    value = read_value(f, value_type)
-                    if value_type == b'\x00':
-                        datastore[key] = {
-                            "type": "string",
-                            "value": value,
-                            "expiry": expiry
-                        }
-            elif byte == b'\xFF':  # End of file section
-                # After 0xFF, 8 bytes of checksum follow. Consume them.
-                _ = f.read(8)
-                # Ignore any extra bytes after checksum (be robust)
-                break
-            elif byte == b'\xFA':
-                # Metadata section (shouldn't appear here, but skip if present)
-                _ = read_string(f)
-                _ = read_string(f)
-            else:
-                # Ignore any unknown/extra bytes after checksum
-                break
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _parse_rdb(mm)
+
+
+def _parse_rdb(buf) -> dict:
+    datastore = {}
+    end = len(buf)
+    # RDB expiries are wall-clock; this converts them to the store's monotonic deadlines
+    monotonic_offset_ns = time.monotonic_ns() - time.time_ns()
+
+    # 1. Read header (magic + 4-byte version).
+    if buf[0:5] != b"REDIS":
+        raise Exception("Unsupported RDB file: missing 'REDIS' magic")
+    if end < 9:
+        raise Exception("Unsupported RDB version")
+    pos = 9
+    # optionally skip a single newline after the version
+    if pos < end and buf[pos] in (0x0A, 0x0D):
+        pos += 1
+
+    # 2. Skip metadata sections (0xFA ...)
+    while pos < end and buf[pos] == 0xFA:
+        # read metadata key and value (string encoded)
+        _, pos = read_string(buf, pos + 1)
+        _, pos = read_string(buf, pos)
+
+    # 3. Read database sections
+    while pos < end:
+        byte = buf[pos]
+        pos += 1
+        if byte == 0xFE:  # Database section
+            db_index, pos = read_length(buf, pos)
+
+            # Hash table size info (optional)
+            if pos < end and buf[pos] == 0xFB:
+                _, pos = read_length(buf, pos + 1)  # key-value hash table size
+                _, pos = read_length(buf, pos)  # expiry hash table size
+
+            # Key-value pairs
+            while pos < end:
+                expiry = 0
+                type_byte = buf[pos]
+                if type_byte == 0xFF:
+                    break
+                pos += 1
+                if type_byte in (0xFC, 0xFD):
+                    expiry_ms, pos = read_expiry(buf, pos, type_byte)
+                    # Clamp at 1 so an already-expired key cannot land on 0 ("never expires")
+                    expiry = expiry_ms * 1_000_000 + monotonic_offset_ns or 1
+                    type_byte = buf[pos]
+                    pos += 1
+                key, pos = read_string(buf, pos)
+                value, pos = read_value(buf, pos, type_byte)
+                if type_byte == 0x00:
+                    datastore[key] = DataEntry("string", value, expiry)
+        elif byte == 0xFF:  # End of file section
+            # After 0xFF, 8 bytes of checksum follow; anything after them is ignored
+            break
+        elif byte == 0xFA:
+            # Metadata section (shouldn't appear here, but skip if present)
+            _, pos = read_string(buf, pos)
+            _, pos = read_string(buf, pos)
+        else:
+            # Ignore any unknown/extra bytes
+            break
 
     return datastore
 
@@ -393,10 +579,6 @@ def subscribe(client, channel):
             CLIENT_SUBSCRIPTIONS[client] = set()
         CLIENT_SUBSCRIPTIONS[client].add(channel)
 
-        if client not in CLIENT_STATE:
-            CLIENT_STATE[client] = {}
-        CLIENT_STATE[client]["is_subscribed"] = True
-
 
 def num_client_subscriptions(client) -> int:
     """
@@ -412,10 +594,10 @@ def num_client_subscriptions(client) -> int:
 def is_client_subscribed(client) -> bool:
     """
     Returns whether the given client is subscribed to any channels.
+    Runs before every command, so it avoids the lock: CLIENT_SUBSCRIPTIONS only holds clients
+    with at least one channel, and a single dict membership test is atomic.
     """
-    with BLOCKING_CLIENTS_LOCK:
-        state = CLIENT_STATE.get(client, {})
-        return state.get("is_subscribed", False)
+    return client in CLIENT_SUBSCRIPTIONS
 
 
 def unsubscribe(client, channel):
@@ -430,12 +612,21 @@ def unsubscribe(client, channel):
             if not CLIENT_SUBSCRIPTIONS[client]:
                 del CLIENT_SUBSCRIPTIONS[client]
 
-        if client in CLIENT_STATE:
-            subscriptions = CLIENT_SUBSCRIPTIONS.get(client, set())
-            CLIENT_STATE[client]["is_subscribed"] = len(subscriptions) > 0
 
+def unsubscribe_all(client):
+    """
+    Drops every subscription of a client that is going away.
+    """
+    with BLOCKING_CLIENTS_LOCK:
+        for channel in CLIENT_SUBSCRIPTIONS.pop(client, ()):
+            subscribers = CHANNEL_SUBSCRIBERS.get(channel)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del CHANNEL_SUBSCRIBERS[channel]
 
-def add_to_sorted_set(key: str, member: str, score_str: str) -> int:
+
+def add_to_sorted_set(key: bytes, member: bytes, score_str: bytes | str) -> int:
     """
     Adds a member with a given score to a sorted set.
     Returns 1 if a new member was added, or 0 if an existing member's score was updated.
@@ -446,6 +637,9 @@ def add_to_sorted_set(key: str, member: str, score_str: str) -> int:
             score = float(score_str)
         except ValueError:
             return 0
+        if math.isnan(score):
+            # NaN has no rank: it would corrupt the bisected index
+            return 0
 
             # 1. Ensure the sorted set exists in the map
         if key not in SORTED_SETS:
@@ -453,21 +647,28 @@ def add_to_sorted_set(key: str, member: str, score_str: str) -> int:
             SORTED_SETS[key] = {}
 
         if key not in DATA_STORE:
-            DATA_STORE[key] = {
-                "type": "sorted_set",
-                "value": SORTED_SETS[key],
-                "expiry": None
-            }
+            _invalidate_keys_reply()
+            DATA_STORE[key] = DataEntry("sorted_set", SORTED_SETS[key])
 
         # 2. Check if the member already exists
-        is_new_member = member not in SORTED_SETS[key]
+        members = SORTED_SETS[key]
+        index = SORTED_SET_INDEX.setdefault(key, [])
+        old_score = members.get(member)
+        is_new_member = old_score is None
 
-        SORTED_SETS[key][member] = score
+        if not is_new_member:
+            if old_score == score:
+                return 0
+            # Drop the stale (score, member) pair before re-inserting it at its new rank
+            del index[bisect.bisect_left(index, (old_score, member))]
+
+        members[member] = score
+        bisect.insort(index, (score, member))
 
         return 1 if is_new_member else 0
 
 
-def num_sorted_set_members(key: str) -> int:
+def num_sorted_set_members(key: bytes) -> int:
     """
     Returns the number of elements (cardinality) in the sorted set stored at key.
     """
@@ -476,7 +677,7 @@ def num_sorted_set_members(key: str) -> int:
         return len(SORTED_SETS.get(key, {}))
 
 
-def get_sorted_set_rank(key: str, member: str) -> int | None:
+def get_sorted_set_rank(key: bytes, member: bytes) -> int | None:
     """
     Returns the rank (0-based index) of the member in the sorted set stored at key.
     If the member does not exist, returns None.
@@ -485,21 +686,11 @@ def get_sorted_set_rank(key: str, member: str) -> int | None:
         if key not in SORTED_SETS or member not in SORTED_SETS[key]:
             return None
 
-        # Get all members and their scores
-        members_with_scores = SORTED_SETS[key].items()
-
-        # Sort members by score (ascending), then by member name (lexicographically)
-        sorted_members = sorted(members_with_scores, key=lambda item: (item[1], item[0]))
-
-        # Find the rank of the specified member
-        for rank, (m, _) in enumerate(sorted_members):
-            if m == member:
-                return rank
+        # The index is ordered by score, then member, so the pair's position is its rank
+        return bisect.bisect_left(SORTED_SET_INDEX[key], (SORTED_SETS[key][member], member))
 
-        return None  # Should not reach here due to earlier checks
 
-
-def get_sorted_set_range(key: str, start: int, end: int) -> list[str]:
+def get_sorted_set_range(key: bytes, start: int, end: int) -> list[bytes]:
     """
     Returns a list of members in the sorted set stored at key, from start to end indices (inclusive).
     If the key does not exist, returns an empty list.
@@ -508,32 +699,26 @@ def get_sorted_set_range(key: str, start: int, end: int) -> list[str]:
         if key not in SORTED_SETS:
             return []
 
-        # Get all members and their scores
-        members_with_scores = SORTED_SETS[key].items()
-
-        # Sort members by score (ascending), then by member name (lexicographically)
-        sorted_members = sorted(members_with_scores, key=lambda item: (item[1], item[0]))
-
-        # Extract just the member names
-        sorted_member_names = [member for member, _ in sorted_members]
+        index = SORTED_SET_INDEX[key]
+        size = len(index)
 
         # Handle negative indices
         if start < 0:
-            start = start + len(sorted_member_names)
+            start = start + size
         if end < 0:
-            end = end + len(sorted_member_names)
+            end = end + size
 
         # Adjust indices to be within bounds
         start = max(0, start)
-        end = min(end, len(sorted_member_names) - 1)
+        end = min(end, size - 1)
 
-        if start > end or start >= len(sorted_member_names):
+        if start > end or start >= size:
             return []
 
-        return sorted_member_names[start:end + 1]
+        return [member for _, member in index[start:end + 1]]
 
 
-def get_zscore(key: str, member: str) -> float | None:
+def get_zscore(key: bytes, member: bytes) -> float | None:
     """
     Returns the score of the member in the sorted set stored at key.
     If the member does not exist, returns None.
@@ -545,7 +730,7 @@ def get_zscore(key: str, member: str) -> float | None:
         return SORTED_SETS[key][member]
 
 
-def remove_from_sorted_set(key: str, member: str) -> int:
+def remove_from_sorted_set(key: bytes, member: bytes) -> int:
     """
     Removes a member from the sorted set stored at key.
     Returns 1 if the member was removed, or 0 if the member did not exist.
@@ -554,42 +739,41 @@ def remove_from_sorted_set(key: str, member: str) -> int:
         if key not in SORTED_SETS or member not in SORTED_SETS[key]:
             return 0
 
-        del SORTED_SETS[key][member]
+        index = SORTED_SET_INDEX[key]
+        del index[bisect.bisect_left(index, (SORTED_SETS[key].pop(member), member))]
         if not SORTED_SETS[key]:
             del SORTED_SETS[key]
+            del SORTED_SET_INDEX[key]
             if key in DATA_STORE:
                 del DATA_STORE[key]
+                _invalidate_keys_reply()
         return 1
 
 
-def _verify_and_parse_new_id(new_id_str: str, last_id_str: str | None) -> tuple[str | None, bytes | None]:
+def _verify_and_parse_new_id(new_id_str: str, last_id: tuple[int, int] | None) \
+        -> tuple[str | None, tuple[int, int] | None, bytes | None]:
     """
-    Parses and validates the new ID against the last ID in the stream, 
+    Parses and validates the new ID against the (ms, seq) of the last ID in the stream,
     auto-generating the sequence number if 'ms-*' is present.
-    Returns: (final_valid_id_str, error_bytes). 
+    Returns: (final_valid_id_str, (ms, seq), error_bytes).
     """
 
-    # Determine the ID of the last entry
-    if last_id_str is None:
-        last_ms, last_seq = 0, 0  # Conceptual ID for empty stream
-    else:
-        try:
-            last_parts = last_id_str.split('-')
-            last_ms = int(last_parts[0])
-            last_seq = int(last_parts[1])
-        except ValueError:
-            return None, b"-ERR Internal error reading last stream ID\r\n"
+    # Determine the ID of the last entry (0-0 conceptually for an empty stream)
+    last_ms, last_seq = last_id if last_id is not None else (0, 0)
+
+    # Split once: "ms-seq", "ms-*" and "*" all come apart with one partition
+    ms_part, separator, seq_part = new_id_str.partition('-')
 
     # 1. Handle Auto-generation of Sequence Number (ms-*)
-    if new_id_str.endswith('-*'):
+    if seq_part == '*':
         try:
-            new_ms = int(new_id_str.split('-')[0])
+            new_ms = int(ms_part)
         except ValueError:
-            return None, b"-ERR Invalid stream ID format\r\n"
+            return None, None, b"-ERR Invalid stream ID format\r\n"
 
         # Rule: millisecondsTime must be strictly greater than or equal to last
         if new_ms < last_ms:
-            return None, b"-ERR The ID specified in XADD is equal or smaller than the target stream top item\r\n"
+            return None, None, b"-ERR The ID specified in XADD is equal or smaller than the target stream top item\r\n"
 
         # Determine the new sequence number
         if new_ms > last_ms:
@@ -601,12 +785,12 @@ def _verify_and_parse_new_id(new_id_str: str, last_id_str: str | None) -> tuple[
             new_seq = last_seq + 1
 
         final_id_str = f"{new_ms}-{new_seq}"
-        return final_id_str, None
+        return final_id_str, (new_ms, new_seq), None
 
     # 2. Handle Auto-generation of Full ID (*)
     if new_id_str == "*":
         # Auto-generate both millisecondsTime and sequenceNumber
-        current_time_ms = int(time.time() * 1000)
+        current_time_ms = now_ms()
 
         new_ms = current_time_ms
         if new_ms > last_ms:
@@ -615,52 +799,48 @@ def _verify_and_parse_new_id(new_id_str: str, last_id_str: str | None) -> tuple[
             new_seq = last_seq + 1
 
         final_id_str = f"{new_ms}-{new_seq}"
-        return final_id_str, None
+        return final_id_str, (new_ms, new_seq), None
 
     # 3. Handle Explicit ID (ms-seq)
+    if not separator:
+        return None, None, b"-ERR Invalid stream ID format\r\n"
     try:
-        new_parts = new_id_str.split('-')
-        if len(new_parts) != 2:
-            return None, b"-ERR Invalid stream ID format\r\n"
-
-        new_ms = int(new_parts[0])
-        new_seq = int(new_parts[1])
+        new_ms = int(ms_part)
+        new_seq = int(seq_part)
     except ValueError:
-        return None, b"-ERR Invalid stream ID format\r\n"
+        return None, None, b"-ERR Invalid stream ID format\r\n"
 
-    # Rule: 0-0 is always invalid (min valid ID is 0-1)
-    if new_id_str == "0-0":
-        return None, b"-ERR The ID specified in XADD must be greater than 0-0\r\n"
+    # Rule: 0-0 is always invalid (min valid ID is 0-1), however it is spelled (e.g. "00-0")
+    if new_ms == 0 and new_seq == 0:
+        return None, None, b"-ERR The ID specified in XADD must be greater than 0-0\r\n"
 
     # Rule: ID must be strictly greater than the last ID
     # a) millisecondsTime must be strictly greater than or equal to last
     if new_ms < last_ms:
-        return None, b"-ERR The ID specified in XADD is equal or smaller than the target stream top item\r\n"
+        return None, None, b"-ERR The ID specified in XADD is equal or smaller than the target stream top item\r\n"
 
     # b) If millisecondsTime are equal, sequenceNumber must be strictly greater
     if new_ms == last_ms:
         if new_seq <= last_seq:
-            return None, b"-ERR The ID specified in XADD is equal or smaller than the target stream top item\r\n"
+            return None, None, b"-ERR The ID specified in XADD is equal or smaller than the target stream top item\r\n"
 
     # Validation succeeded for explicit ID
-    return new_id_str, None
+    return new_id_str, (new_ms, new_seq), None
 
 
-def xadd(key: str, id: str, fields: dict[str, str]) -> bytes:
+def xadd(key: bytes, id: str, fields: dict[bytes, bytes]) -> bytes:
     """
     Adds an entry to a stream at the given key with the specified ID and fields.
     Returns the ID string on success, or a RESP Error bytes on failure.
     """
     with DATA_LOCK:
 
-        # Get last ID (safely handle non-existent key after expiration check)
-        last_id_str = None
-        if key in STREAMS and STREAMS[key]:
-            last_id_str = STREAMS[key][-1]["id"]
+        # Parsed (ms, seq) of the last ID (None for a stream that has no entries yet)
+        index = STREAM_ID_INDEX.get(key)
+        last_id = index[-1] if index else None
 
         # validation
-        final_id_str, error_response = _verify_and_parse_new_id(id, last_id_str)
-        print(f"final_id_str: {final_id_str}")
+        final_id_str, parsed_id, error_response = _verify_and_parse_new_id(id, last_id)
 
         if error_response is not None:
             return error_response
@@ -670,11 +850,8 @@ def xadd(key: str, id: str, fields: dict[str, str]) -> bytes:
         if key not in STREAMS:
             STREAMS[key] = []
         if key not in DATA_STORE:
-            DATA_STORE[key] = {
-                "type": "stream",
-                "value": None,  # Stream data is in STREAMS, not here
-                "expiry": None
-            }
+            _invalidate_keys_reply()
+            DATA_STORE[key] = DataEntry("stream", None)  # Stream data is in STREAMS, not here
 
         # Add Entry
         entry = {
@@ -682,12 +859,14 @@ def xadd(key: str, id: str, fields: dict[str, str]) -> bytes:
             "fields": fields
         }
         STREAMS[key].append(entry)
+        STREAM_ID_INDEX.setdefault(key, []).append(parsed_id)
+        STREAM_LAST_IDS[key] = new_entry_id
 
         # Success: Return the ID string for command execution to format
         return new_entry_id.encode()
 
 
-def xrange(key: str, start_id: str, end_id: str) -> list[dict]:
+def xrange(key: bytes, start_id: str, end_id: str) -> list[dict]:
     """
     Returns a list of stream entries in the range [start_id, end_id] for the given key.
     Each entry is a dictionary with 'id' and 'fields'.
@@ -697,43 +876,23 @@ def xrange(key: str, start_id: str, end_id: str) -> list[dict]:
         if key not in STREAMS:
             return []
 
-        entries = STREAMS[key]
-        result = []
-
-        for entry in entries:
-            entry_id = entry["id"]
-            if (start_id == "-" or compare_stream_ids(entry_id, start_id) >= 0) and \
-                    (end_id == "+" or compare_stream_ids(entry_id, end_id) <= 0):
-                result.append(entry)
+        index = STREAM_ID_INDEX[key]
+        lo = 0 if start_id == "-" else bisect.bisect_left(index, parse_stream_id(start_id, 0))
+        hi = len(index) if end_id == "+" else bisect.bisect_right(index, parse_stream_id(end_id, sys.maxsize))
 
-        return result
+        return STREAMS[key][lo:hi]
 
 
-def compare_stream_ids(id1: str, id2: str) -> int:
+def parse_stream_id(stream_id: str, default_seq: int = 0) -> tuple[int, int]:
     """
-    Compares two stream IDs.
-    Returns:
-        -1 if id1 < id2
-         0 if id1 == id2
-         1 if id1 > id2
+    Parses "ms-seq" into an (ms, seq) tuple that orders the way stream IDs do.
+    A bare "ms" takes default_seq as its sequence number.
     """
-    ms1, seq1 = map(int, id1.split('-'))
-    ms2, seq2 = map(int, id2.split('-'))
-
-    if ms1 < ms2:
-        return -1
-    elif ms1 > ms2:
-        return 1
-    else:
-        if seq1 < seq2:
-            return -1
-        elif seq1 > seq2:
-            return 1
-        else:
-            return 0
+    ms, _, seq = stream_id.partition('-')
+    return int(ms), int(seq) if seq else default_seq
 
 
-def xread(keys: list[str], last_ids: list[str]) -> dict[str, list[dict]]:
+def xread(keys: list[bytes], last_ids: list[str]) -> dict[bytes, list[dict]]:
     """
     Reads entries from multiple streams starting after the given last IDs.
     Returns a dictionary mapping each key to a list of new entries.
@@ -745,20 +904,17 @@ def xread(keys: list[str], last_ids: list[str]) -> dict[str, list[dict]]:
         for key, last_id in zip(keys, last_ids):
 
             if last_id == "$":
-                resolved_id = get_stream_max_id(key)
+                # DATA_LOCK is already held here, so read the cache directly
+                resolved_id = STREAM_LAST_IDS.get(key, "0-0")
             else:
                 resolved_id = last_id
 
             if key not in STREAMS:
                 continue
 
-            entries = STREAMS[key]
-            new_entries = []
-
-            for entry in entries:
-                entry_id = entry["id"]
-                if compare_stream_ids(entry_id, resolved_id) > 0:
-                    new_entries.append(entry)
+            # Everything after the last entry whose ID is <= resolved_id
+            start = bisect.bisect_right(STREAM_ID_INDEX[key], parse_stream_id(resolved_id))
+            new_entries = STREAMS[key][start:]
 
             if new_entries:
                 result[key] = new_entries
@@ -766,7 +922,7 @@ def xread(keys: list[str], last_ids: list[str]) -> dict[str, list[dict]]:
         return result
 
 
-def get_stream_max_id(key: str) -> str:
+def get_stream_max_id(key: bytes) -> str:
     """
     Returns the ID of the last entry in the stream.
     Used for '$' in XREAD to mean "read from the end".
@@ -774,46 +930,41 @@ def get_stream_max_id(key: str) -> str:
     just before the first valid entry (0-1) or any other entry.
     """
     with DATA_LOCK:
-        # Check if the stream key exists and has entries
-        if key in STREAMS and STREAMS[key]:
-            return STREAMS[key][-1]["id"]
-
         # If stream is empty, we return "0-0" so that the first valid entry (0-1, 1-0, etc.) 
         # is correctly recognized as greater than the starting ID.
-        return "0-0"
+        return STREAM_LAST_IDS.get(key, "0-0")
 
 
-def increment_key_value(key: str) -> tuple[int | None, str | None]:
+def increment_key_value(key: bytes) -> tuple[int | None, bytes | None]:
     """
     Atomically increments the integer value of a key by one.
     Handles non-existent key, wrong type, and non-integer value errors.
-    Returns: (new_value: int | None, error_message: str | None)
+    Returns: (new_value: int | None, error_reply: bytes | None)
     """
-    data_entry = get_data_entry(key)  # This already checks for expiry
     with DATA_LOCK:
+        # Looked up under the same lock hold as the update, so a concurrent SET or expiry
+        # cannot replace the entry in between
+        data_entry = _get_live_entry(key)  # This already checks for expiry
 
-        print("retrieved data")
         # 1. Key does not exist: Initialize to 0, then increment to 1.
         if data_entry is None:
             # We must set the key to "1" directly, not "0" then "1"
-            DATA_STORE[key] = {
-                "type": "string",
-                "value": "1",
-                "expiry": None
-            }
+            _invalidate_keys_reply()
+            DATA_STORE[key] = DataEntry("string", 1)
             return 1, None
 
         # 2. Key exists but is the wrong type
-        if data_entry.get("type") != "string":
-            return None, "-WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
+        if data_entry.type != "string":
+            return None, b"-WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
 
-        current_value_str = data_entry["value"]
+        current_value = data_entry.value
 
-        # 3. Key exists and is a string, but not a valid integer
-        try:
-            current_value = int(current_value_str)
-        except ValueError:
-            return None, "-ERR value is not an integer or out of range\r\n"
+        # 3. Key exists and is a string, but not a valid integer (counters are already ints).
+        #    int() alone would also accept b"1_000", b" 7 " and b"+5", which Redis rejects.
+        if type(current_value) is not int:
+            if not INTEGER_VALUE.fullmatch(current_value):
+                return None, b"-ERR value is not an integer or out of range\r\n"
+            current_value = int(current_value)
 
         # 4. Perform increment and check for overflow (Redis uses signed 64-bit integers)
         # Note: Python integers don't overflow, so we must check explicitly.
@@ -824,87 +975,15 @@ def increment_key_value(key: str) -> tuple[int | None, str | None]:
         if current_value >= MAX_64_BIT or current_value < MIN_64_BIT:
             # An increment will definitely cause an overflow from MAX_64_BIT,
             # and we should prevent modification if the value is already at a limit
-            return None, "-ERR increment or decrement would overflow\r\n"
+            return None, b"-ERR increment or decrement would overflow\r\n"
 
         # Redis behavior: INCR stops at MAX_64_BIT, meaning you can't INCR 9223372036854775807
         if current_value == MAX_64_BIT:
-            return None, "-ERR increment or decrement would overflow\r\n"
+            return None, b"-ERR increment or decrement would overflow\r\n"
 
         new_value = current_value + 1
 
-        # 5. Update and return
-        data_entry["value"] = str(new_value)
+        # 5. Update and return (dropping any reply GET cached for the old value)
+        data_entry.value = new_value
+        data_entry.encoded = None
         return new_value, None
-
-
-def is_client_in_multi(client) -> bool:
-    """
-    Returns whether the given client has an active transaction (is in MULTI mode).
-    """
-    # Note: Assumes CLIENT_STATE access is guarded by BLOCKING_CLIENTS_LOCK 
-    # since it's used for subscription state. Reusing that lock here for consistency.
-    with BLOCKING_CLIENTS_LOCK:
-        state = CLIENT_STATE.get(client, {})
-        return state.get("is_in_multi", False)
-
-
-def set_client_in_multi(client, state: bool):
-    """
-    Sets the client's transaction state (True for MULTI, False otherwise).
-    """
-    with BLOCKING_CLIENTS_LOCK:
-        if client not in CLIENT_STATE:
-            CLIENT_STATE[client] = {}
-        CLIENT_STATE[client]["is_in_multi"] = state
-
-        # Initialize or clear the command queue when setting the state
-        if state:
-            # Start of transaction: initialize empty queue
-            CLIENT_STATE[client]["queue"] = []
-        else:
-            # End of transaction (EXEC/DISCARD): clear the queue
-            CLIENT_STATE[client]["queue"] = []
-
-
-def get_client_queued_commands(client) -> list:
-    """
-    Returns the list of commands queued for the client.
-    """
-    with BLOCKING_CLIENTS_LOCK:
-        return CLIENT_STATE.get(client, {}).get("queue", [])
-
-
-def enqueue_client_command(client, command: str, arguments: list):
-    """
-    Adds a command and its arguments to the client's transaction queue.
-    Assumes client is already in a MULTI state.
-    """
-    with BLOCKING_CLIENTS_LOCK:
-        state = CLIENT_STATE.get(client, {})
-        # Ensure the queue exists (it should, after MULTI)
-        if "queue" not in state:
-            state["queue"] = []
-
-        # Store the command as a tuple: (COMMAND, [arg1, arg2, ...])
-        state["queue"].append((command, arguments))
-
-
-def _serialize_command_to_resp_array(command: str, arguments: list) -> bytes:
-    """
-    Converts a command and its arguments into a raw RESP array byte string.
-    Example: ('SET', ['foo', 'bar']) -> b'*3\r\n$3\r\nSET\r\n$3\r\nfoo\r\n$3\r\nbar\r\n'
-    """
-    elements = [command] + arguments
-
-    # Start with the array header: *<count>\r\n
-    resp_array_parts = [b"*" + str(len(elements)).encode() + b"\r\n"]
-
-    for element in elements:
-        # Each element is a bulk string: $<length>\r\n<content>\r\n
-        element_bytes = element.encode()
-        length_bytes = str(len(element_bytes)).encode()
-
-        resp_array_parts.append(b"$" + length_bytes + b"\r\n")
-        resp_array_parts.append(element_bytes + b"\r\n")
-
-    return b"".join(resp_array_parts)
\ No newline at end of file
@@ -6,7 +6,7 @@ manages replication functionality for master-slave architecture.
 
 Main Components:
     - TCP server listening for client connections
-    - Connection handler spawning threads for each client
+    - Selector loop multiplexing every client connection on one thread
     - Replication listener for receiving commands from master
     - Master connection setup for replica servers
     - Command propagation to replica servers
@@ -16,9 +16,13 @@ Server Modes:
     - Replica mode: Connects to master, receives commands, and serves read requests
 
 Threading Model:
-    - Main thread: Accepts new client connections
-    - Client threads: One thread per client connection for command processing
+    - Main thread: A selectors (epoll on Linux) loop that accepts connections, reads from every
+      ready client and runs its commands
+    - Blocking-command threads: A client about to run BLPOP, XREAD or WAIT is moved to a reusable
+      worker thread, and handed back to the main loop once its buffered commands are done.
+      Client sockets are non-blocking; the main loop sends whatever replies they did not take
     - Replication thread: Listens for commands from master (replica mode only)
+    - Expiry thread: Actively evicts keys whose TTL has passed
 
 Configuration:
     Server behavior is configured via command-line arguments:
@@ -28,14 +32,229 @@ Configuration:
     - --dbfilename: RDB file name
 """
 
+import queue
+import selectors
 import socket
 import threading
 import sys
 
 from app.protocol.constants import *
-from app.core.command_execution import handle_connection
+from app.core.command_execution import OUTBOX_PAUSE_READ_SIZE, ClientConnection, close_client_connection, \
+    run_client_commands, write_outbox
+from app.core.datastore import start_expiry_sweeper, take_time_snapshot
 import app.core.command_execution as ce
 
+# Bytes requested per recv() on a client or master connection; large enough that a deep
+# pipeline arrives in a few reads instead of one read per 4 KiB.
+RECV_BUFFER_SIZE = 64 * 1024
+
+
+# ============================================================================
+# CLIENT CONNECTIONS - SELECTOR LOOP
+# ============================================================================
+
+class ConnectionLoop:
+    """
+    Single-threaded selector loop serving every client connection.
+
+    Idle connections cost a registration in the selector rather than a thread. Commands run on
+    the loop thread until one may block; that connection is then marked busy, finished on a
+    worker thread, and handed back through `updates` (the socketpair wakes the loop).
+    Worker threads are kept once started and reused for later hand-offs; a new one is only
+    started when every existing worker is busy, so a blocked client never waits for another.
+
+    Client sockets are non-blocking. Replies are written with send_to_connection(), which
+    queues whatever the socket does not take; the loop then watches the socket for writability
+    and drains the outbox, and stops reading from a client while its outbox is over
+    OUTBOX_PAUSE_READ_SIZE. A client that does not read its replies therefore never stalls
+    the loop or the threads publishing and propagating to it.
+
+    Every read lands in one receive buffer owned by the loop (only the loop thread reads),
+    so no per-read bytes object is allocated; the readers copy out what they keep.
+    """
+
+    def __init__(self, server_socket: socket.socket):
+        self.server_socket = server_socket
+        self.selector = selectors.DefaultSelector()
+        # (connection, close) pairs posted by other threads for the loop to act on
+        self.updates = queue.SimpleQueue()
+        self.wakeup_reader, self.wakeup_writer = socket.socketpair()
+        self.recv_buffer = memoryview(bytearray(RECV_BUFFER_SIZE))
+        self.handoffs = queue.SimpleQueue()
+        self.workers_lock = threading.Lock()
+        self.idle_workers = 0
+
+        server_socket.setblocking(False)
+        self.wakeup_reader.setblocking(False)
+        self.wakeup_writer.setblocking(False)
+        self.selector.register(server_socket, selectors.EVENT_READ)
+        self.selector.register(self.wakeup_reader, selectors.EVENT_READ)
+
+        # Writes that leave bytes queued ask the loop to watch the socket for writability
+        ce.WATCH_OUTBOX = self.post
+
+    def serve_forever(self):
+        while True:
+            for key, mask in self.selector.select():
+                if key.fileobj is self.server_socket:
+                    self.accept_connections()
+                elif key.fileobj is self.wakeup_reader:
+                    self.apply_updates()
+                else:
+                    client = key.data
+                    if mask & selectors.EVENT_WRITE:
+                        self.write_to(client)
+                    if mask & selectors.EVENT_READ and not client.closed:
+                        self.read_from(client)
+
+    def accept_connections(self):
+        while True:
+            try:
+                connection, client_address = self.server_socket.accept()
+            except BlockingIOError:
+                return
+
+            print(f"Connection: New connection from {client_address}")
+            connection.setblocking(False)
+            # Replies are already batched per read, so send each batch immediately
+            # instead of letting Nagle's algorithm hold it back waiting for an ACK.
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.watch(ClientConnection(connection, client_address))
+
+    def read_from(self, client: ClientConnection):
+        try:
+            received = client.sock.recv_into(self.recv_buffer)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            print(f"Connection Error: recv from {client.address} failed: {e}")
+            received = 0
+
+        if not received:
+            print(f"Connection: Client {client.address} closed connection.")
+            self.close(client)
+            return
+
+        client.reader.feed(self.recv_buffer[:received])
+
+        # One timestamp serves every command parsed from this read
+        take_time_snapshot()
+
+        try:
+            finished = run_client_commands(client, blocking_allowed=False)
+        except Exception as e:
+            print(f"Connection Error: Closing connection to {client.address}: {e!r}")
+            self.close(client)
+            return
+
+        if not finished:
+            # A blocking command is next: let it wait on a worker thread, off the selector.
+            # The loop stops reading from the client but keeps draining its outbox.
+            client.busy = True
+            self.watch(client)
+            self.hand_off(client)
+            return
+
+        self.watch(client)
+
+    def write_to(self, client: ClientConnection):
+        try:
+            with client.write_lock:
+                write_outbox(client)
+        except OSError as e:
+            print(f"Connection Error: send to {client.address} failed: {e}")
+            if not client.busy:
+                self.close(client)
+                return
+            # Its worker still owns the connection; the broken socket is noticed once it is back
+            with client.write_lock:
+                client.outbox.clear()
+                client.outbox_size = 0
+
+        self.watch(client)
+
+    def watch(self, client: ClientConnection):
+        """
+        Registers the events the loop should wait for on a client: readable unless a worker owns
+        it or its outbox is over the pause size, writable while its outbox holds anything.
+        """
+        if client.closed:
+            return
+
+        events = 0
+        if not client.busy and client.outbox_size < OUTBOX_PAUSE_READ_SIZE:
+            events |= selectors.EVENT_READ
+        if client.outbox:
+            events |= selectors.EVENT_WRITE
+
+        if events == client.events:
+            return
+        if not client.events:
+            self.selector.register(client.sock, events, client)
+        elif not events:
+            self.selector.unregister(client.sock)
+        else:
+            self.selector.modify(client.sock, events, client)
+        client.events = events
+
+    def hand_off(self, client: ClientConnection):
+        # Claim an idle worker if there is one, otherwise start another
+        with self.workers_lock:
+            start_worker = self.idle_workers == 0
+            if not start_worker:
+                self.idle_workers -= 1
+        self.handoffs.put(client)
+        if start_worker:
+            threading.Thread(target=self.blocking_worker, daemon=True).start()
+
+    def blocking_worker(self):
+        while True:
+            self.run_blocking_commands(self.handoffs.get())
+            with self.workers_lock:
+                self.idle_workers += 1
+
+    def run_blocking_commands(self, client: ClientConnection):
+        take_time_snapshot()
+        try:
+            run_client_commands(client)
+        except Exception as e:
+            print(f"Connection Error: Closing connection to {client.address}: {e!r}")
+            self.post(client, close=True)
+            return
+
+        client.busy = False
+        self.post(client)
+
+    def post(self, client: ClientConnection, close: bool = False):
+        """
+        Asks the loop, from any thread, to re-check a client's events (or to close it).
+        """
+        self.updates.put((client, close))
+        try:
+            self.wakeup_writer.send(b"\0")
+        except BlockingIOError:
+            pass  # The loop already has wakeups waiting to be read
+
+    def apply_updates(self):
+        try:
+            self.wakeup_reader.recv(4096)
+        except BlockingIOError:
+            pass
+        while not self.updates.empty():
+            client, close = self.updates.get()
+            if close:
+                self.close(client)
+            else:
+                self.watch(client)
+
+    def close(self, client: ClientConnection):
+        if client.closed:
+            return
+        if client.events:
+            self.selector.unregister(client.sock)
+            client.events = 0
+        close_client_connection(client)
+
 
 # ============================================================================
 # REPLICATION - REPLICA SIDE
@@ -55,44 +274,60 @@ def replica_command_listener(master_socket: socket.socket):
     Args:
         master_socket: Socket connection to the master server
     """
+    # Unparsed bytes from the master; a command split across reads waits here for its tail
+    buffer = bytearray()
+    recv_buffer = memoryview(bytearray(RECV_BUFFER_SIZE))
+
     while True:
         try:
-            data = master_socket.recv(4096)
-            if not data:
+            received = master_socket.recv_into(recv_buffer)
+            if not received:
                 print("Replication: Master closed connection.")
                 break
 
-            print(f"Replica: Received propagated data from master: {data!r}")
+            buffer += recv_buffer[:received]
 
-            buffer = data
-            while buffer:
-                parsed_command, bytes_consumed = ce.parsed_resp_array(buffer)
+            start = 0
+            while start < len(buffer):
+                parsed_command, bytes_consumed = ce.parsed_resp_array(buffer, start)
 
                 if not parsed_command:
-                    if buffer.startswith(b'+') or buffer.startswith(b'$'):
-                        next_command_start = buffer.find(b'*')
-
-                        if next_command_start != -1:
-                            print(
-                                f"Replica: Ignoring master handshake response/RDB payload ({next_command_start} bytes).")
-                            buffer = buffer[next_command_start:]
-                            continue
-                        else:
-                            print("Replica: Ignoring remaining master handshake response/RDB payload.")
-                            break
-
-                    print(f"Replica: Could not parse propagated command. Skipping remaining buffer: {buffer!r}")
+                    if buffer[start] == 0x2B:  # b"+": a handshake reply such as +FULLRESYNC
+                        line_end = buffer.find(b"\r\n", start)
+                        if line_end == -1:
+                            break  # Wait for the rest of the line
+
+                        print(f"Replica: Ignoring master handshake response ({line_end + 2 - start} bytes).")
+                        start = line_end + 2
+                        continue
+
+                    if buffer[start] == 0x24:  # b"$": the RDB payload, $<length>\r\n<contents> with no trailing CRLF
+                        header_end = buffer.find(b"\r\n", start)
+                        if header_end == -1:
+                            break  # Wait for the rest of the length line
+
+                        # Skip exactly the declared length: the RDB contents may contain any byte
+                        payload_end = header_end + 2 + int(buffer[start + 1:header_end])
+                        if payload_end > len(buffer):
+                            break  # Wait until the whole payload has arrived
+
+                        print(f"Replica: Ignoring master RDB payload ({payload_end - start} bytes).")
+                        start = payload_end
+                        continue
+
+                    # Incomplete propagated command: wait for the rest in the next read
                     break
 
-                command = parsed_command[0].upper()
+                command = ce.command_name(parsed_command[0])
                 arguments = parsed_command[1:]
 
-                print(f"Command: Parsed command: {command}, Arguments: {arguments}")
-
                 ce.handle_command(command, arguments, master_socket)
                 ce.REPLICA_REPL_OFFSET += bytes_consumed
 
-                buffer = buffer[bytes_consumed:]
+                start += bytes_consumed
+
+            # Compact once per read instead of slicing a new buffer after every command
+            del buffer[:start]
 
         except Exception as e:
             print(f"Replication Listener Error: {e}")
@@ -127,9 +362,11 @@ def connect_to_master(listening_port: int) -> socket.socket | None:
     try:
         master_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         master_socket.connect((master_host, master_port))
+        # Handshake steps and REPLCONF ACK replies are small writes that should not wait on Nagle
+        master_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
         master_socket.sendall(PING_COMMAND_RESP)
-        if not read_simple_string_response(master_socket, b"+PONG\r\n"):
+        if not read_simple_string_response(master_socket, PONG):
             return
 
         port_str = str(listening_port)
@@ -142,11 +379,11 @@ def connect_to_master(listening_port: int) -> socket.socket | None:
         )
 
         master_socket.sendall(replconf_listening_port)
-        if not read_simple_string_response(master_socket, b"+OK\r\n"):
+        if not read_simple_string_response(master_socket, OK):
             return
 
         master_socket.sendall(REPLCONF_CAPA_PSYNC2)
-        if not read_simple_string_response(master_socket, b"+OK\r\n"):
+        if not read_simple_string_response(master_socket, OK):
             return
 
         print("Replication: Sending PSYNC ? -1...")
@@ -225,6 +462,8 @@ def main():
     if master_socket:
         threading.Thread(target=replica_command_listener, args=(master_socket,), daemon=True).start()
 
+    start_expiry_sweeper()
+
     try:
         server_socket = socket.create_server(("localhost", port), reuse_port=True)
         print(f"Server: Starting server on localhost:{port}...")
@@ -233,13 +472,10 @@ def main():
         print(f"Server Error: Could not start server: {e}")
         return
 
-    while True:
-        try:
-            connection, client_address = server_socket.accept()
-            threading.Thread(target=handle_connection, args=(connection, client_address)).start()
-        except Exception as e:
-            print(f"Server Error: Exception during connection acceptance or thread creation: {e}")
-            break
+    try:
+        ConnectionLoop(server_socket).serve_forever()
+    except Exception as e:
+        print(f"Server Error: Exception in the connection loop: {e}")
 
 
 if __name__ == "__main__":
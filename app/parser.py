@@ -1,31 +1,45 @@
-def parsed_resp_array(data: bytes) -> tuple[list[str], int]:
-    if not data or not data.startswith(b"*"):
+try:
+    import hiredis
+except ImportError:  # hiredis is optional; the pure-Python RespParser is used without it
+    hiredis = None
+
+from app.resp_parser import RespParser
+
+
+def parsed_resp_array(data: bytes, start: int = 0) -> tuple[list[bytes], int]:
+    """
+    Parses one RESP array beginning at `start` and returns (elements, bytes_consumed).
+    Elements are returned as raw bytes; nothing is decoded.
+    Returns ([], 0) when the data is incomplete or malformed, so callers reading a stream
+    can parse command after command from one buffer without slicing it.
+    """
+    if start >= len(data) or not data.startswith(b"*", start):
         return [], 0
 
     try:
-        crlf_index = data.find(b"\r\n")
+        crlf_index = data.find(b"\r\n", start)
         if crlf_index == -1:
             return [], 0
 
-        count_bytes = data[1:crlf_index]
+        count_bytes = data[start + 1:crlf_index]
         if not count_bytes:
             print("Parser Error: No element count found.")
             return [], 0
 
-        num_elements_str = count_bytes.decode()
-        num_elements = int(num_elements_str)
+        num_elements = int(count_bytes)
 
     except ValueError:
-        print(f"Parser Error: Invalid element count value: {data[1:crlf_index]}")
+        print(f"Parser Error: Invalid element count value: {data[start + 1:crlf_index]}")
         return [], 0
 
     parsed_elements = []
     index = crlf_index + 2
 
-    print(f"Parser: Expecting {num_elements} elements.")
-
     for i in range(num_elements):
-        if index >= len(data) or data[index: index + 1] != b"$":
+        if index >= len(data):
+            return [], 0  # Next element not received yet
+
+        if data[index] != 0x24:  # b"$"
             print(f"Parser Error: Element {i} not starting with $ at index {index}.")
             return [], 0
 
@@ -33,28 +47,62 @@ def parsed_resp_array(data: bytes) -> tuple[list[str], int]:
 
         crlf_index = data.find(b"\r\n", index)
         if crlf_index == -1:
-            print(f"Parser Error: Element {i} missing length CRLF.")
-            return [], 0
+            return [], 0  # Length line not fully received yet
 
         try:
-            length_bytes = data[index:crlf_index]
-            str_length = int(length_bytes.decode())
-            print(f"Parser: Element {i} length is {str_length}.")
+            # One- and two-digit lengths (most arguments) are read without slicing the buffer
+            if crlf_index - index == 1 and 0x30 <= data[index] <= 0x39:
+                str_length = data[index] - 0x30
+            elif crlf_index - index == 2 and 0x31 <= data[index] <= 0x39 and 0x30 <= data[index + 1] <= 0x39:
+                str_length = (data[index] - 0x30) * 10 + data[index + 1] - 0x30
+            else:
+                str_length = int(data[index:crlf_index])
         except ValueError:
-            print(f"Parser Error: Element {i} invalid length value: {length_bytes}")
+            print(f"Parser Error: Element {i} invalid length value: {data[index:crlf_index]}")
             return [], 0
 
         index = crlf_index + 2
 
         value_end_index = index + str_length
         if value_end_index + 2 > len(data):
-            print(f"Parser Error: Element {i} incomplete data or missing trailing CRLF.")
-            return [], 0
+            return [], 0  # Payload not fully received yet
 
-        value = data[index:value_end_index].decode()
+        value = bytes(data[index:value_end_index])
         parsed_elements.append(value)
-        print(f"Parser: Element {i} value: '{value}'")
 
         index = value_end_index + 2
 
-    return parsed_elements, index
\ No newline at end of file
+    return parsed_elements, index - start
+
+
+class CommandReader:
+    """
+    Incremental reader that turns a client's byte stream into commands.
+
+    Uses hiredis' C parser when it is installed and falls back to RespParser otherwise.
+    feed() the bytes from each recv(), then call gets() until it returns False.
+    """
+
+    def __init__(self):
+        if hiredis is not None:
+            # The C reader raises ValueError itself on malformed input, and its bound feed()
+            # is used as-is so buffering a read runs without entering a Python frame.
+            reader = hiredis.Reader(protocolError=ValueError)
+            self.feed = reader.feed
+            self._parse = reader.gets
+        else:
+            self._reader = RespParser()
+            self._parse = self._reader.try_parse
+
+    def feed(self, data: bytes):
+        self._reader.feed(data)
+
+    def gets(self) -> list[bytes] | bool:
+        """
+        Returns the next complete command, or False if more data is needed.
+        Raises ValueError on input that is not a RESP array, with either parser.
+        """
+        command = self._parse()
+        if command is not False and type(command) is not list:
+            raise ValueError("Protocol error: expected '*'")
+        return command
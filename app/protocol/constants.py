@@ -2,3 +2,13 @@ PING_COMMAND_RESP = b"*1\r\n$4\r\nPING\r\n"
 REPLCONF_CAPA_PSYNC2 = b"*3\r\n$8\r\nREPLCONF\r\n$4\r\ncapa\r\n$6\r\npsync2\r\n"
 PSYNC_COMMAND_RESP = b"*3\r\n$5\r\nPSYNC\r\n$1\r\n?\r\n$2\r\n-1\r\n"
 
+
+# Static replies, built once and reused instead of re-creating the bytes per command
+OK = b"+OK\r\n"
+PONG = b"+PONG\r\n"
+NIL_BULK = b"$-1\r\n"
+NIL_ARRAY = b"*-1\r\n"
+EMPTY_ARRAY = b"*0\r\n"
+QUEUED = b"+QUEUED\r\n"
+SUBSCRIBED_PONG = b"*2\r\n$4\r\npong\r\n$0\r\n\r\n"  # PING reply in subscribed mode
+SYNTAX_ERROR = b"-ERR syntax error\r\n"
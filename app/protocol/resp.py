@@ -5,6 +5,24 @@ This module handles parsing and encoding of RESP protocol messages.
 RESP is a simple text-based protocol used by Redis for client-server communication.
 """
 
+from app.protocol.constants import NIL_BULK
+
+try:
+    from hiredis import pack_command
+except ImportError:  # hiredis (2.1+) is optional; arrays are then encoded in Python below
+    pack_command = None
+
+# Pre-encoded "$<n>\r\n" and "*<n>\r\n" headers for the short lengths most replies use,
+# indexed by length, so the common case skips integer-to-ASCII formatting entirely.
+HEADER_CACHE_SIZE = 1024
+BULK_HEADERS = tuple(b"$%d\r\n" % n for n in range(HEADER_CACHE_SIZE))
+ARRAY_HEADERS = tuple(b"*%d\r\n" % n for n in range(HEADER_CACHE_SIZE))
+
+# Complete ":<n>\r\n" replies for the same range: counts, lengths and small counters.
+INTEGER_REPLIES = tuple(b":%d\r\n" % n for n in range(HEADER_CACHE_SIZE))
+# ASCII digits of the same range, for small integers sent back as bulk strings.
+INTEGER_DIGITS = tuple(b"%d" % n for n in range(HEADER_CACHE_SIZE))
+
 
 def parse_resp_array(data: bytes) -> tuple[list[str] | None, int]:
     """
@@ -67,31 +85,65 @@ def parse_resp_array(data: bytes) -> tuple[list[str] | None, int]:
         return None, 0
 
 
-def encode_simple_string(s: str) -> bytes:
+def encode_simple_string(s: str | bytes) -> bytes:
     """
     Encode a simple string in RESP format.
     
     Args:
-        s: String to encode
+        s: String to encode (bytes are written as-is)
         
     Returns:
         RESP-encoded simple string
     """
-    return f"+{s}\r\n".encode()
+    if isinstance(s, str):
+        s = s.encode()
+    return b"+%s\r\n" % s
 
 
-def encode_bulk_string(s: str) -> bytes:
+def encode_bulk_string(s: str | bytes | int | float | None) -> bytes:
     """
     Encode a bulk string in RESP format.
     
+    The payload is copied once instead of going through an f-string and a
+    second UTF-8 encode of the whole frame; lengths below HEADER_CACHE_SIZE
+    take their "$<n>" header from BULK_HEADERS.
+    
     Args:
-        s: String to encode
+        s: Value to encode (bytes are written as-is, small ints come from
+           INTEGER_DIGITS, other values are converted with str() once, None
+           encodes as null)
         
     Returns:
         RESP-encoded bulk string
     """
-    s_bytes = s.encode()
-    return f"${len(s_bytes)}\r\n".encode() + s_bytes + b"\r\n"
+    if s is None:
+        return NIL_BULK
+    if type(s) is int and 0 <= s < HEADER_CACHE_SIZE:
+        s = INTEGER_DIGITS[s]
+    elif not isinstance(s, (bytes, bytearray)):
+        s = str(s).encode()
+    length = len(s)
+    if length < HEADER_CACHE_SIZE:
+        return b"".join((BULK_HEADERS[length], s, b"\r\n"))
+    return b"$%d\r\n%s\r\n" % (length, s)
+
+
+def encode_integer(value: int) -> bytes:
+    """
+    Encode an integer in RESP format.
+    
+    Values below HEADER_CACHE_SIZE reuse a reply from INTEGER_REPLIES, so
+    they allocate nothing; larger ones are formatted in C by bytes %-formatting.
+    
+    Args:
+        value: Integer to encode
+        
+    Returns:
+        RESP-encoded integer
+    """
+    if 0 <= value < HEADER_CACHE_SIZE:
+        return INTEGER_REPLIES[value]
+    return b":%d\r\n" % value
 
 
 def encode_null_bulk_string() -> bytes:
@@ -101,7 +153,147 @@ def encode_null_bulk_string() -> bytes:
     Returns:
         RESP-encoded null bulk string
     """
-    return b"$-1\r\n"
+    return NIL_BULK
+
+
+def encode_array(parts) -> bytes:
+    """
+    Wrap already-encoded RESP elements in an array.
+    
+    The header and every element are joined in a single concatenation, so large
+    replies (XRANGE, XREAD, LRANGE) are built in linear time.
+    
+    Args:
+        parts: Sequence of RESP-encoded elements
+        
+    Returns:
+        RESP-encoded array
+    """
+    count = len(parts)
+    header = ARRAY_HEADERS[count] if count < HEADER_CACHE_SIZE else b"*%d\r\n" % count
+    return b"".join((header, *parts))
+
+
+def encode_into(out: bytearray, value):
+    """
+    Append the RESP encoding of a Python value to an output buffer.
+    
+    Every header and payload is appended to `out` directly, so a nested
+    reply is built in one buffer without an intermediate bytes object per
+    element or per sub-array. Nested arrays are walked with an explicit
+    stack of iterators rather than recursion, so depth costs no Python frames.
+    
+    Args:
+        out: Buffer the encoding is appended to
+        value: bytes/str (bulk string), int (integer), None (null bulk
+               string), or a list/tuple of such values (array)
+    """
+    # One iterator per array still being written; leaves are encoded in the inner loop and
+    # only a nested array interrupts it, to push the sub-array's iterator. Exact type() identity
+    # checks come first (cheaper than isinstance with a tuple); subclasses fall through to the end.
+    stack = [iter((value,))]
+    while stack:
+        for element in stack[-1]:
+            cls = type(element)
+            if cls is bytes:
+                length = len(element)
+                out += BULK_HEADERS[length] if length < HEADER_CACHE_SIZE else b"$%d\r\n" % length
+                out += element
+                out += b"\r\n"
+            elif cls is list or cls is tuple:
+                count = len(element)
+                out += ARRAY_HEADERS[count] if count < HEADER_CACHE_SIZE else b"*%d\r\n" % count
+                stack.append(iter(element))
+                break
+            elif element is None:
+                out += NIL_BULK
+            elif cls is int:
+                out += INTEGER_REPLIES[element] if 0 <= element < HEADER_CACHE_SIZE else b":%d\r\n" % element
+            elif isinstance(element, (list, tuple)):
+                count = len(element)
+                out += ARRAY_HEADERS[count] if count < HEADER_CACHE_SIZE else b"*%d\r\n" % count
+                stack.append(iter(element))
+                break
+            elif isinstance(element, int):
+                out += b":%d\r\n" % element
+            else:
+                if not isinstance(element, (bytes, bytearray)):
+                    element = str(element).encode()
+                length = len(element)
+                out += BULK_HEADERS[length] if length < HEADER_CACHE_SIZE else b"$%d\r\n" % length
+                out += element
+                out += b"\r\n"
+        else:
+            stack.pop()
+
+
+def encode_value(value) -> bytes:
+    """
+    Encode a Python value (see encode_into) as a RESP reply.
+    
+    Args:
+        value: Value to encode
+        
+    Returns:
+        RESP-encoded value
+    """
+    out = bytearray()
+    encode_into(out, value)
+    return bytes(out)
+
+
+def encode_bulk_array(elements) -> bytes:
+    """
+    Encode a sequence of bytes values as an array of bulk strings.
+    
+    Uses hiredis' C encoder when it is installed. Otherwise headers and
+    payloads go straight into one list that is joined once, so no per-element
+    bulk string is built and then copied again into the array.
+    
+    Args:
+        elements: Sequence of bytes values
+        
+    Returns:
+        RESP-encoded array of bulk strings
+    """
+    if pack_command is not None and elements:
+        return pack_command(tuple(elements))
+
+    count = len(elements)
+    parts = [ARRAY_HEADERS[count] if count < HEADER_CACHE_SIZE else b"*%d\r\n" % count]
+    append = parts.append
+    for element in elements:
+        length = len(element)
+        append(BULK_HEADERS[length] if length < HEADER_CACHE_SIZE else b"$%d\r\n" % length)
+        append(element)
+        append(b"\r\n")
+    return b"".join(parts)
+
+
+def encode_stream_entries(entries) -> bytes:
+    """
+    Encode stream entries as the nested array XRANGE and XREAD reply with.
+    
+    Each entry becomes [id, [field1, value1, ...]]. Every header and bulk
+    string is appended to one list and joined once, instead of building and
+    copying an intermediate array per entry.
+    
+    Args:
+        entries: Sequence of entry dicts with 'id' (str) and 'fields'
+                 (mapping of bytes to bytes)
+        
+    Returns:
+        RESP-encoded array of entries
+    """
+    parts = [b"*%d\r\n" % len(entries)]
+    append = parts.append
+    for entry in entries:
+        entry_id = entry["id"].encode()
+        fields = entry["fields"]
+        append(b"*2\r\n$%d\r\n%s\r\n*%d\r\n" % (len(entry_id), entry_id, 2 * len(fields)))
+        for field, value in fields.items():
+            append(b"$%d\r\n%s\r\n$%d\r\n%s\r\n" % (len(field), field, len(value), value))
+    return b"".join(parts)
 
 
 def encode_error(error_msg: str) -> bytes:
@@ -1,4 +1,104 @@
-class RESPParserError(Exception):
+class RESPParserError(ValueError):
     """Raised when RESP input is malformed or incomplete."""
 
-class
\ No newline at end of file
+
+# First bytes of the RESP2 types: $ * : + -
+RESP_TYPE_PREFIXES = frozenset(b"$*:+-")
+
+
+class RespParser:
+    """
+    Incremental RESP parser driven by an explicit state machine instead of recursion.
+
+    Bytes from each recv() are appended with feed(); try_parse() then walks the buffer with
+    bytes.find() from a saved position, keeping partially-built arrays on a stack of
+    [items, remaining] frames. A value split across reads is resumed where it stopped, and
+    only bulk string payloads are copied out of the buffer.
+
+    Bulk strings, simple strings and errors are returned as bytes, integers as int,
+    arrays as lists, and null bulk strings/arrays as None.
+    """
+    __slots__ = ("buf", "pos", "stack")
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.pos = 0
+        self.stack = []
+
+    def feed(self, data: bytes):
+        # Drop the bytes already parsed only once they are at least half the buffer, so a
+        # long pipeline is not shifted down on every read
+        if self.pos and self.pos * 2 >= len(self.buf):
+            del self.buf[:self.pos]
+            self.pos = 0
+        self.buf += data
+
+    def try_parse(self):
+        """
+        Returns the next complete value, or False if more data is needed.
+        Raises RESPParserError on malformed input.
+        """
+        buf = self.buf
+        pos = self.pos
+        stack = self.stack
+
+        while True:
+            crlf = buf.find(b"\r\n", pos)
+            if crlf == -1:
+                self.pos = pos
+                return False
+
+            prefix = buf[pos]
+            if prefix not in RESP_TYPE_PREFIXES:
+                raise RESPParserError(f"Protocol error: unexpected byte {chr(prefix)!r}")
+
+            try:
+                if prefix == 0x24 or prefix == 0x2A:
+                    # One- and two-digit lengths (most headers) are read without slicing the buffer
+                    if crlf - pos == 2:
+                        length = buf[pos + 1] - 0x30
+                        if not 0 <= length <= 9:
+                            raise ValueError
+                    elif crlf - pos == 3 and 0x31 <= buf[pos + 1] <= 0x39 and 0x30 <= buf[pos + 2] <= 0x39:
+                        length = (buf[pos + 1] - 0x30) * 10 + buf[pos + 2] - 0x30
+                    else:
+                        length = int(buf[pos + 1:crlf])
+
+                if prefix == 0x24:  # $ bulk string
+                    if length < 0:
+                        value = None
+                        pos = crlf + 2
+                    else:
+                        end = crlf + 2 + length
+                        if end + 2 > len(buf):
+                            self.pos = pos
+                            return False
+                        value = bytes(buf[crlf + 2:end])
+                        pos = end + 2
+                elif prefix == 0x2A:  # * array
+                    pos = crlf + 2
+                    if length > 0:
+                        # Open a frame; its elements are parsed by the following iterations
+                        stack.append([[], length])
+                        continue
+                    value = [] if length == 0 else None
+                elif prefix == 0x3A:  # : integer
+                    value = int(buf[pos + 1:crlf])
+                    pos = crlf + 2
+                else:  # + simple string, - error
+                    value = bytes(buf[pos + 1:crlf])
+                    pos = crlf + 2
+            except ValueError as e:
+                raise RESPParserError(f"Protocol error: invalid length in {bytes(buf[pos:crlf])!r}") from e
+
+            # Hand the value to the innermost open array, closing every frame it completes
+            while stack:
+                frame = stack[-1]
+                frame[0].append(value)
+                frame[1] -= 1
+                if frame[1]:
+                    break
+                value = stack.pop()[0]
+            else:
+                self.pos = pos
+                return value
@@ -0,0 +1,100 @@
+"""
+In-process tests for the client write path in app.core.command_execution: replies go to a
+non-blocking socket and whatever it does not take waits, in order, in the connection's outbox.
+"""
+
+import socket
+
+import pytest
+
+from app.core import command_execution
+from app.core.command_execution import ClientConnection, close_client_connection, send_to_connection, write_outbox
+
+# Far more than a socketpair's buffers hold, so the first write is always cut short
+LARGE_REPLY_SIZE = 8 * 1024 * 1024
+
+
+@pytest.fixture
+def peer_and_connection(monkeypatch):
+    """A ClientConnection over one end of a socketpair, with the other end as the client."""
+    watched = []
+    monkeypatch.setattr(command_execution, "WATCH_OUTBOX", watched.append)
+    server_sock, peer = socket.socketpair()
+    server_sock.setblocking(False)
+    connection = ClientConnection(server_sock, "test-peer")
+    yield peer, connection, watched
+    peer.close()
+    server_sock.close()
+
+
+def read_available(peer: socket.socket) -> bytes:
+    peer.setblocking(False)
+    chunks = []
+    try:
+        while chunk := peer.recv(1024 * 1024):
+            chunks.append(chunk)
+    except BlockingIOError:
+        pass
+    return b"".join(chunks)
+
+
+def drain(peer: socket.socket, connection: ClientConnection) -> bytes:
+    """Reads everything the connection has queued, writing more of the outbox as room frees up."""
+    received = []
+    while True:
+        received.append(read_available(peer))
+        with connection.write_lock:
+            write_outbox(connection)
+            if not connection.outbox:
+                break
+    received.append(read_available(peer))
+    return b"".join(received)
+
+
+def test_small_replies_are_written_at_once(peer_and_connection):
+    peer, connection, watched = peer_and_connection
+
+    send_to_connection(connection, [b"+OK\r\n", b":1\r\n"])
+
+    assert peer.recv(100) == b"+OK\r\n:1\r\n"
+    assert not connection.outbox and connection.outbox_size == 0
+    assert watched == []
+
+
+def test_unsent_bytes_stay_queued_for_the_loop(peer_and_connection):
+    peer, connection, watched = peer_and_connection
+    reply = bytes(range(256)) * (LARGE_REPLY_SIZE // 256)
+
+    send_to_connection(connection, [reply])
+
+    # The write returned instead of blocking, and handed the rest to the loop exactly once
+    assert 0 < connection.outbox_size < len(reply)
+    assert connection.outbox_size == sum(map(len, connection.outbox))
+    assert watched == [connection]
+
+    send_to_connection(connection, [b"+after\r\n"])
+    assert watched == [connection]  # already being drained: queued behind, not written
+
+    assert drain(peer, connection) == reply + b"+after\r\n"
+    assert connection.outbox_size == 0
+
+
+def test_scatter_writes_resume_mid_buffer(peer_and_connection):
+    peer, connection, _ = peer_and_connection
+    buffers = [bytes([i]) * (LARGE_REPLY_SIZE // 8 + i) for i in range(8)]
+
+    send_to_connection(connection, buffers)
+
+    assert drain(peer, connection) == b"".join(buffers)
+
+
+def test_writing_to_a_closed_connection_raises(peer_and_connection):
+    peer, connection, watched = peer_and_connection
+    send_to_connection(connection, [b"x" * LARGE_REPLY_SIZE])
+
+    close_client_connection(connection)
+
+    assert not connection.outbox and connection.outbox_size == 0
+    with pytest.raises(OSError):
+        send_to_connection(connection, [b"+OK\r\n"])
+    assert watched == [connection]
@@ -0,0 +1,392 @@
+"""
+Unit tests for app.core.datastore, run in-process against the module-level stores.
+"""
+
+import time
+
+import pytest
+
+from app.core import datastore
+from app.core.datastore import get_stream_max_id, xadd, xrange, xread
+
+
+@pytest.fixture(autouse=True)
+def empty_store():
+    """Every test starts from an empty keyspace."""
+    with datastore.DATA_LOCK:
+        for table in (datastore.DATA_STORE, datastore.STREAMS, datastore.STREAM_LAST_IDS,
+                      datastore.STREAM_ID_INDEX, datastore.SORTED_SETS, datastore.SORTED_SET_INDEX,
+                      datastore.EXPIRY_HEAP):
+            table.clear()
+        datastore._invalidate_keys_reply()
+    # Expiry checks read the real clocks unless a test takes its own snapshot
+    vars(datastore.CLOCK).clear()
+
+
+def entry_ids(entries: list[dict]) -> list[str]:
+    return [entry["id"] for entry in entries]
+
+
+# ----------------------------------------------------------------------------
+# Streams: XRANGE / XREAD over the bisected ID index
+# ----------------------------------------------------------------------------
+
+@pytest.fixture
+def stream():
+    for entry_id in ("1-1", "1-2", "2-0", "10-0", "10-5"):
+        assert xadd(b"s", entry_id, {b"f": entry_id.encode()}) == entry_id.encode()
+    return b"s"
+
+
+def test_xrange_bounds_are_inclusive(stream):
+    assert entry_ids(xrange(stream, "1-2", "10-0")) == ["1-2", "2-0", "10-0"]
+
+
+def test_xrange_special_bounds(stream):
+    assert entry_ids(xrange(stream, "-", "+")) == ["1-1", "1-2", "2-0", "10-0", "10-5"]
+    assert entry_ids(xrange(stream, "2-0", "+")) == ["2-0", "10-0", "10-5"]
+    assert entry_ids(xrange(stream, "-", "1-1")) == ["1-1"]
+
+
+def test_xrange_bare_milliseconds_cover_every_sequence(stream):
+    # A bare start means ms-0 and a bare end means the largest sequence of that ms
+    assert entry_ids(xrange(stream, "1", "1")) == ["1-1", "1-2"]
+    assert entry_ids(xrange(stream, "2", "10")) == ["2-0", "10-0", "10-5"]
+
+
+def test_xrange_compares_ids_numerically(stream):
+    # "10-0" sorts before "2-0" as text; the index must order by (ms, seq)
+    assert entry_ids(xrange(stream, "3-0", "+")) == ["10-0", "10-5"]
+
+
+def test_xrange_empty_and_missing(stream):
+    assert xrange(stream, "3-0", "9-9") == []
+    assert xrange(stream, "11-0", "+") == []
+    assert xrange(b"missing", "-", "+") == []
+
+
+def test_xread_returns_entries_strictly_after_the_id(stream):
+    assert entry_ids(xread([stream], ["1-2"])[stream]) == ["2-0", "10-0", "10-5"]
+    assert entry_ids(xread([stream], ["0-0"])[stream]) == ["1-1", "1-2", "2-0", "10-0", "10-5"]
+    assert entry_ids(xread([stream], ["10-1"])[stream]) == ["10-5"]
+
+
+def test_xread_leaves_out_streams_without_new_entries(stream):
+    xadd(b"other", "5-0", {b"f": b"v"})
+
+    result = xread([stream, b"other", b"missing"], ["10-5", "0-0", "0-0"])
+
+    assert list(result) == [b"other"]
+    assert xread([stream], ["$"]) == {}
+
+
+# ----------------------------------------------------------------------------
+# Streams: XADD ID parsing and validation
+# ----------------------------------------------------------------------------
+
+TOO_SMALL = b"-ERR The ID specified in XADD is equal or smaller than the target stream top item\r\n"
+
+
+def test_xadd_generates_sequence_numbers():
+    assert xadd(b"s", "0-*", {b"f": b"v"}) == b"0-1"
+    assert xadd(b"s", "0-*", {b"f": b"v"}) == b"0-2"
+    assert xadd(b"s", "5-*", {b"f": b"v"}) == b"5-0"
+    assert xadd(b"s", "5-*", {b"f": b"v"}) == b"5-1"
+    assert get_stream_max_id(b"s") == "5-1"
+
+
+def test_xadd_full_auto_id_keeps_increasing():
+    first = xadd(b"s", "*", {b"f": b"v"}).decode()
+    second = xadd(b"s", "*", {b"f": b"v"}).decode()
+
+    assert datastore.parse_stream_id(second) > datastore.parse_stream_id(first)
+
+
+def test_xadd_rejects_ids_not_above_the_top_item():
+    assert xadd(b"s", "5-3", {b"f": b"v"}) == b"5-3"
+
+    assert xadd(b"s", "5-3", {b"f": b"v"}) == TOO_SMALL
+    assert xadd(b"s", "5-2", {b"f": b"v"}) == TOO_SMALL
+    assert xadd(b"s", "4-9", {b"f": b"v"}) == TOO_SMALL
+    assert xadd(b"s", "4-*", {b"f": b"v"}) == TOO_SMALL
+    assert xadd(b"s", "5-10", {b"f": b"v"}) == b"5-10"
+
+
+@pytest.mark.parametrize("entry_id", ["0-0", "00-0", "0-00"])
+def test_xadd_rejects_zero_id_in_any_spelling(entry_id):
+    assert xadd(b"s", entry_id, {b"f": b"v"}) == b"-ERR The ID specified in XADD must be greater than 0-0\r\n"
+
+
+@pytest.mark.parametrize("entry_id", ["abc", "5", "5-x", "x-*", "-"])
+def test_xadd_rejects_malformed_ids(entry_id):
+    assert xadd(b"s", entry_id, {b"f": b"v"}).startswith(b"-ERR Invalid stream ID format")
+    assert b"s" not in datastore.STREAMS
+
+
+# ----------------------------------------------------------------------------
+# RDB loading: mmap decoding of strings, integer encodings and expiries
+# ----------------------------------------------------------------------------
+
+def rdb_string(value: bytes) -> bytes:
+    if len(value) < 64:
+        return bytes([len(value)]) + value
+    return bytes([0x40 | len(value) >> 8, len(value) & 0xFF]) + value
+
+
+def rdb_file(tmp_path, *pairs: bytes, metadata: bool = True):
+    body = b"REDIS0011"
+    if metadata:
+        body += b"\xfa" + rdb_string(b"redis-ver") + rdb_string(b"7.2.0")
+        body += b"\xfa" + rdb_string(b"redis-bits") + b"\xc0\x40"
+    body += b"\xfe\x00\xfb" + bytes([len(pairs), 0]) + b"".join(pairs)
+    path = tmp_path / "dump.rdb"
+    path.write_bytes(body + b"\xff" + b"\x00" * 8)
+    return path
+
+
+def string_pair(key: bytes, encoded_value: bytes, expiry: bytes = b"") -> bytes:
+    return expiry + b"\x00" + rdb_string(key) + encoded_value
+
+
+def ms_expiry(unix_ms: int) -> bytes:
+    return b"\xfc" + unix_ms.to_bytes(8, "little")
+
+
+def seconds_expiry(unix_seconds: int) -> bytes:
+    return b"\xfd" + unix_seconds.to_bytes(4, "little")
+
+
+def test_rdb_loads_plain_strings_as_bytes(tmp_path):
+    long_value = b"v" * 300  # needs the 14-bit length prefix
+    path = rdb_file(tmp_path,
+                    string_pair(b"foo", rdb_string(b"bar")),
+                    string_pair(b"long", rdb_string(long_value)))
+
+    entries = datastore.load_rdb_to_datastore(path)
+
+    assert {key: entry.value for key, entry in entries.items()} == {b"foo": b"bar", b"long": long_value}
+    assert all(entry.type == "string" and entry.expiry == 0 for entry in entries.values())
+
+
+def test_rdb_decodes_integer_encoded_strings(tmp_path):
+    path = rdb_file(tmp_path,
+                    string_pair(b"c0", b"\xc0\x7b"),
+                    string_pair(b"c1", b"\xc1" + (12345).to_bytes(2, "little")),
+                    string_pair(b"c2", b"\xc2" + (1234567890).to_bytes(4, "little")),
+                    metadata=False)
+
+    entries = datastore.load_rdb_to_datastore(path)
+
+    assert {key: entry.value for key, entry in entries.items()} == {
+        b"c0": b"123", b"c1": b"12345", b"c2": b"1234567890",
+    }
+
+
+def test_rdb_converts_ms_and_seconds_expiries_to_monotonic_deadlines(tmp_path):
+    now_unix_ms = time.time_ns() // 1_000_000
+    path = rdb_file(tmp_path,
+                    string_pair(b"ms_future", rdb_string(b"1"), ms_expiry(now_unix_ms + 60_000)),
+                    string_pair(b"sec_future", rdb_string(b"2"), seconds_expiry(now_unix_ms // 1000 + 60)),
+                    string_pair(b"ms_past", rdb_string(b"3"), ms_expiry(now_unix_ms - 60_000)),
+                    string_pair(b"sec_past", rdb_string(b"4"), seconds_expiry(now_unix_ms // 1000 - 60)))
+
+    entries = datastore.load_rdb_to_datastore(path)
+    now = time.monotonic_ns()
+
+    # Deadlines land about a minute either side of now on the monotonic clock
+    for key in (b"ms_future", b"sec_future"):
+        assert 55 * 10**9 < entries[key].expiry - now < 61 * 10**9
+    for key in (b"ms_past", b"sec_past"):
+        assert entries[key].expiry != 0 and now - entries[key].expiry > 55 * 10**9
+
+    datastore.load_entries(entries)
+    assert datastore.get_data_entry(b"ms_future").value == b"1"
+    assert datastore.get_data_entry(b"sec_future").value == b"2"
+    assert datastore.get_data_entry(b"ms_past") is None
+    assert datastore.delete_expired_keys() == 1  # sec_past, through the scheduled expiry
+    assert set(datastore.DATA_STORE) == {b"ms_future", b"sec_future"}
+
+
+def test_rdb_without_database_section_loads_nothing(tmp_path):
+    path = tmp_path / "dump.rdb"
+    path.write_bytes(b"REDIS0011\xff" + b"\x00" * 8)
+
+    assert datastore.load_rdb_to_datastore(path) == {}
+
+
+@pytest.mark.parametrize("contents", [b"", b"NOTREDIS0011\xff"])
+def test_rdb_rejects_files_without_the_magic(tmp_path, contents):
+    path = tmp_path / "dump.rdb"
+    path.write_bytes(contents)
+
+    with pytest.raises(Exception, match="missing 'REDIS' magic"):
+        datastore.load_rdb_to_datastore(path)
+
+
+def test_rdb_rejects_lzf_compressed_strings(tmp_path):
+    path = rdb_file(tmp_path, string_pair(b"k", b"\xc3\x00\x00"))
+
+    with pytest.raises(Exception, match="LZF"):
+        datastore.load_rdb_to_datastore(path)
+
+
+# ----------------------------------------------------------------------------
+# KEYS *: the cached reply follows every change to the keyspace
+# ----------------------------------------------------------------------------
+
+def keys_reply_members(reply: bytes) -> set[bytes]:
+    lines = reply.split(b"\r\n")
+    return set(lines[2:-1:2])
+
+
+def test_keys_reply_is_reused_while_the_keyspace_is_unchanged():
+    datastore.set_string(b"a", b"1")
+    reply = datastore.get_all_keys_reply()
+
+    datastore.set_string(b"a", b"2")  # overwriting a key keeps the same key set
+    datastore.increment_key_value(b"missing")
+
+    assert keys_reply_members(reply) == {b"a"}
+    assert keys_reply_members(datastore.get_all_keys_reply()) == {b"a", b"missing"}
+    assert datastore.get_all_keys_reply() is datastore.get_all_keys_reply()
+
+
+@pytest.mark.parametrize("add_key", [
+    lambda: datastore.set_string(b"new", b"v"),
+    lambda: datastore.increment_key_value(b"new"),
+    lambda: datastore.push_to_list(b"new", [b"x"]),
+    lambda: datastore.add_to_sorted_set(b"new", b"m", b"1"),
+    lambda: xadd(b"new", "1-1", {b"f": b"v"}),
+    lambda: datastore.load_entries({b"new": datastore.DataEntry("string", b"v")}),
+])
+def test_keys_reply_picks_up_new_keys(add_key):
+    datastore.set_string(b"old", b"v")
+    assert keys_reply_members(datastore.get_all_keys_reply()) == {b"old"}
+
+    add_key()
+
+    assert keys_reply_members(datastore.get_all_keys_reply()) == {b"old", b"new"}
+
+
+def test_keys_reply_drops_expired_keys():
+    past = time.monotonic_ns() - 1
+    datastore.set_string(b"live", b"v")
+    datastore.set_string(b"lazy", b"v", past)
+    datastore.set_string(b"swept", b"v", past)
+    assert keys_reply_members(datastore.get_all_keys_reply()) == {b"live", b"lazy", b"swept"}
+
+    assert datastore.get_data_entry(b"lazy") is None
+    assert keys_reply_members(datastore.get_all_keys_reply()) == {b"live", b"swept"}
+
+    datastore.delete_expired_keys()
+    assert keys_reply_members(datastore.get_all_keys_reply()) == {b"live"}
+
+
+# ----------------------------------------------------------------------------
+# Active expiry: the batched sweeper
+# ----------------------------------------------------------------------------
+
+def test_sweeper_deletes_due_keys_in_batches(monkeypatch):
+    yields = []
+    monkeypatch.setattr(datastore, "EXPIRY_SWEEP_BATCH", 2)
+    monkeypatch.setattr(datastore.time, "sleep", yields.append)
+
+    past = time.monotonic_ns() - 1
+    for i in range(5):
+        datastore.set_string(b"expired%d" % i, b"v", past)
+    datastore.set_string(b"overwritten", b"v", past)
+    datastore.set_string(b"overwritten", b"kept")  # leaves a stale pair in the heap
+    datastore.set_string(b"future", b"v", time.monotonic_ns() + 60 * 10**9)
+    datastore.set_string(b"forever", b"v")
+
+    assert datastore.delete_expired_keys() == 5
+
+    # Six due pairs, two per DATA_LOCK hold, with a yield after each full batch
+    assert yields == [0, 0, 0]
+    assert set(datastore.DATA_STORE) == {b"overwritten", b"future", b"forever"}
+    assert [key for _, key in datastore.EXPIRY_HEAP] == [b"future"]
+
+
+def test_sweeper_with_nothing_due_returns_without_yielding(monkeypatch):
+    yields = []
+    monkeypatch.setattr(datastore.time, "sleep", yields.append)
+    datastore.set_string(b"future", b"v", time.monotonic_ns() + 60 * 10**9)
+
+    assert datastore.delete_expired_keys() == 0
+    assert yields == []
+    assert b"future" in datastore.DATA_STORE
+
+
+def test_only_an_earlier_deadline_wakes_the_sweeper():
+    later = time.monotonic_ns() + 60 * 10**9
+    datastore.EXPIRY_WAKEUP.clear()
+
+    datastore.set_string(b"a", b"v", later)
+    assert datastore.EXPIRY_WAKEUP.is_set()
+
+    datastore.EXPIRY_WAKEUP.clear()
+    datastore.set_string(b"b", b"v", later + 10**9)
+    datastore.set_string(b"c", b"v")
+    assert not datastore.EXPIRY_WAKEUP.is_set()
+
+    datastore.set_string(b"d", b"v", later - 10**9)
+    assert datastore.EXPIRY_WAKEUP.is_set()
+
+
+# ----------------------------------------------------------------------------
+# Sorted sets: the bisected (score, member) index
+# ----------------------------------------------------------------------------
+
+@pytest.fixture
+def zset():
+    for member, score in ((b"c", b"3"), (b"a", b"1"), (b"b", b"2"), (b"d", b"2")):
+        assert datastore.add_to_sorted_set(b"z", member, score) == 1
+    return b"z"
+
+
+def test_zrange_orders_by_score_then_member(zset):
+    assert datastore.get_sorted_set_range(zset, 0, -1) == [b"a", b"b", b"d", b"c"]
+    assert [datastore.get_sorted_set_rank(zset, m) for m in (b"a", b"b", b"d", b"c")] == [0, 1, 2, 3]
+
+
+def test_zrange_index_bounds(zset):
+    assert datastore.get_sorted_set_range(zset, 1, 2) == [b"b", b"d"]
+    assert datastore.get_sorted_set_range(zset, -2, -1) == [b"d", b"c"]
+    assert datastore.get_sorted_set_range(zset, -100, 0) == [b"a"]
+    assert datastore.get_sorted_set_range(zset, 2, 100) == [b"d", b"c"]
+    assert datastore.get_sorted_set_range(zset, 3, 1) == []
+    assert datastore.get_sorted_set_range(zset, 4, 10) == []
+    assert datastore.get_sorted_set_range(b"missing", 0, -1) == []
+
+
+def test_zadd_update_moves_the_member(zset):
+    assert datastore.add_to_sorted_set(zset, b"a", b"10") == 0
+    assert datastore.add_to_sorted_set(zset, b"c", b"3") == 0  # same score: nothing moves
+
+    assert datastore.get_sorted_set_range(zset, 0, -1) == [b"b", b"d", b"c", b"a"]
+    assert datastore.get_sorted_set_rank(zset, b"a") == 3
+    assert datastore.get_zscore(zset, b"a") == 10.0
+    assert datastore.SORTED_SET_INDEX[zset] == sorted(datastore.SORTED_SET_INDEX[zset])
+    assert len(datastore.SORTED_SET_INDEX[zset]) == datastore.num_sorted_set_members(zset) == 4
+
+
+@pytest.mark.parametrize("score", [b"abc", b"nan", b""])
+def test_zadd_ignores_scores_without_a_rank(zset, score):
+    assert datastore.add_to_sorted_set(zset, b"e", score) == 0
+    assert datastore.add_to_sorted_set(zset, b"a", score) == 0
+
+    assert datastore.get_sorted_set_range(zset, 0, -1) == [b"a", b"b", b"d", b"c"]
+    assert datastore.get_zscore(zset, b"e") is None
+
+
+def test_zrem_keeps_the_index_in_sync(zset):
+    assert datastore.remove_from_sorted_set(zset, b"b") == 1
+    assert datastore.remove_from_sorted_set(zset, b"b") == 0
+    assert datastore.get_sorted_set_range(zset, 0, -1) == [b"a", b"d", b"c"]
+    assert datastore.get_sorted_set_rank(zset, b"d") == 1
+    assert datastore.get_sorted_set_rank(zset, b"b") is None
+
+    for member in (b"a", b"d", b"c"):
+        datastore.remove_from_sorted_set(zset, member)
+    assert zset not in datastore.SORTED_SET_INDEX
+    assert zset not in datastore.DATA_STORE
@@ -0,0 +1,72 @@
+"""
+Tests for the command readers in app.parser, run against the pure-Python RespParser and,
+when it is installed, hiredis.
+"""
+
+import pytest
+
+import app.parser as parser
+from app.parser import CommandReader, parsed_resp_array
+
+try:
+    import hiredis
+except ImportError:
+    hiredis = None
+
+
+@pytest.fixture(params=["python", "hiredis"])
+def reader(request, monkeypatch):
+    if request.param == "hiredis":
+        if hiredis is None:
+            pytest.skip("hiredis is not installed")
+        monkeypatch.setattr(parser, "hiredis", hiredis)
+    else:
+        monkeypatch.setattr(parser, "hiredis", None)
+    return CommandReader()
+
+
+def test_reader_returns_pipelined_commands_in_order(reader):
+    reader.feed(b"*1\r\n$4\r\nPING\r\n*3\r\n$3\r\nSET\r\n$1\r\nk\r\n$1\r\nv\r\n")
+
+    assert reader.gets() == [b"PING"]
+    assert reader.gets() == [b"SET", b"k", b"v"]
+    assert reader.gets() is False
+
+
+def test_reader_resumes_a_command_split_across_feeds(reader):
+    frame = b"*2\r\n$4\r\nECHO\r\n$11\r\nhello world\r\n"
+    for i in range(len(frame) - 1):
+        reader.feed(frame[i:i + 1])
+        assert reader.gets() is False
+    reader.feed(frame[-1:])
+
+    assert reader.gets() == [b"ECHO", b"hello world"]
+
+
+@pytest.mark.parametrize("frame", [b"+OK\r\n", b":5\r\n", b"$2\r\nhi\r\n", b"*-1\r\n"])
+def test_reader_rejects_frames_that_are_not_arrays(reader, frame):
+    reader.feed(frame)
+
+    with pytest.raises(ValueError):
+        reader.gets()
+
+
+def test_reader_rejects_malformed_input(reader):
+    reader.feed(b"*1\r\n!bogus\r\n")
+
+    with pytest.raises(ValueError):
+        reader.gets()
+
+
+def test_parsed_resp_array_reports_bytes_consumed():
+    data = bytearray(b"*2\r\n$3\r\nGET\r\n$1\r\nk\r\n*1\r\n$4\r\nPING\r\n")
+
+    assert parsed_resp_array(data, 0) == ([b"GET", b"k"], 20)
+    assert parsed_resp_array(data, 20) == ([b"PING"], 14)
+
+
+def test_parsed_resp_array_waits_quietly_for_an_incomplete_frame(capsys):
+    assert parsed_resp_array(bytearray(b"*2\r\n$3\r\nSET\r\n"), 0) == ([], 0)
+    assert parsed_resp_array(bytearray(b"*2\r\n$3\r\nSET\r\n$5\r\nval"), 0) == ([], 0)
+
+    assert capsys.readouterr().out == ""
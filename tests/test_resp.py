@@ -0,0 +1,97 @@
+"""
+Tests for the RESP reply encoders in app.protocol.resp.
+"""
+
+import sys
+
+import pytest
+
+import app.protocol.resp as resp
+from app.protocol.resp import encode_into, encode_value
+
+try:
+    from hiredis import pack_command
+except ImportError:
+    pack_command = None
+
+
+@pytest.mark.parametrize("value, expected", [
+    (b"hi", b"$2\r\nhi\r\n"),
+    (b"", b"$0\r\n\r\n"),
+    (b"x" * 2000, b"$2000\r\n" + b"x" * 2000 + b"\r\n"),
+    ("héllo", b"$6\r\nh\xc3\xa9llo\r\n"),
+    (bytearray(b"ab"), b"$2\r\nab\r\n"),
+    (None, b"$-1\r\n"),
+    (7, b":7\r\n"),
+    (123456789, b":123456789\r\n"),
+    (-3, b":-3\r\n"),
+    (True, b":1\r\n"),
+    (1.5, b"$3\r\n1.5\r\n"),
+])
+def test_encode_value_scalars(value, expected):
+    assert encode_value(value) == expected
+
+
+def test_encode_value_arrays():
+    assert encode_value([]) == b"*0\r\n"
+    assert encode_value([b"a", 1, None]) == b"*3\r\n$1\r\na\r\n:1\r\n$-1\r\n"
+    assert encode_value((b"a", (b"b", 2))) == b"*2\r\n$1\r\na\r\n*2\r\n$1\r\nb\r\n:2\r\n"
+
+
+def test_encode_value_array_with_a_long_header():
+    assert encode_value([1] * 1500) == b"*1500\r\n" + b":1\r\n" * 1500
+
+
+def test_encode_into_appends_to_the_buffer():
+    out = bytearray(b"+OK\r\n")
+
+    encode_into(out, [b"k", 5])
+
+    assert out == b"+OK\r\n*2\r\n$1\r\nk\r\n:5\r\n"
+
+
+def test_encode_value_resumes_the_outer_array_after_a_nested_one():
+    reply = [[b"a", [b"b"]], [], b"c", [[None]], 9]
+
+    assert encode_value(reply) == (
+        b"*5\r\n"
+        b"*2\r\n$1\r\na\r\n*1\r\n$1\r\nb\r\n"
+        b"*0\r\n"
+        b"$1\r\nc\r\n"
+        b"*1\r\n*1\r\n$-1\r\n"
+        b":9\r\n"
+    )
+
+
+def test_encode_value_nests_deeper_than_the_recursion_limit():
+    depth = sys.getrecursionlimit() * 2
+    value = b"leaf"
+    for _ in range(depth):
+        value = [value]
+
+    assert encode_value(value) == b"*1\r\n" * depth + b"$4\r\nleaf\r\n"
+
+
+@pytest.fixture(params=["python", "hiredis"])
+def encoder(request, monkeypatch):
+    if request.param == "hiredis":
+        if pack_command is None:
+            pytest.skip("hiredis is not installed")
+        monkeypatch.setattr(resp, "pack_command", pack_command)
+    else:
+        monkeypatch.setattr(resp, "pack_command", None)
+    return resp.encode_bulk_array
+
+
+@pytest.mark.parametrize("elements, expected", [
+    ([], b"*0\r\n"),
+    ([b"k"], b"*1\r\n$1\r\nk\r\n"),
+    ([b"a", b"", b"\r\n\x00"], b"*3\r\n$1\r\na\r\n$0\r\n\r\n$3\r\n\r\n\x00\r\n"),
+    ([b"x" * 2000], b"*1\r\n$2000\r\n" + b"x" * 2000 + b"\r\n"),
+])
+def test_encode_bulk_array(encoder, elements, expected):
+    assert encoder(elements) == expected
+
+
+def test_encode_bulk_array_accepts_any_sequence(encoder):
+    assert encoder((b"a", b"b")) == encoder([b"a", b"b"]) == b"*2\r\n$1\r\na\r\n$1\r\nb\r\n"
@@ -0,0 +1,301 @@
+"""
+Socket-level tests: each test starts the server as a subprocess and talks RESP to it,
+covering pipelining, split frames, transactions, blocking commands, expiry and replication.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# A command that answers within this many seconds was not stuck behind another client
+STALL_LIMIT = 1.0
+
+
+class ReplyError(Exception):
+    """A RESP error reply; returned by RespClient.read() rather than raised."""
+
+
+class RespClient:
+    """Minimal blocking RESP client for driving the server in tests."""
+
+    def __init__(self, port: int):
+        self.sock = socket.create_connection(("localhost", port), timeout=5)
+        self.file = self.sock.makefile("rb")
+
+    def send(self, *arguments):
+        self.sock.sendall(encode_command(*arguments))
+
+    def read(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body
+        if prefix == b"-":
+            return ReplyError(body.decode())
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            if length == -1:
+                return None
+            return self.file.read(length + 2)[:-2]
+        if prefix == b"*":
+            count = int(body)
+            if count == -1:
+                return None
+            return [self.read() for _ in range(count)]
+        raise AssertionError(f"unexpected reply line {line!r}")
+
+    def call(self, *arguments):
+        self.send(*arguments)
+        return self.read()
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+def encode_command(*arguments) -> bytes:
+    parts = [b"*%d\r\n" % len(arguments)]
+    for argument in arguments:
+        if isinstance(argument, str):
+            argument = argument.encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(argument), argument))
+    return b"".join(parts)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def start_server(tmp_path):
+    """Starts server processes on free ports and stops them after the test."""
+    processes = []
+
+    def start(*arguments) -> int:
+        port = free_port()
+        env = dict(os.environ, PYTHONPATH=str(REPO_ROOT))
+        process = subprocess.Popen(
+            [sys.executable, "-m", "app.main", "--port", str(port), *arguments],
+            cwd=tmp_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        processes.append(process)
+
+        def accepting() -> bool:
+            try:
+                socket.create_connection(("localhost", port), timeout=0.2).close()
+                return True
+            except OSError:
+                return False
+
+        assert wait_until(accepting), "server did not start"
+        return port
+
+    yield start
+
+    for process in processes:
+        process.kill()
+        process.wait()
+
+
+@pytest.fixture
+def port(start_server):
+    return start_server()
+
+
+@pytest.fixture
+def client(port):
+    client = RespClient(port)
+    yield client
+    client.close()
+
+
+def test_pipelined_commands_reply_in_order(client):
+    client.sock.sendall(
+        encode_command("SET", "k", "1")
+        + encode_command("INCR", "k")
+        + encode_command("GET", "k")
+        + encode_command("PING")
+        + encode_command("ECHO", "hi")
+    )
+
+    assert [client.read() for _ in range(5)] == [b"OK", 2, b"2", b"PONG", b"hi"]
+
+
+def test_command_split_across_writes(client):
+    frame = encode_command("SET", "split", "x" * 100) + encode_command("GET", "split")
+    for i in range(0, len(frame), 7):
+        client.sock.sendall(frame[i:i + 7])
+        time.sleep(0.001)
+
+    assert client.read() == b"OK"
+    assert client.read() == b"x" * 100
+
+
+def test_multi_exec_runs_queued_commands(client):
+    assert client.call("MULTI") == b"OK"
+    assert client.call("SET", "tx", "5") == b"QUEUED"
+    assert client.call("INCR", "tx") == b"QUEUED"
+    assert client.call("EXEC") == [b"OK", 6]
+
+    assert client.call("MULTI") == b"OK"
+    assert client.call("SET", "tx", "9") == b"QUEUED"
+    assert client.call("DISCARD") == b"OK"
+    assert client.call("GET", "tx") == b"6"
+
+    assert isinstance(client.call("EXEC"), ReplyError)
+
+
+def test_blpop_waits_off_the_loop_until_a_push(port, client):
+    other = RespClient(port)
+    try:
+        client.send("BLPOP", "queue", "0")
+        time.sleep(0.1)
+
+        # The blocked client does not hold up anyone else
+        started = time.monotonic()
+        assert other.call("PING") == b"PONG"
+        assert time.monotonic() - started < STALL_LIMIT
+
+        assert other.call("RPUSH", "queue", "job") == 1
+        assert client.read() == [b"queue", b"job"]
+        assert client.call("PING") == b"PONG"
+    finally:
+        other.close()
+
+
+def test_set_px_expires_the_key(client):
+    assert client.call("SET", "temp", "v", "PX", "100") == b"OK"
+    assert client.call("GET", "temp") == b"v"
+
+    time.sleep(0.2)
+    assert client.call("GET", "temp") is None
+
+
+def test_incr_rejects_loosely_formatted_integers(client):
+    for value in ("1_000", " 7 ", "+5"):
+        client.call("SET", "n", value)
+        assert isinstance(client.call("INCR", "n"), ReplyError)
+
+    client.call("SET", "n", "-5")
+    assert client.call("INCR", "n") == -4
+
+
+def test_subscribed_mode_follows_the_subscriptions(port, client):
+    publisher = RespClient(port)
+    try:
+        assert client.call("SUBSCRIBE", "news") == [b"subscribe", b"news", 1]
+        assert isinstance(client.call("GET", "k"), ReplyError)
+        assert client.call("PING") == [b"pong", b""]
+
+        assert publisher.call("PUBLISH", "news", "hello") == 1
+        assert client.read() == [b"message", b"news", b"hello"]
+
+        assert client.call("UNSUBSCRIBE", "news") == [b"unsubscribe", b"news", 0]
+        assert client.call("GET", "k") is None
+        assert publisher.call("PUBLISH", "news", "again") == 0
+    finally:
+        publisher.close()
+
+
+def test_writes_propagate_to_replica(start_server):
+    master_port = start_server()
+    replica_port = start_server("--replicaof", f"localhost {master_port}")
+    master = RespClient(master_port)
+    replica = RespClient(replica_port)
+    try:
+        assert wait_until(lambda: master.call("WAIT", "0", "0") == 1), "replica did not register"
+
+        assert master.call("RPUSH", "list", "a", "b") == 2
+        assert master.call("SET", "replicated", "yes") == b"OK"
+
+        # The replica applies writes in order, so once the last one shows up so has the first
+        assert wait_until(lambda: replica.call("GET", "replicated") == b"yes")
+        assert replica.call("LRANGE", "list", "0", "-1") == [b"a", b"b"]
+        assert master.call("WAIT", "1", "1000") == 1
+    finally:
+        master.close()
+        replica.close()
+
+
+def test_replica_get_sees_propagated_incr(start_server):
+    master_port = start_server()
+    replica_port = start_server("--replicaof", f"localhost {master_port}")
+    master = RespClient(master_port)
+    replica = RespClient(replica_port)
+    try:
+        assert wait_until(lambda: master.call("WAIT", "0", "0") == 1), "replica did not register"
+
+        assert master.call("SET", "counter", "1") == b"OK"
+        # The replica's GET caches its reply for "1"; the INCRs applied by the replication
+        # listener must drop that cache rather than leave the old value being served
+        assert wait_until(lambda: replica.call("GET", "counter") == b"1")
+        for expected in range(2, 12):
+            assert master.call("INCR", "counter") == expected
+            assert wait_until(lambda: replica.call("GET", "counter") == str(expected).encode())
+    finally:
+        master.close()
+        replica.close()
+
+
+def test_blocking_command_inside_exec_does_not_stall(port, client):
+    other = RespClient(port)
+    try:
+        client.send("MULTI")
+        client.send("BLPOP", "empty", "2")
+        client.send("XREAD", "BLOCK", "2000", "STREAMS", "stream", "$")
+        client.send("EXEC")
+
+        started = time.monotonic()
+        assert other.call("PING") == b"PONG"
+        assert time.monotonic() - started < STALL_LIMIT
+
+        assert [client.read() for _ in range(3)] == [b"OK", b"QUEUED", b"QUEUED"]
+        assert client.read() == [None, None]
+        assert time.monotonic() - started < STALL_LIMIT
+    finally:
+        other.close()
+
+
+def test_client_not_reading_replies_does_not_stall_others(port, client):
+    value = "x" * 100_000
+    assert client.call("SET", "big", value) == b"OK"
+
+    # Pipeline far more reply bytes than the socket buffers hold, and read none of them
+    slow = RespClient(port)
+    other = RespClient(port)
+    try:
+        slow.sock.sendall(encode_command("GET", "big") * 200)
+        time.sleep(0.2)
+
+        started = time.monotonic()
+        assert other.call("PING") == b"PONG"
+        assert other.call("GET", "big") == value.encode()
+        assert time.monotonic() - started < STALL_LIMIT
+
+        # The queued replies still arrive in full once the client reads
+        assert all(slow.read() == value.encode() for _ in range(200))
+    finally:
+        slow.close()
+        other.close()